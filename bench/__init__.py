@@ -0,0 +1 @@
+"""Benchmarks of zha-toolkit against a simulated zigbee network"""
@@ -0,0 +1,363 @@
+"""Replay a capture of toolkit service calls on a simulated network
+
+    python -m bench.replay calls.ndjson --output replay.json
+    python -m bench.replay calls.ndjson --speed 60 --max-in-flight 4
+    python -m bench.replay calls.ndjson --speed 1 --realtime
+
+The capture is the file written by the capture_start service.  Each call
+is issued through the service handlers at its time in the capture divided
+by --speed.  The devices of the capture are added to a simulated network
+of --size devices: with their IEEE address when the capture has it, the
+kind of device (plug, sensor, TRV) is chosen from the clusters used.
+
+The report has latency percentiles per command, compared with the
+latencies of the capture, and the queueing: how late calls started, how
+many calls were running and how many requests waited for a scheduler
+slot.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+import typing
+
+import zigpy.types as t
+
+from custom_components.zha_toolkit import metrics
+from custom_components.zha_toolkit import utils as u
+
+from . import sim
+
+LOGGER = logging.getLogger(__name__)
+
+# Interval between samples of the number of waiting requests (s)
+SAMPLE_INTERVAL = 0.1
+
+# Clusters that identify the kind of simulated device for a reference
+KIND_CLUSTERS = {
+    "trv": {0x0201, 0x0204},
+    "sensor": {0x0001, 0x0402, 0x0405},
+}
+
+
+def load(file_name: str) -> list[dict[str, typing.Any]]:
+    """Calls of a capture file, in time order"""
+    calls = []
+    with open(file_name, encoding="utf_8") as f:
+        for line in f:
+            if line.strip():
+                calls.append(json.loads(line))
+    calls.sort(key=lambda call: call["t"])
+    return calls
+
+
+def _cluster(value) -> int | None:
+    try:
+        return int(str(value), 0)
+    except ValueError:
+        return None
+
+
+def _kinds(calls: list[dict]) -> dict[str, str]:
+    """Device reference -> kind of device, in order of first use"""
+    clusters: dict[str, set[int | None]] = {}
+    for call in calls:
+        ref = call["data"].get("ieee")
+        if ref is not None:
+            clusters.setdefault(str(ref), set()).add(
+                _cluster(call["data"].get("cluster", ""))
+            )
+    kinds = {}
+    for ref, used in clusters.items():
+        kinds[ref] = "plug"
+        for kind, ids in KIND_CLUSTERS.items():
+            if used & ids:
+                kinds[ref] = kind
+                break
+    return kinds
+
+
+def _free_nwk(network: sim.SimNetwork) -> int:
+    while True:
+        nwk = network.rng.randint(0x0001, 0xFFF7)
+        if nwk not in network.nodes:
+            return nwk
+
+
+def add_devices(
+    network: sim.SimNetwork,
+    calls: list[dict],
+    sleepy: bool = False,
+    poll_interval: float = 1.0,
+    **link,
+) -> dict[str, str]:
+    """Add the devices of the capture to network, return ref -> ieee
+
+    References that are IEEE addresses keep their address, unless the
+    network has another kind of device with it, others (entity ids,
+    device names) get a new one.  New devices are children
+    of a random router, `link` gives their latency, jitter and loss.
+    """
+    known = {str(node.ieee): node for node in network.nodes.values()}
+    routers = [
+        node for node in network.nodes.values() if not node.is_end_device
+    ]
+    index = len(network.nodes)
+    mapping = {}
+    for ref, kind in _kinds(calls).items():
+        try:
+            ieee = str(t.EUI64.convert(ref))
+        except ValueError:
+            ieee = None
+        if ieee is None or ieee not in known or known[ieee].kind != kind:
+            while ieee is None or ieee in known:
+                # pylint: disable-next=protected-access
+                ieee = sim._ieee(0x10000 + index)
+                index += 1
+            node = network.add_node(
+                sim.SimNode(
+                    ieee,
+                    _free_nwk(network),
+                    kind=kind,
+                    sleepy=sleepy and kind != "plug",
+                    poll_interval=poll_interval,
+                    **link,
+                )
+            )
+            parent = network.rng.choice(routers)
+            node.neighbours.append(
+                {"ieee": str(parent.ieee), "nwk": parent.nwk, "lqi": 200}
+            )
+            parent.neighbours.append(
+                {
+                    "ieee": ieee,
+                    "nwk": node.nwk,
+                    "lqi": 200,
+                    "device_type": node.logical_type,
+                    "relationship": 1,
+                }
+            )
+            known[ieee] = node
+        mapping[ref] = ieee
+    return mapping
+
+
+def _stats(latencies: list[float]) -> dict[str, float | None]:
+    latencies = sorted(latencies)
+    return {
+        "p50_ms": _ms(metrics.percentile(latencies, 50)),
+        "p95_ms": _ms(metrics.percentile(latencies, 95)),
+        "p99_ms": _ms(metrics.percentile(latencies, 99)),
+        "max_ms": _ms(latencies[-1] if latencies else None),
+    }
+
+
+def _ms(value: float | None) -> float | None:
+    return None if value is None else round(value * 1e3, 1)
+
+
+async def replay(
+    network: sim.SimNetwork,
+    calls: list[dict],
+    mapping: dict[str, str],
+    speed: float = 1.0,
+) -> dict[str, typing.Any]:
+    """Issue the calls at their capture times divided by speed"""
+    loop = asyncio.get_running_loop()
+    per_command: dict[str, dict[str, typing.Any]] = {}
+    late: list[float] = []
+    concurrency: list[int] = []
+    queued: list[int] = []
+    in_flight = 0
+    errors: dict[str, int] = {}
+    requests = sum(n.requests for n in network.nodes.values())
+
+    async def _call(call, due):
+        nonlocal in_flight
+        await asyncio.sleep(max(0.0, due - loop.time()))
+        late.append(loop.time() - due)
+        data = dict(call["data"])
+        command = data.pop("command", None)
+        if call["service"] != "execute" or command is None:
+            command = call["service"]
+        if "ieee" in data:
+            data["ieee"] = mapping[str(data["ieee"])]
+
+        stats = per_command.setdefault(
+            command, {"latencies": [], "captured": [], "failures": 0}
+        )
+        in_flight += 1
+        concurrency.append(in_flight)
+        start = loop.time()
+        try:
+            event_data = await network.call(command, **data)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # Rejected by the schema or unknown device
+            event_data = {"success": False, "errors": [repr(e)]}
+        in_flight -= 1
+        stats["latencies"].append(loop.time() - start)
+        if call.get("duration_ms") is not None:
+            stats["captured"].append(call["duration_ms"] / 1e3)
+        if not event_data["success"]:
+            stats["failures"] += 1
+            error = (event_data["errors"] or ["failed"])[0]
+            errors[error] = errors.get(error, 0) + 1
+
+    async def _sample():
+        while True:
+            queued.append(u.SCHEDULER.waiting)
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    sampler = asyncio.create_task(_sample())
+    real = time.perf_counter()
+    cpu = time.process_time()
+    start = loop.time()
+    t0 = calls[0]["t"] if calls else 0.0
+    await asyncio.gather(
+        *[_call(call, start + (call["t"] - t0) / speed) for call in calls]
+    )
+    wall = loop.time() - start
+    sampler.cancel()
+
+    late.sort()
+    queued.sort()
+    commands = {}
+    for command, stats in sorted(per_command.items()):
+        commands[command] = {
+            "calls": len(stats["latencies"]),
+            "failures": stats["failures"],
+            **_stats(stats["latencies"]),
+            "captured": _stats(stats["captured"]),
+        }
+    return {
+        "summary": {
+            "calls": len(calls),
+            "failures": sum(errors.values()),
+            "captured_s": round(calls[-1]["t"] - t0, 3) if calls else 0,
+            "wall_s": round(wall, 3),
+            "late_p95_ms": _ms(metrics.percentile(late, 95)),
+            "late_max_ms": _ms(late[-1] if late else None),
+            "concurrency_mean": (
+                round(sum(concurrency) / len(concurrency), 2)
+                if concurrency
+                else None
+            ),
+            "concurrency_max": max(concurrency, default=0),
+            "queued_mean": (
+                round(sum(queued) / len(queued), 2) if queued else None
+            ),
+            "queued_p95": metrics.percentile(queued, 95),
+            "queued_max": max(queued, default=0),
+            "requests": sum(n.requests for n in network.nodes.values())
+            - requests,
+            "real_s": round(time.perf_counter() - real, 3),
+            "cpu_s": round(time.process_time() - cpu, 3),
+        },
+        "commands": commands,
+        "errors": errors,
+    }
+
+
+async def run_replay(args, calls: list[dict]) -> dict[str, typing.Any]:
+    network = sim.build_network(
+        args.size,
+        seed=args.seed,
+        latency=args.latency,
+        jitter=args.jitter,
+        loss=args.loss,
+        sleepy=args.sleepy,
+        poll_interval=args.poll_interval,
+    )
+    mapping = add_devices(
+        network,
+        calls,
+        sleepy=args.sleepy,
+        poll_interval=args.poll_interval,
+        latency=args.latency,
+        jitter=args.jitter,
+        loss=args.loss,
+    )
+    u.SCHEDULER.configure(
+        device_in_flight=args.device_in_flight,
+        max_in_flight=args.max_in_flight,
+    )
+    result = await replay(network, calls, mapping, args.speed)
+    result["devices"] = mapping
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m bench.replay", description=__doc__.split("\n")[0]
+    )
+    parser.add_argument("capture", help="Capture file (NDJSON)")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Replay speed, 10 issues the calls 10 times faster",
+    )
+    parser.add_argument(
+        "--size",
+        type=int,
+        default=20,
+        help="Devices of the simulated network besides the captured ones",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--sleepy", action="store_true")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--device-in-flight", type=int)
+    parser.add_argument("--max-in-flight", type=int)
+    parser.add_argument(
+        "--realtime",
+        action="store_true",
+        help="Wait for real instead of using a virtual clock",
+    )
+    parser.add_argument(
+        "--output", default="-", help="Output file, '-' for stdout"
+    )
+    args = parser.parse_args(argv)
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    calls = load(args.capture)
+    result = sim.run(run_replay(args, calls), virtual_time=not args.realtime)
+    output = json.dumps(
+        {
+            "meta": {
+                "capture": args.capture,
+                "speed": args.speed,
+                "clock": "real" if args.realtime else "virtual",
+                "size": args.size,
+                "seed": args.seed,
+                "device_in_flight": u.SCHEDULER.device_in_flight,
+                "max_in_flight": u.SCHEDULER.coordinator.limit,
+            },
+            **result,
+        },
+        indent=2,
+    )
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w", encoding="utf_8") as out:
+            out.write(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,377 @@
+"""Benchmark the main toolkit services on simulated networks
+
+    python -m bench.run --sizes 10,100,500 --output results.json
+    python -m bench.run --format csv --output - --scenarios attr_read
+    python -m bench.run --baseline results.json --tolerance 0.1
+
+For each network size, each scenario issues its service calls (at most
+--concurrency at once) and reports calls per second, the wall time and
+latency percentiles.  Times are measured on the virtual clock of the
+simulation unless --realtime is given; real_s and cpu_s are the time
+actually spent.  With --baseline, the exit status is 1 when a scenario is
+slower than in the baseline by more than the tolerance.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import platform
+import subprocess  # nosec
+import sys
+import time
+import typing
+
+from custom_components.zha_toolkit import metrics
+from custom_components.zha_toolkit import utils as u
+
+from . import sim
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_SIZES = [10, 100, 500]
+# Devices scanned by scan_device, a full scan has hundreds of requests
+SCAN_SAMPLE = 10
+
+# Attribute with reporting, by kind of device: (cluster, attribute)
+REPORTED_ATTRIBUTE = {
+    "plug": (0x0006, 0x0000),
+    "sensor": (0x0402, 0x0000),
+    "trv": (0x0201, 0x0000),
+}
+
+
+def _devices(network: sim.SimNetwork) -> list[sim.SimNode]:
+    return [n for n in network.nodes.values() if n.kind != "coordinator"]
+
+
+def _attr_read(network):
+    return [
+        ("attr_read", {"ieee": str(n.ieee), "cluster": 0, "attribute": 5})
+        for n in _devices(network)
+    ]
+
+
+def _attr_read_devices(network):
+    # The same attribute from all devices in a single call
+    return [("attr_read_devices", {"cluster": 0, "attribute": "sw_build_id"})]
+
+
+def _attr_write(network):
+    # Identify time, read back after the write
+    return [
+        (
+            "attr_write",
+            {
+                "ieee": str(n.ieee),
+                "cluster": 3,
+                "attribute": 0,
+                "attr_type": 0x21,
+                "attr_val": 0,
+            },
+        )
+        for n in _devices(network)
+    ]
+
+
+def _conf_report(network):
+    calls = []
+    for n in _devices(network):
+        cluster, attribute = REPORTED_ATTRIBUTE[n.kind]
+        calls.append(
+            (
+                "conf_report",
+                {
+                    "ieee": str(n.ieee),
+                    "cluster": cluster,
+                    "attribute": attribute,
+                    "min_interval": 10,
+                    "max_interval": 600,
+                    "reportable_change": 1,
+                },
+            )
+        )
+    return calls
+
+
+def _scan_device(network):
+    return [
+        ("scan_device", {"ieee": str(n.ieee)})
+        for n in _devices(network)[:SCAN_SAMPLE]
+    ]
+
+
+def _binds_get(network):
+    return [("binds_get", {"ieee": str(n.ieee)}) for n in _devices(network)]
+
+
+def _all_routes_and_neighbours(network):
+    return [("all_routes_and_neighbours", {"concurrency": 4})]
+
+
+def _zha_devices(network):
+    return [("zha_devices", {"csvout": "bench_devices.csv"})]
+
+
+def _backup(network):
+    return [("backup", {})]
+
+
+# Scenario name -> calls for a network
+SCENARIOS: dict[str, typing.Callable[[sim.SimNetwork], list]] = {
+    "attr_read": _attr_read,
+    "attr_read_devices": _attr_read_devices,
+    "attr_write": _attr_write,
+    "conf_report": _conf_report,
+    "scan_device": _scan_device,
+    "binds_get": _binds_get,
+    "all_routes_and_neighbours": _all_routes_and_neighbours,
+    "zha_devices_csv": _zha_devices,
+    "backup": _backup,
+}
+
+
+def _skip_reason(network, scenario) -> str | None:
+    if scenario == "backup" and u.get_radiotype(network.app) not in (
+        u.RadioType.ZNP,
+        u.RadioType.EZSP,
+    ):
+        return "backup needs a ZNP or EZSP radio, not simulated"
+    return None
+
+
+def _ms(value: float | None) -> float | None:
+    return None if value is None else round(value * 1e3, 1)
+
+
+async def run_scenario(
+    network: sim.SimNetwork, scenario: str, concurrency: int
+) -> dict[str, typing.Any]:
+    """Run the calls of the scenario, return its measurements"""
+    result: dict[str, typing.Any] = {
+        "size": len(network.nodes) - 1,
+        "scenario": scenario,
+    }
+    reason = _skip_reason(network, scenario)
+    if reason is not None:
+        result["skipped"] = reason
+        return result
+
+    calls = SCENARIOS[scenario](network)
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors: dict[str, int] = {}
+    requests = sum(n.requests for n in network.nodes.values())
+    lost = sum(n.lost for n in network.nodes.values())
+
+    async def _call(command, data):
+        async with sem:
+            event_data = await network.call(command, **data)
+        latencies.append(event_data["duration"])
+        if not event_data["success"]:
+            error = (event_data["errors"] or ["failed"])[0]
+            errors[error] = errors.get(error, 0) + 1
+
+    real = time.perf_counter()
+    cpu = time.process_time()
+    start = loop.time()
+    await asyncio.gather(*[_call(cmd, data) for cmd, data in calls])
+    wall = loop.time() - start
+
+    latencies.sort()
+    result.update(
+        {
+            "calls": len(calls),
+            "failures": sum(errors.values()),
+            "wall_s": round(wall, 3),
+            "calls_per_s": round(len(calls) / wall, 2) if wall else None,
+            "p50_ms": _ms(metrics.percentile(latencies, 50)),
+            "p95_ms": _ms(metrics.percentile(latencies, 95)),
+            "p99_ms": _ms(metrics.percentile(latencies, 99)),
+            "requests": sum(n.requests for n in network.nodes.values())
+            - requests,
+            "lost": sum(n.lost for n in network.nodes.values()) - lost,
+            "real_s": round(time.perf_counter() - real, 3),
+            "cpu_s": round(time.process_time() - cpu, 3),
+            "errors": errors,
+        }
+    )
+    return result
+
+
+async def run_benchmarks(args) -> list[dict[str, typing.Any]]:
+    results = []
+    for size in args.sizes:
+        network = sim.build_network(
+            size,
+            seed=args.seed,
+            latency=args.latency,
+            jitter=args.jitter,
+            loss=args.loss,
+            sleepy=args.sleepy,
+            poll_interval=args.poll_interval,
+        )
+        for scenario in args.scenarios:
+            result = await run_scenario(network, scenario, args.concurrency)
+            LOGGER.info("%s", result)
+            results.append(result)
+    return results
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(  # nosec
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _meta(args) -> dict[str, typing.Any]:
+    return {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "zigpy": u.getZigpyVersion(),
+        "clock": "real" if args.realtime else "virtual",
+        "seed": args.seed,
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "loss": args.loss,
+        "sleepy": args.sleepy,
+        "poll_interval": args.poll_interval,
+        "concurrency": args.concurrency,
+    }
+
+
+def to_csv(results: list[dict]) -> str:
+    fields: list[str] = []
+    for result in results:
+        fields.extend(k for k in result if k not in fields)
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=fields)
+    writer.writeheader()
+    for result in results:
+        writer.writerow(
+            {
+                k: json.dumps(v) if isinstance(v, dict) else v
+                for k, v in result.items()
+            }
+        )
+    return out.getvalue()
+
+
+def regressions(
+    results: list[dict], baseline: list[dict], tolerance: float
+) -> list[str]:
+    """Scenarios slower than in the baseline by more than tolerance
+
+    Scenarios are compared on calls per second, or on real time when they
+    take no simulated time (zha_devices).
+    """
+    previous = {(r["size"], r["scenario"]): r for r in baseline}
+    found = []
+    for result in results:
+        old = previous.get((result["size"], result["scenario"]))
+        if old is None or "skipped" in old or "skipped" in result:
+            continue
+        name = f"{result['scenario']}@{result['size']}"
+        if old.get("calls_per_s") and result.get("calls_per_s"):
+            if result["calls_per_s"] < old["calls_per_s"] * (1 - tolerance):
+                found.append(
+                    f"{name}: {old['calls_per_s']} ->"
+                    f" {result['calls_per_s']} calls/s"
+                )
+        elif result["real_s"] > old["real_s"] * (1 + tolerance):
+            found.append(f"{name}: {old['real_s']} -> {result['real_s']} s")
+    return found
+
+
+def _list(value: str) -> list[str]:
+    return [v for v in value.split(",") if v]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m bench.run", description=__doc__.split("\n")[0]
+    )
+    parser.add_argument(
+        "--sizes",
+        type=lambda v: [int(s) for s in _list(v)],
+        default=DEFAULT_SIZES,
+        help="Comma separated network sizes (default: 10,100,500)",
+    )
+    parser.add_argument(
+        "--scenarios",
+        type=_list,
+        default=list(SCENARIOS),
+        help=f"Comma separated scenarios among {','.join(SCENARIOS)}",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--sleepy", action="store_true")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=16,
+        help="Service calls running at the same time",
+    )
+    parser.add_argument(
+        "--realtime",
+        action="store_true",
+        help="Wait for real instead of using a virtual clock",
+    )
+    parser.add_argument("--format", choices=("json", "csv"), default="json")
+    parser.add_argument(
+        "--output", default="-", help="Output file, '-' for stdout"
+    )
+    parser.add_argument("--baseline", help="Earlier JSON output to compare")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    results = sim.run(run_benchmarks(args), virtual_time=not args.realtime)
+
+    if args.format == "csv":
+        output = to_csv(results)
+    else:
+        output = json.dumps(
+            {"meta": _meta(args), "results": results}, indent=2
+        )
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w", encoding="utf_8") as out:
+            out.write(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf_8") as f:
+            baseline = json.load(f)["results"]
+        found = regressions(results, baseline, args.tolerance)
+        for regression in found:
+            print(f"Regression: {regression}", file=sys.stderr)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1121 @@
+"""Simulated zigbee network to run the toolkit handlers without a radio
+
+SimNetwork builds a zigpy ControllerApplication whose radio is an
+in-process model of the devices.  zigpy serializes the requests as it
+does for a real radio, each SimNode decodes them and answers with the
+frames a device would send, after its latency.  Nodes can lose frames,
+be sleepy (requests wait for the next poll of the device), and have
+their own attributes, neighbour, routing and binding tables.
+
+    network = build_network(100, latency=0.02, loss=0.01)
+    event_data = await network.call("scan_device", ieee=str(ieee))
+
+Run it in a VirtualTimeLoop (see run()) to skip the waits: latencies,
+poll intervals and the delays of the handlers then take no real time.
+
+Home Assistant must be installed (see requirements_test.txt): the
+handlers are called with a minimal stand-in for hass and the ZHA gateway.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import selectors
+import tempfile
+import types
+import typing
+
+import zigpy.application
+import zigpy.endpoint
+import zigpy.state
+import zigpy.types as t
+import zigpy.zdo.types as zdo_t
+from homeassistant.util import dt as dt_util
+from zigpy.exceptions import DeliveryError
+from zigpy.zcl import foundation as f
+
+import custom_components.zha_toolkit as tk
+from custom_components.zha_toolkit import capture, metrics
+from custom_components.zha_toolkit import utils as u
+
+LOGGER = logging.getLogger(__name__)
+
+PROFILE_HA = 0x0104
+COORDINATOR_IEEE = "00:0d:6f:ff:fe:00:00:01"
+# Time a parent keeps a frame for a sleepy child (seconds)
+INDIRECT_TIMEOUT = 7.68
+# Table entries per ZDO response, as common devices do
+NEIGHBOURS_PER_PAGE = 3
+ROUTES_PER_PAGE = 10
+BINDINGS_PER_PAGE = 3
+
+GC = f.GeneralCommand
+ZDO = zdo_t.ZDOCmd
+
+# Endpoint 1 layout and identification of the simulated kinds of devices
+KINDS: dict[str, dict[str, typing.Any]] = {
+    "coordinator": {
+        "logical_type": zdo_t.LogicalType.Coordinator,
+        "device_type": 0x0005,
+        "in_clusters": [0x0000],
+        "out_clusters": [],
+        "manufacturer": "zha-toolkit",
+        "model": "SimCoordinator",
+    },
+    "plug": {
+        "logical_type": zdo_t.LogicalType.Router,
+        "device_type": 0x0051,
+        "in_clusters": [0x0000, 0x0003, 0x0004, 0x0005, 0x0006, 0x0702],
+        "out_clusters": [0x0019],
+        "manufacturer": "SimLabs",
+        "model": "SimPlug",
+    },
+    "sensor": {
+        "logical_type": zdo_t.LogicalType.EndDevice,
+        "device_type": 0x0302,
+        "in_clusters": [0x0000, 0x0001, 0x0003, 0x0402, 0x0405],
+        "out_clusters": [0x0019],
+        "manufacturer": "SimLabs",
+        "model": "SimSensor",
+    },
+    "trv": {
+        "logical_type": zdo_t.LogicalType.EndDevice,
+        "device_type": 0x0301,
+        "in_clusters": [0x0000, 0x0001, 0x0003, 0x0201, 0x0204],
+        "out_clusters": [0x0019],
+        "manufacturer": "Danfoss",
+        "model": "eTRV0100",
+        "manufacturer_id": 0x1246,
+        # Manufacturer specific thermostat attributes
+        "manufacturer_attributes": {
+            (1, 0x0201): {
+                0x4000: f.TypeValue(f.DataType.enum8.type_id, t.enum8(0)),
+                0x4003: f.TypeValue(f.DataType.int16.type_id, t.int16s(2100)),
+                0x4015: f.TypeValue(f.DataType.int16.type_id, t.int16s(-8000)),
+            }
+        },
+    },
+}
+
+
+def _default_value(attr_def) -> f.TypeValue | None:
+    """Serializable default value for an attribute known to zigpy"""
+    try:
+        try:
+            value = attr_def.type()
+        except (TypeError, ValueError):
+            # Enumerations
+            value = attr_def.type(0)
+        type_id = f.DataType.from_python_type(attr_def.type).type_id
+        type_value = f.TypeValue(type_id, value)
+        type_value.serialize()
+    except Exception:  # pylint: disable=broad-exception-caught
+        # Structures and lists have no usable default
+        return None
+    return type_value
+
+
+def _is_writable(attr_def) -> bool:
+    access = getattr(attr_def, "access", None)
+    write = getattr(f, "ZCLAttributeAccess", None)
+    if access is None or write is None:
+        return True
+    return bool(access & write.Write)
+
+
+def _node_descriptor(logical_type, sleepy: bool, manufacturer_id: int):
+    mac_flags = 0x80  # Allocate address
+    if logical_type != zdo_t.LogicalType.EndDevice:
+        mac_flags |= 0x0E  # Full function device, mains, rx on when idle
+    elif not sleepy:
+        mac_flags |= 0x08
+    data = (
+        bytes([logical_type, 0x40, mac_flags])
+        + t.uint16_t(manufacturer_id).serialize()
+        + bytes([0x52])
+        + t.uint16_t(0x0052).serialize()
+        + t.uint16_t(0x2C00).serialize()
+        + t.uint16_t(0x0052).serialize()
+        + bytes([0x00])
+    )
+    return zdo_t.NodeDescriptor.deserialize(data)[0]
+
+
+class SimNode:
+    """A simulated device: its behaviour, tables and attribute values
+
+    `attributes` and `manufacturer_attributes` map (endpoint, cluster) to
+    {attribute id: value}, values are TypeValue or python values of the
+    type zigpy defines for the attribute.  Attributes of the clusters that
+    are not given get the zigpy default value.  Manufacturer attributes
+    are only visible to requests with the manufacturer code.
+
+    `neighbours` entries are dicts with ieee, nwk, lqi and optionally
+    depth, device_type (0: coordinator, 1: router, 2: end device) and
+    relationship (0: parent, 1: child, 2: sibling).  `routes` entries
+    have destination, next_hop and status.  `bindings` entries have
+    endpoint, cluster and either group or ieee and dst_endpoint.
+    """
+
+    def __init__(
+        self,
+        ieee: str | t.EUI64,
+        nwk: int,
+        kind: str = "plug",
+        manufacturer: str | None = None,
+        model: str | None = None,
+        manufacturer_id: int | None = None,
+        latency: float = 0.02,
+        jitter: float = 0.0,
+        loss: float = 0.0,
+        sleepy: bool = False,
+        poll_interval: float = 1.0,
+        attributes: dict | None = None,
+        manufacturer_attributes: dict | None = None,
+        read_only: typing.Iterable[tuple[int, int, int]] = (),
+        neighbours: list[dict] | None = None,
+        routes: list[dict] | None = None,
+        bindings: list[dict] | None = None,
+    ):
+        spec = KINDS[kind]
+        self.ieee = t.EUI64.convert(str(ieee))
+        self.nwk = nwk
+        self.kind = kind
+        self.logical_type = spec["logical_type"]
+        self.manufacturer = manufacturer or spec["manufacturer"]
+        self.model = model or spec["model"]
+        self.manufacturer_id = (
+            manufacturer_id
+            if manufacturer_id is not None
+            else spec.get("manufacturer_id", 0x1234)
+        )
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.sleepy = sleepy
+        self.poll_interval = poll_interval
+        self.endpoints = {
+            1: {
+                "profile": PROFILE_HA,
+                "device_type": spec["device_type"],
+                "in_clusters": list(spec["in_clusters"]),
+                "out_clusters": list(spec["out_clusters"]),
+            }
+        }
+        self.attributes: dict[tuple[int, int], dict[int, f.TypeValue]] = {}
+        self._init_values = attributes or {}
+        self.manufacturer_attributes: dict[
+            tuple[int, int], dict[int, f.TypeValue]
+        ] = {}
+        self._init_manf_values = {
+            **spec.get("manufacturer_attributes", {}),
+            **(manufacturer_attributes or {}),
+        }
+        self.read_only = set(read_only)
+        self.neighbours = list(neighbours or [])
+        self.routes = list(routes or [])
+        self.bindings = list(bindings or [])
+        self.reporting: dict[
+            tuple[int, int, int], f.AttributeReportingConfig
+        ] = {}
+        # Cluster specific commands received: (endpoint, cluster, id, payload)
+        self.commands: list[tuple[int, int, int, bytes]] = []
+        self.requests = 0
+        self.lost = 0
+        self.device = None
+        self._phase = 0.0
+
+    # Construction of the zigpy side
+
+    def attach(self, app, rng: random.Random):
+        """Create the zigpy device for this node in app"""
+        self._phase = rng.uniform(0, self.poll_interval)
+        device = app.add_device(self.ieee, self.nwk)
+        device.node_desc = _node_descriptor(
+            self.logical_type, self.sleepy, self.manufacturer_id
+        )
+        device.manufacturer = self.manufacturer
+        device.model = self.model
+        for epid, desc in self.endpoints.items():
+            ep = device.add_endpoint(epid)
+            ep.profile_id = desc["profile"]
+            ep.device_type = desc["device_type"]
+            ep.status = zigpy.endpoint.Status.ZDO_INIT
+            for cluster_id in desc["in_clusters"]:
+                cluster = ep.add_input_cluster(cluster_id)
+                self._init_attributes(epid, cluster)
+            for cluster_id in desc["out_clusters"]:
+                ep.add_output_cluster(cluster_id)
+        basic = self.attributes.get((1, 0x0000))
+        if basic is not None:
+            basic[0x0004] = f.TypeValue(
+                f.DataType.string.type_id, t.CharacterString(self.manufacturer)
+            )
+            basic[0x0005] = f.TypeValue(
+                f.DataType.string.type_id, t.CharacterString(self.model)
+            )
+        self.device = device
+        return device
+
+    def _init_attributes(self, epid, cluster):
+        values = {}
+        given = self._init_values.get((epid, cluster.cluster_id), {})
+        for attr_id, attr_def in cluster.attributes.items():
+            if getattr(attr_def, "is_manufacturer_specific", False):
+                continue
+            value = _default_value(attr_def)
+            if value is not None:
+                values[attr_id] = value
+            if not _is_writable(attr_def):
+                self.read_only.add((epid, cluster.cluster_id, attr_id))
+        for attr_id, value in given.items():
+            values[attr_id] = self._type_value(cluster, attr_id, value)
+        self.attributes[(epid, cluster.cluster_id)] = values
+
+        manf_values = self._init_manf_values.get((epid, cluster.cluster_id))
+        if manf_values:
+            self.manufacturer_attributes[(epid, cluster.cluster_id)] = {
+                attr_id: self._type_value(cluster, attr_id, value)
+                for attr_id, value in manf_values.items()
+            }
+
+    @staticmethod
+    def _type_value(cluster, attr_id, value) -> f.TypeValue:
+        if isinstance(value, f.TypeValue):
+            return value
+        attr_def = cluster.attributes.get(attr_id)
+        if attr_def is None:
+            raise ValueError(
+                f"Attribute 0x{attr_id:04x} is not known on cluster"
+                f" 0x{cluster.cluster_id:04x}, give a TypeValue"
+            )
+        return f.TypeValue(
+            f.DataType.from_python_type(attr_def.type).type_id,
+            attr_def.type(value),
+        )
+
+    @property
+    def is_end_device(self) -> bool:
+        return self.logical_type == zdo_t.LogicalType.EndDevice
+
+    # Radio behaviour
+
+    def delay(self, rng: random.Random) -> float:
+        """One way trip time of a frame"""
+        return (self.latency + rng.uniform(0, self.jitter)) / 2
+
+    def wake_delay(self, now: float) -> float:
+        """Time until a sleepy node polls its parent"""
+        if not self.sleepy:
+            return 0.0
+        elapsed = (now - self._phase) % self.poll_interval
+        return self.poll_interval - elapsed
+
+    # Request handling, returns the response payload or None
+
+    def handle_zcl(self, epid: int, cluster_id: int, data: bytes):
+        hdr, payload = f.ZCLHeader.deserialize(data)
+        direction = hdr.frame_control.direction
+        if direction == f.Direction.Client_to_Server:
+            clusters = self.endpoints.get(epid, {}).get("in_clusters", [])
+        else:
+            clusters = self.endpoints.get(epid, {}).get("out_clusters", [])
+
+        if cluster_id not in clusters:
+            return self._default_response(
+                hdr, f.Status.UNSUPPORTED_CLUSTER, force=True
+            )
+        if hdr.frame_control.is_cluster:
+            self.commands.append((epid, cluster_id, hdr.command_id, payload))
+            return self._default_response(hdr, f.Status.SUCCESS)
+
+        handler = self._GENERAL.get(hdr.command_id)
+        if handler is None:
+            return self._default_response(
+                hdr, f.Status.UNSUP_GENERAL_COMMAND, force=True
+            )
+        request, _ = f.GENERAL_COMMANDS[hdr.command_id].schema.deserialize(
+            payload
+        )
+        if hdr.manufacturer is None:
+            table = self.attributes
+        else:
+            table = self.manufacturer_attributes
+        attrs = table.setdefault((epid, cluster_id), {})
+        return handler(self, hdr, request, (epid, cluster_id), attrs)
+
+    def _reply(self, hdr, command_id, *fields) -> bytes:
+        rsp_hdr = f.ZCLHeader.general(
+            hdr.tsn,
+            command_id,
+            hdr.manufacturer,
+            direction=hdr.frame_control.direction.flip(),
+        )
+        rsp = f.GENERAL_COMMANDS[command_id].schema(*fields)
+        return rsp_hdr.serialize() + rsp.serialize()
+
+    def _default_response(self, hdr, status, force=False):
+        if hdr.frame_control.disable_default_response and not force:
+            return None
+        return self._reply(hdr, GC.Default_Response, hdr.command_id, status)
+
+    def _read_attributes(self, hdr, request, key, attrs):
+        records = []
+        for attr_id in request.attribute_ids:
+            value = attrs.get(attr_id)
+            if value is None:
+                records.append(
+                    f.ReadAttributeRecord(
+                        attr_id, f.Status.UNSUPPORTED_ATTRIBUTE
+                    )
+                )
+            else:
+                records.append(
+                    f.ReadAttributeRecord(attr_id, f.Status.SUCCESS, value)
+                )
+        return self._reply(hdr, GC.Read_Attributes_rsp, records)
+
+    def _write_attributes(self, hdr, request, key, attrs):
+        records = []
+        for attr in request.attributes:
+            if attr.attrid not in attrs:
+                status = f.Status.UNSUPPORTED_ATTRIBUTE
+            elif (*key, attr.attrid) in self.read_only:
+                status = f.Status.READ_ONLY
+            elif attr.value.type != attrs[attr.attrid].type:
+                status = f.Status.INVALID_DATA_TYPE
+            else:
+                status = f.Status.SUCCESS
+                attrs[attr.attrid] = attr.value
+            records.append(f.WriteAttributesStatusRecord(status, attr.attrid))
+        if hdr.command_id == GC.Write_Attributes_No_Response:
+            return None
+        if all(r.status == f.Status.SUCCESS for r in records):
+            records = [f.WriteAttributesStatusRecord(f.Status.SUCCESS)]
+        return self._reply(
+            hdr, GC.Write_Attributes_rsp, f.WriteAttributesResponse(records)
+        )
+
+    def _configure_reporting(self, hdr, request, key, attrs):
+        records = []
+        for config in request.config_records:
+            if config.attrid not in attrs:
+                status = f.Status.UNSUPPORTED_ATTRIBUTE
+            else:
+                status = f.Status.SUCCESS
+                self.reporting[(*key, config.attrid)] = config
+            records.append(
+                f.ConfigureReportingResponseRecord(
+                    status, config.direction, config.attrid
+                )
+            )
+        return self._reply(
+            hdr,
+            GC.Configure_Reporting_rsp,
+            f.ConfigureReportingResponse(records),
+        )
+
+    def _read_reporting_configuration(self, hdr, request, key, attrs):
+        records = []
+        for record in request.attribute_records:
+            config = self.reporting.get((*key, record.attrid))
+            if config is not None:
+                status = f.Status.SUCCESS
+            else:
+                config = f.AttributeReportingConfig()
+                config.direction = record.direction
+                config.attrid = record.attrid
+                status = (
+                    f.Status.UNSUPPORTED_ATTRIBUTE
+                    if record.attrid not in attrs
+                    else f.Status.UNREPORTABLE_ATTRIBUTE
+                )
+            records.append(
+                f.AttributeReportingConfigWithStatus(
+                    status=status, config=config
+                )
+            )
+        return self._reply(hdr, GC.Read_Reporting_Configuration_rsp, records)
+
+    def _discover(self, ids, start, count):
+        ids = sorted(i for i in ids if i >= start)
+        return t.Bool(len(ids) <= count), ids[:count]
+
+    def _discover_attributes(self, hdr, request, key, attrs):
+        complete, ids = self._discover(
+            attrs, request.start_attribute_id, request.max_attribute_ids
+        )
+        if hdr.command_id == GC.Discover_Attributes:
+            records = [
+                f.DiscoverAttributesResponseRecord(i, attrs[i].type)
+                for i in ids
+            ]
+            return self._reply(
+                hdr, GC.Discover_Attributes_rsp, complete, records
+            )
+        records = [
+            f.DiscoverAttributesExtendedResponseRecord(
+                i,
+                attrs[i].type,
+                0b101 if (*key, i) in self.read_only else 0b111,
+            )
+            for i in ids
+        ]
+        return self._reply(hdr, hdr.command_id + 1, complete, records)
+
+    def _discover_commands(self, hdr, request, key, attrs):
+        ep = self.device.endpoints[key[0]]
+        if hdr.frame_control.direction == f.Direction.Client_to_Server:
+            cluster = ep.in_clusters[key[1]]
+        else:
+            cluster = ep.out_clusters[key[1]]
+        if hdr.command_id == GC.Discover_Commands_Received:
+            commands = cluster.server_commands
+        else:
+            commands = cluster.client_commands
+        complete, ids = self._discover(
+            commands, request.start_command_id, request.max_command_ids
+        )
+        return self._reply(hdr, hdr.command_id + 1, complete, ids)
+
+    _GENERAL: dict[int, typing.Callable] = {
+        GC.Read_Attributes: _read_attributes,
+        GC.Write_Attributes: _write_attributes,
+        GC.Write_Attributes_Undivided: _write_attributes,
+        GC.Write_Attributes_No_Response: _write_attributes,
+        GC.Configure_Reporting: _configure_reporting,
+        GC.Read_Reporting_Configuration: _read_reporting_configuration,
+        GC.Discover_Attributes: _discover_attributes,
+        0x15: _discover_attributes,  # Discover attributes extended
+        GC.Discover_Commands_Received: _discover_commands,
+        GC.Discover_Commands_Generated: _discover_commands,
+    }
+
+    def handle_zdo(self, cluster_id: int, payload: bytes) -> bytes:
+        try:
+            cmd = ZDO(cluster_id)
+            handler = getattr(self, f"_zdo_{cmd.name}")
+        except (ValueError, AttributeError):
+            return bytes([zdo_t.Status.NOT_SUPPORTED])
+        _, arg_types = zdo_t.CLUSTERS[cmd]
+        args, _ = t.deserialize(payload, arg_types)
+        return handler(*args)
+
+    def _addresses(self) -> bytes:
+        return self.ieee.serialize() + t.NWK(self.nwk).serialize()
+
+    def _zdo_NWK_addr_req(self, *args):
+        return bytes([zdo_t.Status.SUCCESS]) + self._addresses()
+
+    _zdo_IEEE_addr_req = _zdo_NWK_addr_req
+
+    def _zdo_Node_Desc_req(self, nwk):
+        return (
+            bytes([zdo_t.Status.SUCCESS])
+            + t.NWK(self.nwk).serialize()
+            + self.device.node_desc.serialize()
+        )
+
+    def _zdo_Active_EP_req(self, nwk):
+        return (
+            bytes([zdo_t.Status.SUCCESS])
+            + t.NWK(self.nwk).serialize()
+            + bytes([len(self.endpoints), *self.endpoints])
+        )
+
+    def _zdo_Simple_Desc_req(self, nwk, epid):
+        desc = self.endpoints.get(epid)
+        if desc is None:
+            return bytes([zdo_t.Status.NOT_ACTIVE]) + t.NWK(nwk).serialize()
+        data = (
+            bytes([epid])
+            + t.uint16_t(desc["profile"]).serialize()
+            + t.uint16_t(desc["device_type"]).serialize()
+            + bytes([0x01])
+        )
+        for clusters in (desc["in_clusters"], desc["out_clusters"]):
+            data += bytes([len(clusters)])
+            data += b"".join(t.uint16_t(c).serialize() for c in clusters)
+        return (
+            bytes([zdo_t.Status.SUCCESS])
+            + t.NWK(self.nwk).serialize()
+            + bytes([len(data)])
+            + data
+        )
+
+    @staticmethod
+    def _page(status_entries, start, per_page, serialize) -> bytes:
+        page = status_entries[start : start + per_page]
+        return bytes(
+            [zdo_t.Status.SUCCESS, len(status_entries), start, len(page)]
+        ) + b"".join(serialize(entry) for entry in page)
+
+    def _zdo_Mgmt_Lqi_req(self, start):
+        if self.is_end_device:
+            return bytes([zdo_t.Status.NOT_SUPPORTED])
+
+        def _neighbour(entry):
+            packed = (
+                entry.get("device_type", 1)
+                | (entry.get("rx_on_when_idle", 1) << 2)
+                | (entry.get("relationship", 2) << 4)
+            )
+            return (
+                t.uint64_t(0xDDDD_EEEE_0000_0001).serialize()
+                + t.EUI64.convert(str(entry["ieee"])).serialize()
+                + t.NWK(entry["nwk"]).serialize()
+                + bytes(
+                    [
+                        packed,
+                        entry.get("permit_joining", 2),
+                        entry.get("depth", 1),
+                        entry["lqi"],
+                    ]
+                )
+            )
+
+        return self._page(
+            self.neighbours, start, NEIGHBOURS_PER_PAGE, _neighbour
+        )
+
+    def _zdo_Mgmt_Rtg_req(self, start):
+        if self.is_end_device:
+            return bytes([zdo_t.Status.NOT_SUPPORTED])
+
+        def _route(entry):
+            return (
+                t.NWK(entry["destination"]).serialize()
+                + bytes([entry.get("status", 0)])
+                + t.NWK(entry["next_hop"]).serialize()
+            )
+
+        return self._page(self.routes, start, ROUTES_PER_PAGE, _route)
+
+    def _binding_bytes(self, entry) -> bytes:
+        data = (
+            self.ieee.serialize()
+            + bytes([entry["endpoint"]])
+            + t.uint16_t(entry["cluster"]).serialize()
+        )
+        if "group" in entry:
+            return data + bytes([0x01]) + t.Group(entry["group"]).serialize()
+        return (
+            data
+            + bytes([0x03])
+            + t.EUI64.convert(str(entry["ieee"])).serialize()
+            + bytes([entry["dst_endpoint"]])
+        )
+
+    def _zdo_Mgmt_Bind_req(self, start):
+        return self._page(
+            self.bindings, start, BINDINGS_PER_PAGE, self._binding_bytes
+        )
+
+    @staticmethod
+    def _binding_entry(src_ep, cluster, dst) -> dict:
+        entry = {"endpoint": int(src_ep), "cluster": int(cluster)}
+        if dst.addrmode == 0x01:
+            entry["group"] = int(dst.nwk)
+        else:
+            entry["ieee"] = str(dst.ieee)
+            entry["dst_endpoint"] = int(dst.endpoint)
+        return entry
+
+    def _zdo_Bind_req(self, src, src_ep, cluster, dst):
+        entry = self._binding_entry(src_ep, cluster, dst)
+        if entry not in self.bindings:
+            self.bindings.append(entry)
+        return bytes([zdo_t.Status.SUCCESS])
+
+    def _zdo_Unbind_req(self, src, src_ep, cluster, dst):
+        entry = self._binding_entry(src_ep, cluster, dst)
+        if entry not in self.bindings:
+            return bytes([zdo_t.Status.NO_ENTRY])
+        self.bindings.remove(entry)
+        return bytes([zdo_t.Status.SUCCESS])
+
+    def _zdo_Mgmt_Leave_req(self, *args):
+        return bytes([zdo_t.Status.SUCCESS])
+
+    _zdo_Mgmt_Permit_Joining_req = _zdo_Mgmt_Leave_req
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """Selector advancing the virtual clock instead of waiting"""
+
+    loop: VirtualTimeLoop | None = None
+
+    def select(self, timeout=None):
+        loop = self.loop
+        if loop is None or loop.executor_jobs or timeout is None:
+            # Wait for real for the executor jobs (file I/O) to complete
+            return super().select(timeout)
+        events = super().select(0)
+        if not events and timeout > 0:
+            loop.advance(timeout)
+        return events
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """Event loop whose clock jumps to the next timer when idle
+
+    Only the CPU time of the coroutines and the executor jobs take real
+    time, executor jobs take no virtual time.
+    """
+
+    def __init__(self):
+        selector = _VirtualSelector()
+        super().__init__(selector)
+        selector.loop = self
+        self._now = 0.0
+        self.executor_jobs = 0
+
+    def time(self) -> float:
+        return self._now
+
+    def advance(self, seconds: float) -> None:
+        self._now += seconds
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self.executor_jobs += 1
+        future.add_done_callback(self._executor_job_done)
+        return future
+
+    def _executor_job_done(self, _future) -> None:
+        self.executor_jobs -= 1
+
+
+def run(coro, virtual_time: bool = True):
+    """Run coro in a new event loop, with a virtual clock by default"""
+    factory = VirtualTimeLoop if virtual_time else asyncio.new_event_loop
+    with asyncio.Runner(loop_factory=factory) as runner:
+        return runner.run(coro)
+
+
+class SimApplication(zigpy.application.ControllerApplication):
+    """Controller application whose radio is a SimNetwork"""
+
+    def __init__(self, network: SimNetwork, config: dict | None = None):
+        super().__init__(config or {"device": {"path": "/dev/null"}})
+        self.network = network
+
+    async def send_packet(self, packet: t.ZigbeePacket) -> None:
+        await self.network.deliver(packet)
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def start_network(self):
+        pass
+
+    async def force_remove(self, dev):
+        pass
+
+    async def add_endpoint(self, descriptor):
+        pass
+
+    async def permit_ncp(self, time_s: int = 60):
+        pass
+
+    async def permit_with_link_key(self, node, link_key, time_s: int = 60):
+        pass
+
+    async def write_network_info(self, *, network_info, node_info):
+        self.state.network_info = network_info
+        self.state.node_info = node_info
+
+    async def load_network_info(self, *, load_devices: bool = False):
+        pass
+
+    async def reset_network_info(self):
+        pass
+
+    async def _network_scan(self, channels, duration_exp: int):
+        raise NotImplementedError
+        yield  # pylint: disable=unreachable
+
+    async def _packet_capture(self, channel: int):
+        raise NotImplementedError
+        yield  # pylint: disable=unreachable
+
+    async def _packet_capture_change_channel(self, channel: int):
+        raise NotImplementedError
+
+    async def _subscribe_to_multicast_group(self, group_id):
+        pass
+
+    async def _unsubscribe_from_multicast_group(self, group_id):
+        pass
+
+
+class SimStates:
+    """hass.states stand-in"""
+
+    def __init__(self):
+        self._states: dict[str, types.SimpleNamespace] = {}
+
+    def get(self, entity_id):
+        return self._states.get(entity_id)
+
+    def async_set(
+        self,
+        entity_id,
+        new_state,
+        attributes=None,
+        force_update=False,
+        context=None,
+    ):
+        self._states[entity_id] = types.SimpleNamespace(
+            entity_id=entity_id, state=new_state, attributes=attributes or {}
+        )
+
+    def async_all(self):
+        return list(self._states.values())
+
+
+class SimBus:
+    """hass.bus stand-in, keeps the fired events"""
+
+    def __init__(self):
+        self.events: list[tuple[str, dict | None]] = []
+
+    def fire(self, event_type, event_data=None):
+        self.events.append((event_type, event_data))
+
+    async_fire = fire
+
+    def async_listen(self, event_type, callback):
+        return lambda: None
+
+
+class SimHass:
+    """Minimal hass object: configuration directory, states, bus, executor"""
+
+    def __init__(self, config_dir: str):
+        self.config = types.SimpleNamespace(config_dir=config_dir)
+        self.data: dict[str, typing.Any] = {}
+        self.states = SimStates()
+        self.bus = SimBus()
+
+    async def async_add_executor_job(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, func, *args
+        )
+
+    async_add_import_executor_job = async_add_executor_job
+
+
+class SimDeviceProxy:  # pylint: disable=too-few-public-methods
+    """ZHA device proxy stand-in, for zha_devices"""
+
+    def __init__(self, node: SimNode):
+        self.node = node
+        self.device = node.device
+
+    @property
+    def zha_device_info(self) -> dict[str, typing.Any]:
+        node = self.node
+        return {
+            "ieee": str(node.ieee),
+            "nwk": node.nwk,
+            "manufacturer": node.manufacturer,
+            "model": node.model,
+            "name": f"{node.manufacturer} {node.model}",
+            "quirk_applied": False,
+            "quirk_class": "zigpy.device.Device",
+            "manufacturer_code": node.manufacturer_id,
+            "power_source": "Battery" if node.is_end_device else "Mains",
+            "lqi": node.device.lqi,
+            "rssi": node.device.rssi,
+            "last_seen": None,
+            "available": True,
+            "device_type": node.logical_type.name,
+            "user_given_name": None,
+            "device_reg_id": f"sim{node.nwk:04x}",
+            "area_id": None,
+        }
+
+
+class SimGateway:  # pylint: disable=too-few-public-methods
+    """ZHA gateway proxy stand-in, passed to handlers as the listener"""
+
+    def __init__(self, hass: SimHass, network: SimNetwork):
+        self.hass = hass
+        self.application_controller = network.app
+        self._network = network
+
+    @property
+    def device_proxies(self) -> dict[t.EUI64, SimDeviceProxy]:
+        return {
+            node.ieee: SimDeviceProxy(node)
+            for node in self._network.nodes.values()
+        }
+
+
+class SimServiceCall:  # pylint: disable=too-few-public-methods
+    """ServiceCall stand-in"""
+
+    def __init__(self, service: str, data: dict):
+        self.domain = tk.DOMAIN
+        self.service = service
+        self.data = data
+        self.context = None
+        self.return_response = False
+
+
+class SimNetwork:
+    """Simulated network: the nodes, their application and hass"""
+
+    def __init__(self, seed: int = 0, config_dir: str | None = None):
+        self.rng = random.Random(seed)
+        self.app = SimApplication(self)
+        self.nodes: dict[int, SimNode] = {}
+        self.hass = SimHass(
+            config_dir or tempfile.mkdtemp(prefix="zha_toolkit_sim_")
+        )
+        self.gateway = SimGateway(self.hass, self)
+        self._handlers: dict[str, typing.Callable] | None = None
+
+        self.coordinator = SimNode(
+            COORDINATOR_IEEE, 0x0000, kind="coordinator", latency=0.002
+        )
+        self.app.state.node_info = zigpy.state.NodeInfo(
+            nwk=t.NWK(0x0000),
+            ieee=self.coordinator.ieee,
+            logical_type=zdo_t.LogicalType.Coordinator,
+        )
+        self.add_node(self.coordinator)
+
+    def add_node(self, node: SimNode) -> SimNode:
+        node.attach(self.app, self.rng)
+        self.nodes[node.nwk] = node
+        return node
+
+    def _node(self, address: t.AddrModeAddress) -> SimNode | None:
+        if address.addr_mode == t.AddrMode.NWK:
+            return self.nodes.get(address.address)
+        if address.addr_mode == t.AddrMode.IEEE:
+            for node in self.nodes.values():
+                if node.ieee == address.address:
+                    return node
+        return None
+
+    async def deliver(self, packet: t.ZigbeePacket) -> None:
+        """Send packet to its node, the response is received later"""
+        node = self._node(packet.dst)
+        if node is None:
+            # Broadcast, group or unknown destination: nobody answers
+            return
+        node.requests += 1
+
+        wait = node.wake_delay(asyncio.get_running_loop().time())
+        if wait > INDIRECT_TIMEOUT:
+            await asyncio.sleep(INDIRECT_TIMEOUT)
+            node.lost += 1
+            raise DeliveryError("Sleepy device did not poll in time")
+        await asyncio.sleep(wait + node.delay(self.rng))
+        if self.rng.random() < node.loss:
+            node.lost += 1
+            raise DeliveryError("Simulated frame loss")
+
+        data = packet.data.serialize()
+        if packet.dst_ep == 0:
+            cluster_id = packet.cluster_id | 0x8000
+            rsp = bytes(data[:1]) + node.handle_zdo(
+                packet.cluster_id, data[1:]
+            )
+        else:
+            cluster_id = packet.cluster_id
+            rsp = node.handle_zcl(packet.dst_ep, packet.cluster_id, data)
+        if rsp is None:
+            return
+
+        response = t.ZigbeePacket(
+            src=t.AddrModeAddress(addr_mode=t.AddrMode.NWK, address=node.nwk),
+            src_ep=packet.dst_ep,
+            dst=t.AddrModeAddress(addr_mode=t.AddrMode.NWK, address=0x0000),
+            dst_ep=packet.src_ep,
+            tsn=packet.tsn,
+            profile_id=packet.profile_id,
+            cluster_id=cluster_id,
+            data=t.SerializableBytes(rsp),
+            lqi=self.rng.randint(80, 255),
+            rssi=self.rng.randint(-90, -40),
+        )
+        asyncio.get_running_loop().call_later(
+            node.delay(self.rng), self.app.packet_received, response
+        )
+
+    @property
+    def handlers(self) -> dict[str, typing.Callable]:
+        if self._handlers is None:
+            # pylint: disable-next=protected-access
+            self._handlers = tk._build_handlers(False)
+        return self._handlers
+
+    async def call(self, command: str, **data) -> dict[str, typing.Any]:
+        """Run a toolkit command as the service would, return event_data
+
+        The call is validated with the schema of the service and recorded
+        in the command metrics.  Exceptions are reported in event_data.
+        """
+        schema = tk.SERVICE_SCHEMAS.get(
+            command, tk.SERVICE_SCHEMAS[tk.S.EXECUTE]
+        )
+        service = SimServiceCall(
+            command, schema({tk.ATTR_COMMAND: command, **data})
+        )
+        ref = service.data.get(tk.ATTR_IEEE)
+        ieee = None
+        if ref is not None:
+            ieee = await u.get_ieee(self.app, self.gateway, str(ref))
+        params = u.extractParams(service)
+        event_data: dict[str, typing.Any] = {
+            "ieee_org": ref,
+            "ieee": str(ieee),
+            "command": command,
+            "command_data": service.data.get(tk.ATTR_COMMAND_DATA),
+            "start_time": dt_util.utcnow().isoformat(),
+            "errors": [],
+        }
+        handler = self.handlers.get(command) or getattr(
+            tk, f"command_handler_{command}", tk.command_handler_default
+        )
+
+        error = None
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        command_token = metrics.COMMAND.set(command)
+        try:
+            result = await handler(
+                self.app,
+                self.gateway,
+                ieee,
+                command,
+                event_data["command_data"],
+                service,
+                params=params,
+                event_data=event_data,
+            )
+            if result is not None:
+                event_data["result"] = result
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            error = e
+            event_data["errors"].append(repr(e))
+            event_data["success"] = False
+        finally:
+            metrics.COMMAND.reset(command_token)
+        event_data.setdefault("success", True)
+        event_data["duration"] = loop.time() - start
+        metrics.METRICS.record_command(
+            command, event_data["duration"], error, event_data["success"]
+        )
+        capture.record(
+            service, start, event_data["duration"], event_data["success"]
+        )
+        return event_data
+
+
+def _ieee(index: int) -> str:
+    return "00:0d:6f:00:" + ":".join(
+        f"{b:02x}" for b in index.to_bytes(4, "big")
+    )
+
+
+def build_network(
+    size: int,
+    seed: int = 0,
+    end_devices: float = 0.5,
+    latency: float = 0.02,
+    jitter: float = 0.01,
+    loss: float = 0.0,
+    sleepy: bool = False,
+    poll_interval: float = 1.0,
+    config_dir: str | None = None,
+) -> SimNetwork:
+    """Network of `size` devices around the coordinator
+
+    Routers are plugs meshed with up to 5 other routers, end devices are
+    sensors and TRVs with a router parent.  All nodes have a binding of
+    their first cluster to the coordinator.  The same seed gives the same
+    network.
+    """
+    network = SimNetwork(seed, config_dir)
+    rng = network.rng
+    coordinator = network.coordinator
+    nwks = rng.sample(range(0x0001, 0xFFF8), size)
+
+    n_end = int(size * end_devices)
+    routers: list[SimNode] = []
+    ends: list[SimNode] = []
+    for index, nwk in enumerate(nwks):
+        common = {
+            "latency": latency,
+            "jitter": jitter,
+            "loss": loss,
+        }
+        if index < size - n_end:
+            node = SimNode(_ieee(index + 1), nwk, kind="plug", **common)
+            routers.append(node)
+        else:
+            node = SimNode(
+                _ieee(index + 1),
+                nwk,
+                kind=rng.choice(["sensor", "trv"]),
+                sleepy=sleepy,
+                poll_interval=poll_interval,
+                **common,
+            )
+            ends.append(node)
+        node.bindings.append(
+            {
+                "endpoint": 1,
+                "cluster": node.endpoints[1]["in_clusters"][-1],
+                "ieee": str(coordinator.ieee),
+                "dst_endpoint": 1,
+            }
+        )
+        network.add_node(node)
+
+    def _link(a, b, relationship_ab, relationship_ba, depth):
+        lqi = rng.randint(30, 255)
+        for src, dst, rel in (
+            (a, b, relationship_ab),
+            (b, a, relationship_ba),
+        ):
+            src.neighbours.append(
+                {
+                    "ieee": str(dst.ieee),
+                    "nwk": dst.nwk,
+                    # Links are not perfectly symmetric
+                    "lqi": max(0, min(255, lqi + rng.randint(-20, 20))),
+                    "device_type": dst.logical_type,
+                    "rx_on_when_idle": 0 if dst.sleepy else 1,
+                    "relationship": rel,
+                    "depth": depth,
+                }
+            )
+
+    mesh = [coordinator]
+    for router in routers:
+        for peer in rng.sample(mesh, min(len(mesh), rng.randint(1, 5))):
+            _link(router, peer, 2, 2, 1)
+        mesh.append(router)
+    for end in ends:
+        _link(end, rng.choice(mesh), 0, 1, 2)
+
+    for router in mesh:
+        hops = [n["nwk"] for n in router.neighbours if n["relationship"] == 2]
+        for node in rng.sample(mesh, min(len(mesh), 8)):
+            if node is router or not hops:
+                continue
+            router.routes.append(
+                {"destination": node.nwk, "next_hop": rng.choice(hops)}
+            )
+    return network
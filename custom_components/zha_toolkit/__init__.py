@@ -1,7 +1,9 @@
+import asyncio
 import importlib
 import logging
 import os
-from typing import Any, Optional
+import time
+from typing import Any, Callable, Optional
 
 import homeassistant.helpers.config_validation as cv
 import voluptuous as vol
@@ -16,9 +18,18 @@ from homeassistant.util import dt as dt_util
 from zigpy import types as t
 from zigpy.exceptions import DeliveryError
 
+from . import capture, jobs, lqi, metrics
 from . import params as PARDEFS
 from . import utils as u
-from .const import DOMAIN
+from .const import (
+    CONF_DEV_MODE,
+    CONF_DEVICE_IN_FLIGHT,
+    CONF_LQI_HISTORY_DAYS,
+    CONF_MAX_IN_FLIGHT,
+    CONF_METRICS_STATES,
+    CONF_READ_MERGE_WINDOW,
+    DOMAIN,
+)
 
 DEPENDENCIES = ["zha"]
 
@@ -31,11 +42,32 @@ DATA_ZHATK = "zha_toolkit"
 
 LOGGER = logging.getLogger(__name__)
 
+# Commands run at the same time by batch
+DEFAULT_BATCH_CONCURRENCY = 4
+
 try:
     LOADED_VERSION  # type: ignore[used-before-def] # pylint: disable=used-before-assignment
 except NameError:
     LOADED_VERSION = ""
 
+try:
+    DEV_MODE  # type: ignore[used-before-def] # pylint: disable=used-before-assignment
+except NameError:
+    # Reload handler modules and re-read the version on each call
+    DEV_MODE = False
+
+try:
+    METRICS_STATES  # type: ignore[used-before-def] # pylint: disable=used-before-assignment
+except NameError:
+    # Publish command metrics as sensor.zha_toolkit_<command> states
+    METRICS_STATES = False
+
+try:
+    HANDLERS  # type: ignore[used-before-def] # pylint: disable=used-before-assignment
+except NameError:
+    # Command to handler table, built when registering the services
+    HANDLERS: dict[str, Callable] = {}
+
 try:
     DEFAULT_OTAU  # type: ignore[used-before-def] # pylint: disable=used-before-assignment
 except NameError:
@@ -118,7 +150,9 @@ SERVICE_SCHEMAS = {
         extra=vol.ALLOW_EXTRA,
     ),
     S.ALL_ROUTES_AND_NEIGHBOURS: vol.Schema(
-        {},
+        {
+            vol.Optional(P.CONCURRENCY): cv.positive_int,
+        },
         extra=vol.ALLOW_EXTRA,
     ),
     S.ATTR_READ: vol.Schema(
@@ -129,12 +163,14 @@ SERVICE_SCHEMAS = {
             vol.Optional(P.ENDPOINT): vol.Range(0, 255),
             vol.Optional(P.CLUSTER): vol.Range(0, 0xFFFF),
             vol.Required(P.ATTRIBUTE): vol.Any(
-                vol.Range(0, 0xFFFF), cv.string
+                vol.Range(0, 0xFFFF),
+                cv.string,
+                [vol.Any(vol.Range(0, 0xFFFF), cv.string)],
             ),
             vol.Optional(P.MANF): vol.Range(0, 0xFFFF),
             vol.Optional(P.EXPECT_REPLY): cv.boolean,
-            vol.Optional(P.STATE_ID): cv.string,
-            vol.Optional(P.STATE_ATTR): cv.string,
+            vol.Optional(P.STATE_ID): vol.Any(cv.string, [cv.string]),
+            vol.Optional(P.STATE_ATTR): vol.Any(cv.string, [cv.string]),
             # Template can't be used for check:
             # vol.Optional(P.STATE_VALUE_TEMPLATE): cv.template,
             vol.Optional(P.STATE_VALUE_TEMPLATE): cv.string,
@@ -142,7 +178,29 @@ SERVICE_SCHEMAS = {
             vol.Optional(P.USE_CACHE): vol.Any(vol.Range(0, 2), cv.boolean),
             vol.Optional(P.ALLOW_CREATE): cv.boolean,
             vol.Optional(P.OUTCSV): cv.string,
-            vol.Optional(P.CSVLABEL): cv.string,
+            vol.Optional(P.CSVLABEL): vol.Any(cv.string, [cv.string]),
+        },
+        extra=vol.ALLOW_EXTRA,
+    ),
+    S.ATTR_READ_DEVICES: vol.Schema(
+        {
+            vol.Optional(P.DEVICES): [
+                vol.Any(cv.entity_id_or_uuid, t.EUI64.convert)
+            ],
+            vol.Optional(P.MODEL): cv.string,
+            vol.Optional(P.MANUFACTURER): cv.string,
+            vol.Optional(P.ENDPOINT): vol.Range(0, 255),
+            vol.Required(P.CLUSTER): vol.Range(0, 0xFFFF),
+            vol.Required(P.ATTRIBUTE): vol.Any(
+                vol.Range(0, 0xFFFF),
+                cv.string,
+                [vol.Any(vol.Range(0, 0xFFFF), cv.string)],
+            ),
+            vol.Optional(P.MANF): vol.Range(0, 0xFFFF),
+            vol.Optional(P.USE_CACHE): vol.Any(vol.Range(0, 2), cv.boolean),
+            vol.Optional(P.CONCURRENCY): cv.positive_int,
+            vol.Optional(P.OUTCSV): cv.string,
+            vol.Optional(P.CSVLABEL): vol.Any(cv.string, [cv.string]),
         },
         extra=vol.ALLOW_EXTRA,
     ),
@@ -154,11 +212,15 @@ SERVICE_SCHEMAS = {
             vol.Optional(P.ENDPOINT): vol.Range(0, 255),
             vol.Optional(P.CLUSTER): vol.Range(0, 0xFFFF),
             vol.Required(P.ATTRIBUTE): vol.Any(
-                vol.Range(0, 0xFFFF), cv.string
+                vol.Range(0, 0xFFFF),
+                cv.string,
+                [vol.Any(vol.Range(0, 0xFFFF), cv.string)],
             ),
             vol.Optional(P.ATTR_TYPE): vol.Any(
-                vol.Range(0, 255), cv.string
-            ),  # String is for later
+                vol.Range(0, 255),
+                cv.string,  # String is for later
+                [vol.Any(vol.Range(0, 255), cv.string)],
+            ),
             vol.Required(P.ATTR_VAL): vol.Any(
                 list,
                 vol.Coerce(int),
@@ -166,8 +228,8 @@ SERVICE_SCHEMAS = {
             ),
             vol.Optional(P.MANF): vol.Range(0, 0xFFFF),
             vol.Optional(P.EXPECT_REPLY): cv.boolean,
-            vol.Optional(P.STATE_ID): cv.string,
-            vol.Optional(P.STATE_ATTR): cv.string,
+            vol.Optional(P.STATE_ID): vol.Any(cv.string, [cv.string]),
+            vol.Optional(P.STATE_ATTR): vol.Any(cv.string, [cv.string]),
             # Template can't be used for check:
             # vol.Optional(P.STATE_VALUE_TEMPLATE): cv.template,
             vol.Optional(P.STATE_VALUE_TEMPLATE): cv.string,
@@ -178,7 +240,14 @@ SERVICE_SCHEMAS = {
             vol.Optional(P.READ_AFTER_WRITE): cv.boolean,
             vol.Optional(P.WRITE_IF_EQUAL): cv.boolean,
             vol.Optional(P.OUTCSV): cv.string,
-            vol.Optional(P.CSVLABEL): cv.string,
+            vol.Optional(P.CSVLABEL): vol.Any(cv.string, [cv.string]),
+        },
+        extra=vol.ALLOW_EXTRA,
+    ),
+    S.BATCH: vol.Schema(
+        {
+            vol.Required(P.COMMANDS): [dict],
+            vol.Optional(P.CONCURRENCY): cv.positive_int,
         },
         extra=vol.ALLOW_EXTRA,
     ),
@@ -230,6 +299,16 @@ SERVICE_SCHEMAS = {
         },
         extra=vol.ALLOW_EXTRA,
     ),
+    S.CAPTURE_START: vol.Schema(
+        {
+            vol.Optional(ATTR_COMMAND_DATA): cv.string,
+        },
+        extra=vol.ALLOW_EXTRA,
+    ),
+    S.CAPTURE_STOP: vol.Schema(
+        {},
+        extra=vol.ALLOW_EXTRA,
+    ),
     S.CONF_REPORT: vol.Schema(
         {
             vol.Required(ATTR_IEEE): vol.Any(
@@ -384,6 +463,12 @@ SERVICE_SCHEMAS = {
         },
         extra=vol.ALLOW_EXTRA,
     ),
+    S.JOB_CANCEL: vol.Schema(
+        {
+            vol.Optional(P.JOB_ID): cv.string,
+        },
+        extra=vol.ALLOW_EXTRA,
+    ),
     S.LEAVE: vol.Schema(
         {
             vol.Required(ATTR_IEEE): vol.Any(
@@ -392,6 +477,17 @@ SERVICE_SCHEMAS = {
         },
         extra=vol.ALLOW_EXTRA,
     ),
+    S.LQI_HISTORY: vol.Schema(
+        {
+            vol.Optional(ATTR_IEEE): vol.Any(
+                cv.entity_id_or_uuid, t.EUI64.convert
+            ),
+            vol.Optional(P.DAYS): vol.All(
+                vol.Coerce(float), vol.Range(min=0)
+            ),
+        },
+        extra=vol.ALLOW_EXTRA,
+    ),
     S.MISC_REINITIALIZE: vol.Schema(
         {
             vol.Required(ATTR_IEEE): vol.Any(
@@ -465,11 +561,58 @@ SERVICE_SCHEMAS = {
         },
         extra=vol.ALLOW_EXTRA,
     ),
+    S.SCAN_ALL_DEVICES: vol.Schema(
+        {
+            vol.Optional(P.CONCURRENCY): cv.positive_int,
+            vol.Optional(P.PARALLEL): cv.positive_int,
+            vol.Optional(P.MIN_DELAY): vol.Coerce(float),
+            vol.Optional(P.MAX_DELAY): vol.Coerce(float),
+            vol.Optional(P.FORCE_DISCOVERY): cv.boolean,
+            vol.Optional(P.RESUME): cv.boolean,
+            vol.Optional(P.SCAN_OUTPUT): vol.In(["json", "ndjson", "both"]),
+        },
+        extra=vol.ALLOW_EXTRA,
+    ),
     S.SCAN_DEVICE: vol.Schema(
         {
             vol.Required(ATTR_IEEE): vol.Any(
                 cv.entity_id_or_uuid, t.EUI64.convert
             ),
+            vol.Optional(P.PARALLEL): cv.positive_int,
+            vol.Optional(P.MIN_DELAY): vol.Coerce(float),
+            vol.Optional(P.MAX_DELAY): vol.Coerce(float),
+            vol.Optional(P.FORCE_DISCOVERY): cv.boolean,
+            vol.Optional(P.RESUME): cv.boolean,
+            vol.Optional(P.SCAN_OUTPUT): vol.In(["json", "ndjson", "both"]),
+        },
+        extra=vol.ALLOW_EXTRA,
+    ),
+    S.SCAN_DIFF: vol.Schema(
+        {
+            vol.Optional(ATTR_IEEE): vol.Any(
+                cv.entity_id_or_uuid, t.EUI64.convert
+            ),
+            vol.Optional(P.SCAN_OLD): cv.string,
+            vol.Optional(P.SCAN_NEW): cv.string,
+        },
+        extra=vol.ALLOW_EXTRA,
+    ),
+    S.TRACE_START: vol.Schema(
+        {
+            vol.Optional(ATTR_COMMAND_DATA): cv.string,
+        },
+        extra=vol.ALLOW_EXTRA,
+    ),
+    S.TRACE_STOP: vol.Schema(
+        {},
+        extra=vol.ALLOW_EXTRA,
+    ),
+    S.TOPOLOGY_REFRESH: vol.Schema(
+        {
+            vol.Optional(P.TTL): vol.All(
+                vol.Coerce(float), vol.Range(min=0)
+            ),
+            vol.Optional(P.CONCURRENCY): cv.positive_int,
         },
         extra=vol.ALLOW_EXTRA,
     ),
@@ -573,6 +716,8 @@ COMMON_SCHEMA = {
     vol.Optional(P.EVENT_SUCCESS): cv.string,
     vol.Optional(P.EVENT_FAIL): cv.string,
     vol.Optional(P.EVENT_DONE): cv.string,
+    vol.Optional(P.EVENT_PROGRESS): cv.string,
+    vol.Optional(P.JOB): cv.boolean,
     vol.Optional(
         P.FAIL_EXCEPTION
     ): cv.boolean,  # raise exception when success==False
@@ -586,6 +731,16 @@ DENY_COMMAND_SCHEMA = {
     vol.Optional(ATTR_COMMAND): None,
 }
 
+# Common parameters that only apply to the batch itself, not to its items
+BATCH_ITEM_DENIED = (
+    P.EVENT_SUCCESS,
+    P.EVENT_FAIL,
+    P.EVENT_DONE,
+    P.EVENT_PROGRESS,
+    P.JOB,
+    P.FAIL_EXCEPTION,
+)
+
 
 # Command to internal command mapping for
 #
@@ -600,6 +755,7 @@ CMD_TO_INTERNAL_MAP = {
     S.ADD_TO_GROUP: ["groups", S.ADD_TO_GROUP],
     S.ALL_ROUTES_AND_NEIGHBOURS: ["neighbours", S.ALL_ROUTES_AND_NEIGHBOURS],
     S.ATTR_READ: ["zcl_attr", S.ATTR_READ],
+    S.ATTR_READ_DEVICES: ["zcl_attr", S.ATTR_READ_DEVICES],
     S.ATTR_WRITE: ["zcl_attr", S.ATTR_WRITE],
     S.BACKUP: ["misc", S.BACKUP],
     S.BIND_GROUP: ["binds", S.BIND_GROUP],
@@ -611,12 +767,15 @@ CMD_TO_INTERNAL_MAP = {
     S.GET_ZLL_GROUPS: ["groups", S.GET_ZLL_GROUPS],
     S.HANDLE_JOIN: ["misc", S.HANDLE_JOIN],
     S.IEEE_PING: ["zdo", S.IEEE_PING],
+    S.JOB_CANCEL: ["jobs", S.JOB_CANCEL],
     S.LEAVE: ["zdo", S.LEAVE],
     S.REJOIN: ["misc", S.REJOIN],
     S.REMOVE_ALL_GROUPS: ["groups", S.REMOVE_ALL_GROUPS],
     S.REMOVE_FROM_GROUP: ["groups", S.REMOVE_FROM_GROUP],
     S.REMOVE_GROUP: ["groups", S.REMOVE_GROUP],
+    S.SCAN_ALL_DEVICES: ["scan_device", S.SCAN_ALL_DEVICES],
     S.SCAN_DEVICE: ["scan_device", S.SCAN_DEVICE],
+    S.SCAN_DIFF: ["scan_diff", S.SCAN_DIFF],
     S.UNBIND_COORDINATOR: ["binds", S.UNBIND_COORDINATOR],
     S.UNBIND_GROUP: ["binds", S.UNBIND_GROUP],
     S.ZCL_CMD: ["zcl_cmd", S.ZCL_CMD],
@@ -631,6 +790,21 @@ async def async_setup(hass, config):
     if DOMAIN not in config:
         return True
 
+    conf = config[DOMAIN] or {}
+    u.SCHEDULER.configure(
+        conf.get(CONF_DEVICE_IN_FLIGHT), conf.get(CONF_MAX_IN_FLIGHT)
+    )
+    global DEV_MODE  # pylint: disable=global-statement
+    DEV_MODE = bool(conf.get(CONF_DEV_MODE, False))
+    global METRICS_STATES  # pylint: disable=global-statement
+    METRICS_STATES = bool(conf.get(CONF_METRICS_STATES, False))
+    lqi.HISTORY.retention_days = int(
+        conf.get(CONF_LQI_HISTORY_DAYS, lqi.DEFAULT_RETENTION_DAYS)
+    )
+    u.READ_COALESCER.window = float(
+        conf.get(CONF_READ_MERGE_WINDOW, u.DEFAULT_READ_MERGE_WINDOW)
+    )
+
     try:
         global DEFAULT_OTAU  # pylint: disable=global-statement
         DEFAULT_OTAU = os.path.join(
@@ -666,10 +840,14 @@ async def async_setup(hass, config):
     return True
 
 
-async def register_services(hass):  # noqa: C901
+async def register_services(hass, reload=False):  # noqa: C901
     global LOADED_VERSION  # pylint: disable=global-statement
+    global HANDLERS  # pylint: disable=global-statement
     hass_ref = hass
 
+    # Radio library version by application controller
+    radio_versions: dict[int, str | None] = {}
+
     is_response_data_supported = u.is_ha_ge("2023.7.0")
 
     if is_response_data_supported:
@@ -698,16 +876,12 @@ async def register_services(hass):  # noqa: C901
         # importlib.reload(PARDEFS)
         # S = PARDEFS.SERVICES
 
-        mod_path = f"custom_components.{DOMAIN}"
-        try:
-            module = importlib.import_module(mod_path)
-        except ImportError as err:
-            LOGGER.error("Couldn't load %s module: %s", DOMAIN, err)
-            return
-
         # Disabled reloading ourselves because of "non-blocking" requirements by HA
         # module, currentVersion = await _reload_module(hass)
-        currentVersion = await u.getVersion()
+        if DEV_MODE:
+            currentVersion = await u.getVersion()
+        else:
+            currentVersion = LOADED_VERSION
 
         ieee_str = service.data.get(ATTR_IEEE)
         cmd = service.data.get(ATTR_COMMAND)
@@ -717,6 +891,8 @@ async def register_services(hass):  # noqa: C901
         params = u.extractParams(service)
 
         app = zha_gw.application_controller  # type: ignore
+        if id(app) not in radio_versions:
+            radio_versions[id(app)] = await u.get_radio_version(app)
 
         ieee = await u.get_ieee(app, zha_gw_hass, ieee_str)
 
@@ -736,7 +912,7 @@ async def register_services(hass):  # noqa: C901
         event_data = {
             "zha_toolkit_version": currentVersion,
             "zigpy_version": u.getZigpyVersion(),
-            "zigpy_rf_version": await u.get_radio_version(app),
+            "zigpy_rf_version": radio_versions[id(app)],
             "ieee_org": ieee_str,
             "ieee": str(ieee),
             "command": cmd,
@@ -751,19 +927,27 @@ async def register_services(hass):  # noqa: C901
                 "'ieee' parameter: '%s' -> IEEE Addr: '%s'", ieee_str, ieee
             )
 
-        handler = None
-        try:
-            # Check if existing local handler
-            handler = getattr(module, f"command_handler_{cmd}")
-        except AttributeError:
-            # Not an existing local handler, replace with the service command
-            if service_cmd != "execute":
-                # Actual service name (exists, defined in services.yaml)
-                cmd = service_cmd
-                try:
-                    handler = getattr(module, f"command_handler_{cmd}")
-                except AttributeError:  # nosec
-                    pass
+        handler = None if DEV_MODE else HANDLERS.get(cmd)
+        if handler is None:
+            mod_path = f"custom_components.{DOMAIN}"
+            try:
+                module = importlib.import_module(mod_path)
+            except ImportError as err:
+                LOGGER.error("Couldn't load %s module: %s", DOMAIN, err)
+                return None
+
+            try:
+                # Check if existing local handler
+                handler = getattr(module, f"command_handler_{cmd}")
+            except AttributeError:
+                # Not an existing local handler, replace with the service command
+                if service_cmd != "execute":
+                    # Actual service name (exists, defined in services.yaml)
+                    cmd = service_cmd
+                    try:
+                        handler = getattr(module, f"command_handler_{cmd}")
+                    except AttributeError:  # nosec
+                        pass
 
         if handler is None:
             LOGGER.debug(f"Default handler for {cmd}")
@@ -771,68 +955,111 @@ async def register_services(hass):  # noqa: C901
 
         LOGGER.debug("Handler: %s", handler)
 
-        handler_exception = None
-        handler_result = None
-        try:
-            handler_result = await handler(
-                zha_gw.application_controller,  # type: ignore
-                zha_gw_hass,
-                ieee,
-                cmd,
-                cmd_data,
-                service,
-                params=params,
-                event_data=event_data,
-            )
-        except Exception as e:
-            handler_exception = e
-            event_data["errors"].append(repr(e))
-            event_data["success"] = False
-
-        if "success" not in event_data:
-            event_data["success"] = True
-
-        LOGGER.debug("event_data %s", event_data)
-        # Fire events
-        if event_data["success"]:
-            if params[p.EVT_SUCCESS] is not None:
-                LOGGER.debug(
-                    "Fire %s -> %s", params[p.EVT_SUCCESS], event_data
+        async def run_handler():
+            handler_exception = None
+            handler_result = None
+            cancelled = False
+            started = time.time()
+            start = time.monotonic()
+            command_token = metrics.COMMAND.set(cmd)
+            try:
+                handler_result = await handler(
+                    zha_gw.application_controller,  # type: ignore
+                    zha_gw_hass,
+                    ieee,
+                    cmd,
+                    cmd_data,
+                    service,
+                    params=params,
+                    event_data=event_data,
                 )
+            except asyncio.CancelledError as e:
+                # Job cancelled by job_cancel or at shutdown: still fire the
+                # events so that automations waiting for them do not hang
+                cancelled = True
+                handler_exception = e
+                event_data["errors"].append("Cancelled")
+                event_data["success"] = False
+                event_data["cancelled"] = True
+            except Exception as e:
+                handler_exception = e
+                event_data["errors"].append(repr(e))
+                event_data["success"] = False
+            finally:
+                metrics.COMMAND.reset(command_token)
+
+            if "success" not in event_data:
+                event_data["success"] = True
+
+            duration = time.monotonic() - start
+            stats = metrics.METRICS.record_command(
+                cmd, duration, handler_exception, event_data["success"]
+            )
+            capture.record(service, started, duration, event_data["success"])
+            if METRICS_STATES:
+                metrics.publish_state(u.get_hass(zha_gw_hass), cmd, stats)
+
+            LOGGER.debug("event_data %s", event_data)
+            # Fire events
+            if event_data["success"]:
+                if params[p.EVT_SUCCESS] is not None:
+                    LOGGER.debug(
+                        "Fire %s -> %s", params[p.EVT_SUCCESS], event_data
+                    )
+                    u.get_hass(zha_gw_hass).bus.fire(
+                        params[p.EVT_SUCCESS], event_data
+                    )
+            else:
+                if params[p.EVT_FAIL] is not None:
+                    LOGGER.debug(
+                        "Fire %s -> %s", params[p.EVT_FAIL], event_data
+                    )
+                    u.get_hass(zha_gw_hass).bus.fire(
+                        params[p.EVT_FAIL], event_data
+                    )
+
+            if params[p.EVT_DONE] is not None:
+                LOGGER.debug("Fire %s -> %s", params[p.EVT_DONE], event_data)
                 u.get_hass(zha_gw_hass).bus.fire(
-                    params[p.EVT_SUCCESS], event_data
-                )
-        else:
-            if params[p.EVT_FAIL] is not None:
-                LOGGER.debug("Fire %s -> %s", params[p.EVT_FAIL], event_data)
-                u.get_hass(zha_gw_hass).bus.fire(
-                    params[p.EVT_FAIL], event_data
+                    params[p.EVT_DONE], event_data
                 )
 
-        if params[p.EVT_DONE] is not None:
-            LOGGER.debug("Fire %s -> %s", params[p.EVT_DONE], event_data)
-            u.get_hass(zha_gw_hass).bus.fire(params[p.EVT_DONE], event_data)
+            if cancelled:
+                raise handler_exception
 
-        if handler_exception is not None:
-            LOGGER.error(
-                "Exception '%s' for service call with data '%r'",
-                handler_exception,
-                event_data,
+            if handler_exception is not None:
+                LOGGER.error(
+                    "Exception '%s' for service call with data '%r'",
+                    handler_exception,
+                    event_data,
+                )
+                if params[p.FAIL_EXCEPTION] or not isinstance(
+                    handler_exception, DeliveryError
+                ):
+                    raise handler_exception
+
+            if not event_data["success"] and params[p.FAIL_EXCEPTION]:
+                raise RuntimeError("Success expected, but failed")
+
+            if handler_result is None:
+                return event_data
+            return handler_result
+
+        if params[p.JOB]:
+            # Run in the background, progress is reported through events
+            job = jobs.start_job(
+                u.get_hass(zha_gw_hass), cmd, params, run_handler
             )
-            if params[p.FAIL_EXCEPTION] or not isinstance(
-                handler_exception, DeliveryError
-            ):
-                raise handler_exception
+            event_data["job_id"] = job.job_id
+            if is_response_data_supported and service.return_response:
+                return job.as_dict()
+            return None
 
-        if not event_data["success"] and params[p.FAIL_EXCEPTION]:
-            raise RuntimeError("Success expected, but failed")
+        result = await run_handler()
 
         if is_response_data_supported:
             if service.return_response:
-                if handler_result is None:
-                    return event_data
-
-                return handler_result
+                return result
 
     # Set up all service schemas
     for key, value in SERVICE_SCHEMAS.items():
@@ -860,6 +1087,38 @@ async def register_services(hass):  # noqa: C901
             )
 
     LOADED_VERSION = await u.getVersion()
+    if u.is_ha_ge("2024.6"):
+        # Resolve device references without registry lookups
+        u.IEEE_INDEX.attach(hass)
+    HANDLERS = await hass.async_add_import_executor_job(
+        _build_handlers, reload
+    )
+
+
+def _build_handlers(reload: bool) -> dict[str, Callable]:
+    """Command to handler table, modules are reloaded when 'reload'"""
+    from . import default
+
+    if reload:
+        importlib.reload(default)
+
+    handlers: dict[str, Callable] = {}
+    for cmd in SERVICE_SCHEMAS:
+        local_handler = globals().get(f"command_handler_{cmd}")
+        if local_handler is not None:
+            handlers[cmd] = local_handler
+            continue
+        if cmd == S.EXECUTE:
+            continue
+        try:
+            handlers[cmd] = default.load_handler(
+                CMD_TO_INTERNAL_MAP.get(cmd, cmd), reload
+            )
+        except (ImportError, AttributeError, ValueError) as e:
+            # Resolved on each call by command_handler_default
+            LOGGER.debug("No cached handler for '%s': %r", cmd, e)
+    LOGGER.debug("Cached %s handlers", len(handlers))
+    return handlers
 
 
 async def _reload_module(hass, module):
@@ -903,7 +1162,8 @@ async def command_handler_default(
     else:
         from . import default
 
-        importlib.reload(default)
+        if DEV_MODE:
+            importlib.reload(default)
 
         # Use default handler for generic command loading
         if cmd in CMD_TO_INTERNAL_MAP:
@@ -934,8 +1194,8 @@ def reload_services_yaml(hass):
         async_set_service_schema(hass, DOMAIN, s, s_desc)
 
 
-async def _register_services(hass):
-    await register_services(hass)
+async def _register_services(hass, reload=False):
+    await register_services(hass, reload)
     await hass.async_add_executor_job(reload_services_yaml, hass)
 
 
@@ -945,7 +1205,142 @@ async def _register_services(hass):
 async def command_handler_register_services(
     app, listener, ieee, cmd, data, service, params, event_data
 ):
-    await _register_services(u.get_hass(listener))
+    await _register_services(u.get_hass(listener), reload=True)
+
+
+class BatchServiceCall:  # pylint: disable=too-few-public-methods
+    """Service call for one command of a batch"""
+
+    def __init__(self, service, cmd, data):
+        self.domain = service.domain
+        self.service = cmd
+        self.data = data
+        self.context = service.context
+        self.return_response = False
+
+
+async def command_handler_batch(
+    app, listener, ieee, cmd, data, service, params, event_data
+):
+    """Run a list of toolkit commands
+
+    Commands for the same device run in the given order, at most
+    'concurrency' commands run at the same time.
+    """
+    commands = params[p.COMMANDS]
+    if not isinstance(commands, list) or not commands:
+        raise ValueError(f"'{P.COMMANDS}' must be a list of commands")
+
+    # Validate all commands before starting any of them
+    calls = []
+    for idx, item in enumerate(commands):
+        item = dict(item)
+        item_cmd = item.pop(ATTR_COMMAND, None)
+        if item_cmd in (None, S.BATCH, S.EXECUTE):
+            raise ValueError(
+                f"Command #{idx}: '{ATTR_COMMAND}' must be a toolkit service"
+                f" other than '{S.BATCH}' or '{S.EXECUTE}'"
+            )
+        schema = SERVICE_SCHEMAS.get(item_cmd)
+        if schema is None:
+            raise ValueError(f"Command #{idx}: unknown command '{item_cmd}'")
+        denied = [k for k in BATCH_ITEM_DENIED if k in item]
+        if denied:
+            raise ValueError(
+                f"Command #{idx}: {', '.join(denied)} can only be set"
+                f" on the '{S.BATCH}' call"
+            )
+        schema = schema.extend(COMMON_SCHEMA).extend(DENY_COMMAND_SCHEMA)
+        calls.append(
+            BatchServiceCall(service, item_cmd, schema(item)),
+        )
+
+    # Resolve each device reference once
+    ieees: dict[str, t.EUI64 | None] = {}
+    for call in calls:
+        ref = call.data.get(ATTR_IEEE)
+        if ref is not None and str(ref) not in ieees:
+            ieees[str(ref)] = await u.get_ieee(app, listener, ref)
+
+    # One lane per device, commands without device get their own lane
+    lanes: dict[str, list[int]] = {}
+    for idx, call in enumerate(calls):
+        ref = call.data.get(ATTR_IEEE)
+        key = f"#{idx}" if ref is None else str(ieees[str(ref)])
+        lanes.setdefault(key, []).append(idx)
+
+    concurrency = params[p.CONCURRENCY]
+    if concurrency is None:
+        concurrency = DEFAULT_BATCH_CONCURRENCY
+    sem = asyncio.Semaphore(concurrency)
+    results: list[dict | None] = [None] * len(calls)
+
+    async def _run(idx):
+        call = calls[idx]
+        ref = call.data.get(ATTR_IEEE)
+        item_ieee = None if ref is None else ieees[str(ref)]
+        item_params = u.extractParams(call)
+        item_data = {
+            "ieee_org": ref,
+            "ieee": str(item_ieee),
+            "command": call.service,
+            "command_data": call.data.get(ATTR_COMMAND_DATA),
+            "start_time": dt_util.utcnow().isoformat(),
+            "errors": [],
+            "params": {
+                k: v
+                for k, v in item_params.items()
+                if v is not None and v is not False
+            },
+        }
+        handler = None if DEV_MODE else HANDLERS.get(call.service)
+        if handler is None:
+            handler = globals().get(
+                f"command_handler_{call.service}", command_handler_default
+            )
+        try:
+            handler_result = await handler(
+                app,
+                listener,
+                item_ieee,
+                call.service,
+                item_data["command_data"],
+                call,
+                params=item_params,
+                event_data=item_data,
+            )
+            if handler_result is not None:
+                item_data["result"] = handler_result
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            LOGGER.error("Batch command #%s (%s): %r", idx, call.service, e)
+            item_data["errors"].append(repr(e))
+            item_data["success"] = False
+        item_data.setdefault("success", True)
+        results[idx] = item_data
+
+    async def _run_lane(indexes):
+        # Job progress is reported per command
+        job = jobs.detach()
+        for idx in indexes:
+            async with sem:
+                await _run(idx)
+            if job is not None:
+                job.done += 1
+
+    jobs.set_total(len(calls))
+    await asyncio.gather(*[_run_lane(lane) for lane in lanes.values()])
+
+    event_data["result"] = results
+    event_data["success"] = all(r["success"] for r in results if r)
+
+
+async def async_setup_entry(hass, config_entry: ConfigEntry):
+    """Set up the entry, services are set up from configuration.yaml"""
+    return True
+
+
+async def async_unload_entry(hass, config_entry: ConfigEntry):
+    return True
 
 
 # For migrating from one version to another.
@@ -6,6 +6,7 @@ import zigpy.zcl.foundation as f
 from zigpy import types as t
 from zigpy.zdo.types import MultiAddress, ZDOCmd
 
+from . import jobs
 from . import utils as u
 from .params import INTERNAL_PARAMS as p
 
@@ -495,8 +496,10 @@ async def binds_remove_all(
     errors: list[str] = []
     bindings_removed = []
     bindings_skipped = []
+    jobs.set_total(len(event_data["result"]))
     try:
         for _i, binding in event_data["result"].items():
+            jobs.add_progress()
             LOGGER.debug(f"Remove bind {binding!r}")
             addr_mode = binding["dst"]["addrmode"]
 
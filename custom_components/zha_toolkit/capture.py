@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import logging
+import os
+import typing
+
+from zigpy import types as t
+
+from . import trace
+from . import utils as u
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CAPTURE_FILE = "calls.ndjson"
+CAPTURE_DIR = "captures"
+
+# Not recorded: they only control the capture
+NOT_CAPTURED = ("capture_start", "capture_stop")
+
+try:
+    CAPTURE  # type: ignore[used-before-def] # pylint: disable=used-before-assignment
+except NameError:
+    CAPTURE = trace.Tracer("calls")
+
+
+def _jsonable(value) -> typing.Any:
+    if isinstance(value, t.EUI64):
+        return str(value)
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return u.value_to_jsonable(value)
+
+
+def record(service, start: float, duration: float, success: bool) -> None:
+    """Record a toolkit service call when the capture is active
+
+    start is the time.time() at which the call started.
+    """
+    if not CAPTURE.active or service.service in NOT_CAPTURED:
+        return
+    if service.data.get("command") in NOT_CAPTURED:
+        return
+    CAPTURE.write(
+        {
+            "t": round(start, 6),
+            "service": service.service,
+            "data": _jsonable(dict(service.data)),
+            "duration_ms": round(duration * 1e3, 1),
+            "success": success,
+        }
+    )
+
+
+async def capture_start(
+    app, listener, ieee, cmd, data, service, params, event_data
+):
+    """Start capturing toolkit service calls to captures/<command_data>"""
+    fname = u.normalize_filename(data or DEFAULT_CAPTURE_FILE)
+    file_name = os.path.join(
+        u.get_hass(listener).config.config_dir, CAPTURE_DIR, fname
+    )
+    await u.get_hass(listener).async_add_executor_job(CAPTURE.start, file_name)
+    LOGGER.info("Capturing service calls to '%s'", file_name)
+    event_data["file"] = file_name
+
+
+async def capture_stop(
+    app, listener, ieee, cmd, data, service, params, event_data
+):
+    """Stop capturing toolkit service calls"""
+    event_data["file"] = CAPTURE.file_name
+    await u.get_hass(listener).async_add_executor_job(CAPTURE.stop)
@@ -1 +1,9 @@
 DOMAIN = "zha_toolkit"
+
+# configuration.yaml options
+CONF_DEVICE_IN_FLIGHT = "device_in_flight"
+CONF_MAX_IN_FLIGHT = "max_in_flight"
+CONF_DEV_MODE = "dev_mode"
+CONF_METRICS_STATES = "metrics_states"
+CONF_LQI_HISTORY_DAYS = "lqi_history_days"
+CONF_READ_MERGE_WINDOW = "read_merge_window"
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from . import utils as u
+from .metrics import METRICS
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Command and device request metrics"""
+    return {
+        "version": await u.getVersion(),
+        "scheduler": {
+            "device_in_flight": u.SCHEDULER.device_in_flight,
+            "max_in_flight": u.SCHEDULER.coordinator.limit,
+        },
+        "metrics": METRICS.as_dict(),
+    }
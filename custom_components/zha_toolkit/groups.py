@@ -175,7 +175,7 @@ async def add_to_group(
         if ep_id == 0 or (endpoint_id is not None and ep_id != endpoint_id):
             continue
         LOGGER.debug("Subscribing %s EP %u to group: %s", ieee, ep_id, grp_id)
-        res = await ep.add_to_group(grp_id, f"Group {data}")
+        res = await u.scheduled(ep.add_to_group, grp_id, f"Group {data}")
         result.append(res)
         LOGGER.info(
             "Subscribed %s EP %u to group: %s Result: %r",
@@ -206,7 +206,7 @@ async def remove_from_group(
         LOGGER.debug(
             "Unsubscribing %s EP %u from group: %s", ieee, ep_id, grp_id
         )
-        res = await ep.remove_from_group(grp_id)
+        res = await u.scheduled(ep.remove_from_group, grp_id)
         result.append(res)
         LOGGER.info(
             "Unsubscribed %s EP %u from group: %s Result: %r",
@@ -247,7 +247,7 @@ async def get_zll_groups(
         LOGGER.warning(msg)
         return
 
-    res = await zll_cluster.get_group_identifiers(0)
+    res = await u.scheduled(zll_cluster.get_group_identifiers, 0)
     groups = [g.group_id for g in res[2]]
     LOGGER.debug("Get group identifiers response: %s", groups)
 
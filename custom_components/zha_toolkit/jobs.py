@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable
+
+from homeassistant.util import dt as dt_util
+
+from . import utils as u
+from .params import INTERNAL_PARAMS as p
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PROGRESS_EVENT = "zha_toolkit_job_progress"
+PROGRESS_INTERVAL = 10  # Seconds between progress events
+
+
+class Job:
+    """Service call running as a background task"""
+
+    def __init__(self, command: str, event: str):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.command = command
+        self.event = event
+        self.start_time = dt_util.utcnow().isoformat()
+        self.started = time.monotonic()
+        self.state = "running"
+        self.done = 0
+        self.total: int | None = None
+        self.task: asyncio.Task | None = None
+        self.supervisor: asyncio.Task | None = None
+
+    @property
+    def percent(self) -> float | None:
+        if self.state == "done":
+            return 100.0
+        if not self.total:
+            return None
+        return round(min(100.0, 100.0 * self.done / self.total), 1)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "command": self.command,
+            "state": self.state,
+            "percent": self.percent,
+            "elapsed": round(time.monotonic() - self.started, 1),
+            "start_time": self.start_time,
+        }
+
+
+try:
+    JOBS  # type: ignore[used-before-def] # pylint: disable=used-before-assignment
+except NameError:
+    # Running jobs by job id
+    JOBS: dict[str, Job] = {}
+
+try:
+    CURRENT_JOB  # type: ignore[used-before-def] # pylint: disable=used-before-assignment
+except NameError:
+    # Job of the task being executed, inherited by subtasks
+    CURRENT_JOB: contextvars.ContextVar[Job | None] = contextvars.ContextVar(
+        "zha_toolkit_job", default=None
+    )
+
+
+def set_total(total: int) -> None:
+    """Set the number of steps of the current job (no-op outside jobs)"""
+    job = CURRENT_JOB.get()
+    if job is not None:
+        job.total = total
+        job.done = 0
+
+
+def add_progress(steps: int = 1) -> None:
+    """Mark steps of the current job as complete"""
+    job = CURRENT_JOB.get()
+    if job is not None:
+        job.done += steps
+
+
+def report_progress(done: int, total: int) -> None:
+    """Report absolute progress of the current job"""
+    job = CURRENT_JOB.get()
+    if job is not None:
+        job.done = done
+        job.total = total
+
+
+def detach() -> Job | None:
+    """Stop reporting progress to the job from the current task
+
+    Returns the job so that the caller can report coarser progress.
+    """
+    job = CURRENT_JOB.get()
+    CURRENT_JOB.set(None)
+    return job
+
+
+def _fire(hass, job: Job) -> None:
+    data = job.as_dict()
+    LOGGER.debug("Fire %s -> %s", job.event, data)
+    hass.bus.fire(job.event, data)
+
+
+async def _run(job: Job, run: Callable[[], Awaitable[Any]]) -> None:
+    CURRENT_JOB.set(job)
+    # Requests from jobs yield to interactive service calls
+    u.set_request_priority(u.PRIORITY_BACKGROUND)
+    try:
+        await run()
+    except asyncio.CancelledError:
+        job.state = "cancelled"
+        raise
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        # The handler's own events already reported the failure
+        LOGGER.debug("Job %s (%s) failed: %r", job.job_id, job.command, e)
+        job.state = "failed"
+    else:
+        job.state = "done"
+
+
+async def _supervise(hass, job: Job) -> None:
+    """Fire progress events until the job's task completes"""
+    try:
+        while True:
+            done, _pending = await asyncio.wait(
+                {job.task}, timeout=PROGRESS_INTERVAL
+            )
+            if done:
+                break
+            _fire(hass, job)
+    finally:
+        if job.state == "running":
+            job.state = "cancelled"
+        _fire(hass, job)
+        JOBS.pop(job.job_id, None)
+
+
+def _create_task(hass, coro, name: str) -> asyncio.Task:
+    if hasattr(hass, "async_create_background_task"):
+        # Tracked by Home Assistant, cancelled at shutdown
+        return hass.async_create_background_task(coro, name)
+    return asyncio.create_task(coro, name=name)
+
+
+def start_job(
+    hass, command: str, params, run: Callable[[], Awaitable[Any]]
+) -> Job:
+    """Run 'run' as a tracked background job"""
+    job = Job(command, params[p.EVT_PROGRESS] or DEFAULT_PROGRESS_EVENT)
+    name = f"zha_toolkit job {job.job_id} ({command})"
+    job.task = _create_task(hass, _run(job, run), name)
+    JOBS[job.job_id] = job
+    # Keep a reference to the supervisor with the job
+    job.supervisor = _create_task(
+        hass, _supervise(hass, job), f"{name} supervisor"
+    )
+    LOGGER.info("Started job %s for '%s'", job.job_id, command)
+    return job
+
+
+async def job_cancel(
+    app, listener, ieee, cmd, data, service, params, event_data
+):
+    """Cancel a running job, or list running jobs without 'job_id'"""
+    job_id = params[p.JOB_ID]
+    if job_id is None:
+        event_data["result"] = [job.as_dict() for job in JOBS.values()]
+        return
+
+    job = JOBS.get(job_id)
+    if job is None:
+        raise ValueError(f"No running job with id '{job_id}'")
+
+    job.task.cancel()
+    try:
+        await job.task
+    except asyncio.CancelledError:
+        pass
+    event_data["result"] = job.as_dict()
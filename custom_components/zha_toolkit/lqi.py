@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import datetime
+import logging
+import os
+import struct
+import time
+import typing
+
+import zigpy.zdo.types as zdo_t
+
+from . import utils as u
+from .params import INTERNAL_PARAMS as p
+
+LOGGER = logging.getLogger(__name__)
+
+HISTORY_DIR = "lqi_history"
+DEFAULT_RETENTION_DAYS = 0  # History is opt-in
+DEFAULT_DAYS = 1.0  # Period returned by lqi_history
+
+# Files of one day (UTC) start with MAGIC and contain snapshots: a header
+# (time, router IEEE, number of entries) followed by the entries
+# (neighbour IEEE, LQI, depth, relationship), little endian.
+MAGIC = b"ZTLQ\x01"
+HEADER = struct.Struct("<IQH")
+ENTRY = struct.Struct("<QBBB")
+
+
+def _ieee_int(ieee: str) -> int:
+    return int(str(ieee).replace(":", ""), 16)
+
+
+def _ieee_str(value: int) -> str:
+    return ":".join(f"{b:02x}" for b in value.to_bytes(8, "big"))
+
+
+def _relationship(name: str) -> int:
+    try:
+        return zdo_t.Neighbor.Relationship[name].value
+    except KeyError:
+        return 0xFF
+
+
+def _day(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(
+        timestamp, datetime.timezone.utc
+    ).strftime("%Y%m%d")
+
+
+class LqiHistory:
+    """Append-only store of neighbour table snapshots, a file per day
+
+    Snapshots take 14 bytes plus 11 bytes per neighbour.  Files of days
+    older than retention_days are removed, 0 disables the history.
+    """
+
+    def __init__(self, retention_days: int = DEFAULT_RETENTION_DAYS):
+        self.retention_days = retention_days
+
+    @property
+    def enabled(self) -> bool:
+        return self.retention_days > 0
+
+    @staticmethod
+    def path(directory: str, day: str) -> str:
+        return os.path.join(directory, f"lqi_{day}.bin")
+
+    def append(
+        self, directory: str, router: str, nbns: list, timestamp=None
+    ) -> None:
+        """Add a snapshot of a neighbour table (blocking, use an executor)"""
+        if not self.enabled or not nbns:
+            return
+        timestamp = int(time.time() if timestamp is None else timestamp)
+        data = HEADER.pack(timestamp, _ieee_int(router), len(nbns))
+        data += b"".join(
+            ENTRY.pack(
+                _ieee_int(nbg["ieee"]),
+                nbg["lqi"],
+                min(nbg["depth"], 0xFF),
+                _relationship(nbg["relationship"]),
+            )
+            for nbg in nbns
+        )
+        file_name = self.path(directory, _day(timestamp))
+        if not os.path.isfile(file_name):
+            os.makedirs(directory, exist_ok=True)
+            self.prune(directory, timestamp)
+            data = MAGIC + data
+        with open(file_name, "ab") as f:
+            f.write(data)
+
+    def prune(self, directory: str, now=None) -> None:
+        """Remove the files older than the retention period"""
+        now = time.time() if now is None else now
+        oldest = _day(now - self.retention_days * 86400)
+        for fname in os.listdir(directory):
+            if (
+                fname.startswith("lqi_")
+                and fname.endswith(".bin")
+                and fname[4:-4] < oldest
+            ):
+                LOGGER.debug("Removing LQI history '%s'", fname)
+                os.remove(os.path.join(directory, fname))
+
+    def records(
+        self, directory: str, since: float, until: float | None = None
+    ) -> typing.Iterator[tuple[int, str, str, int, int, int]]:
+        """(time, router, neighbour, lqi, depth, relationship) in the period"""
+        until = time.time() if until is None else until
+        if not os.path.isdir(directory):
+            return
+        first, last = _day(since), _day(until)
+        for fname in sorted(os.listdir(directory)):
+            if not (fname.startswith("lqi_") and fname.endswith(".bin")):
+                continue
+            if not first <= fname[4:-4] <= last:
+                continue
+            with open(os.path.join(directory, fname), "rb") as f:
+                data = f.read()
+            if not data.startswith(MAGIC):
+                LOGGER.warning("'%s' is not a LQI history file", fname)
+                continue
+            yield from _decode(data, len(MAGIC), since, until)
+
+
+def _decode(data: bytes, offset: int, since: float, until: float):
+    while offset + HEADER.size <= len(data):
+        timestamp, router, count = HEADER.unpack_from(data, offset)
+        offset += HEADER.size
+        end = offset + count * ENTRY.size
+        if end > len(data):
+            # Truncated by an interrupted write
+            return
+        if since <= timestamp <= until:
+            router_ieee = _ieee_str(router)
+            for neighbour, lqi, depth, relationship in ENTRY.iter_unpack(
+                data[offset:end]
+            ):
+                yield (
+                    timestamp,
+                    router_ieee,
+                    _ieee_str(neighbour),
+                    lqi,
+                    depth,
+                    relationship,
+                )
+        offset = end
+
+
+def _slope(series: list[tuple[int, int]]) -> float | None:
+    """Least squares LQI change per day"""
+    if len(series) < 2:
+        return None
+    t0 = series[0][0]
+    xs = [(ts - t0) / 86400 for ts, _ in series]
+    ys = [lqi for _, lqi in series]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    var = sum((x - mean_x) ** 2 for x in xs)
+    if var == 0:
+        return None
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    return round(cov / var, 2)
+
+
+def trends(records, ieee: str | None = None, series: bool = False) -> list:
+    """LQI trend per link (router, neighbour), falling LQIs first"""
+    links: dict[tuple[str, str], list[tuple[int, int]]] = {}
+    for timestamp, router, neighbour, lqi, _depth, _rel in records:
+        if ieee is not None and ieee not in (router, neighbour):
+            continue
+        links.setdefault((router, neighbour), []).append((timestamp, lqi))
+
+    result = []
+    for (router, neighbour), samples in links.items():
+        samples.sort()
+        lqis = [lqi for _, lqi in samples]
+        trend: dict[str, typing.Any] = {
+            "router": router,
+            "neighbour": neighbour,
+            "samples": len(samples),
+            "first": lqis[0],
+            "last": lqis[-1],
+            "min": min(lqis),
+            "max": max(lqis),
+            "mean": round(sum(lqis) / len(lqis), 1),
+            "slope_per_day": _slope(samples),
+        }
+        if series:
+            trend["series"] = [
+                [
+                    datetime.datetime.fromtimestamp(
+                        ts, datetime.timezone.utc
+                    ).isoformat(),
+                    lqi,
+                ]
+                for ts, lqi in samples
+            ]
+        result.append(trend)
+    result.sort(
+        key=lambda t: (t["slope_per_day"] is None, t["slope_per_day"] or 0)
+    )
+    return result
+
+
+try:
+    HISTORY  # type: ignore[used-before-def] # pylint: disable=used-before-assignment
+except NameError:
+    HISTORY = LqiHistory()
+
+
+def history_dir(listener) -> str:
+    return os.path.join(u.get_hass(listener).config.config_dir, HISTORY_DIR)
+
+
+async def record(listener, device, nbns: list) -> None:
+    """Add the neighbour table of device to the history"""
+    if not HISTORY.enabled or not nbns:
+        return
+    await u.get_hass(listener).async_add_executor_job(
+        HISTORY.append, history_dir(listener), str(device.ieee), nbns
+    )
+
+
+async def lqi_history(
+    app, listener, ieee, cmd, data, service, params, event_data
+):
+    """LQI trends of the links recorded in the last `days`
+
+    With ieee, only the links from and to the device, with their samples.
+    """
+    if not HISTORY.enabled:
+        LOGGER.warning("LQI history is disabled, set 'lqi_history_days'")
+        event_data["errors"].append(
+            "LQI history is disabled, set 'lqi_history_days' to record it"
+        )
+    days = DEFAULT_DAYS if params[p.DAYS] is None else params[p.DAYS]
+    since = time.time() - days * 86400
+    directory = history_dir(listener)
+    ieee_str = None if ieee is None else str(ieee)
+
+    def _trends():
+        return trends(
+            HISTORY.records(directory, since),
+            ieee_str,
+            series=ieee_str is not None,
+        )
+
+    event_data["result"] = await u.get_hass(listener).async_add_executor_job(
+        _trends
+    )
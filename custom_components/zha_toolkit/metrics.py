@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import collections
+import contextvars
+import logging
+import math
+from typing import Any
+
+from .const import DOMAIN
+
+LOGGER = logging.getLogger(__name__)
+
+# Number of recent latencies kept to compute percentiles
+LATENCY_SAMPLES = 256
+
+# Command run by the current task, its retries are counted with it
+COMMAND: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "zha_toolkit_command", default=None
+)
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return None
+    rank = math.ceil(pct / 100.0 * len(values))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+class Stats:
+    """Counts, recent latencies and error types"""
+
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.retries = 0
+        self.errors: dict[str, int] = {}
+        self.latencies: collections.deque[float] = collections.deque(
+            maxlen=LATENCY_SAMPLES
+        )
+
+    def record(
+        self,
+        latency: float,
+        error: BaseException | None = None,
+        success: bool = True,
+    ) -> None:
+        self.count += 1
+        self.latencies.append(latency)
+        if error is not None or not success:
+            self.failures += 1
+        if error is not None:
+            name = type(error).__name__
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def as_dict(self) -> dict[str, Any]:
+        values = sorted(self.latencies)
+        ms = {}
+        for pct in (50, 95, 99):
+            value = percentile(values, pct)
+            ms[f"p{pct}_ms"] = None if value is None else round(value * 1e3, 1)
+        return {
+            "count": self.count,
+            "failures": self.failures,
+            "retries": self.retries,
+            "errors": dict(self.errors),
+            **ms,
+        }
+
+
+class Metrics:
+    """Service call metrics by command, request metrics by device"""
+
+    def __init__(self):
+        self.commands: dict[str, Stats] = {}
+        self.devices: dict[str, Stats] = {}
+
+    @staticmethod
+    def _stats(table: dict[str, Stats], key: str) -> Stats:
+        stats = table.get(key)
+        if stats is None:
+            stats = Stats()
+            table[key] = stats
+        return stats
+
+    def record_command(
+        self,
+        cmd: str,
+        latency: float,
+        error: BaseException | None = None,
+        success: bool = True,
+    ) -> Stats:
+        stats = self._stats(self.commands, cmd)
+        stats.record(latency, error, success)
+        return stats
+
+    def record_request(
+        self, device, latency: float, error: BaseException | None = None
+    ) -> None:
+        self._stats(self.devices, _device_key(device)).record(latency, error)
+
+    def record_retry(self, device) -> None:
+        self._stats(self.devices, _device_key(device)).retries += 1
+        cmd = COMMAND.get()
+        if cmd is not None:
+            self._stats(self.commands, cmd).retries += 1
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "commands": {
+                k: v.as_dict() for k, v in sorted(self.commands.items())
+            },
+            "devices": {
+                k: v.as_dict() for k, v in sorted(self.devices.items())
+            },
+        }
+
+    def reset(self) -> None:
+        self.commands = {}
+        self.devices = {}
+
+
+def _device_key(device) -> str:
+    return "unknown" if device is None else str(device.ieee)
+
+
+try:
+    METRICS  # type: ignore[used-before-def] # pylint: disable=used-before-assignment
+except NameError:
+    METRICS = Metrics()
+
+
+def publish_state(hass, cmd: str, stats: Stats) -> None:
+    """Publish the metrics of cmd as the state sensor.zha_toolkit_<cmd>
+
+    This is a plain state, not an entity: it has no registry entry and
+    only exists again after the next call of cmd following a restart.
+    """
+    attributes = stats.as_dict()
+    hass.states.async_set(
+        entity_id=f"sensor.{DOMAIN}_{cmd}",
+        new_state=attributes["p95_ms"],
+        attributes={
+            **attributes,
+            "unit_of_measurement": "ms",
+            "friendly_name": f"ZHA Toolkit {cmd} p95 latency",
+        },
+    )
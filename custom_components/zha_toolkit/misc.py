@@ -161,7 +161,9 @@ async def rejoin(app, listener, ieee, cmd, data, service, params, event_data):
             tryIdx += 1
             try:
                 LOGGER.debug(f"Leave with rejoin - try {tryIdx}")
-                res = await src.zdo.leave(remove_children=False, rejoin=True)
+                res = await u.scheduled(
+                    src.zdo.leave, remove_children=False, rejoin=True
+                )
                 event_data["success"] = True
                 triesToGo = 0  # Stop loop
                 # event_data["success"] = (
@@ -285,7 +287,9 @@ async def misc_settime(
         ]  # Time, Timestatus, Timezone, DstStart, DstEnd, DstShift
 
         if params[p.READ_BEFORE_WRITE]:
-            read_resp = await cluster.read_attributes(attr_read_list)
+            read_resp = await u.scheduled(
+                cluster.read_attributes, attr_read_list
+            )
             event_data["read_before"] = (
                 u.dict_to_jsonable(read_resp[0]),
                 read_resp[1],
@@ -302,12 +306,14 @@ async def misc_settime(
             0x0005: dst_shift,  # DstEnd - uint32
         }
 
-        event_data["result_write"] = await cluster.write_attributes(
-            attr_write_list
+        event_data["result_write"] = await u.scheduled(
+            cluster.write_attributes, attr_write_list
         )
 
         if params[p.READ_AFTER_WRITE]:
-            read_resp = await cluster.read_attributes(attr_read_list)
+            read_resp = await u.scheduled(
+                cluster.read_attributes, attr_read_list
+            )
             event_data["read_after"] = (
                 u.dict_to_jsonable(read_resp[0]),
                 read_resp[1],
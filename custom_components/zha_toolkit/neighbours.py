@@ -9,10 +9,15 @@ from random import uniform
 import zigpy.zdo.types as zdo_t
 from zigpy.exceptions import DeliveryError
 
+from . import jobs, lqi, topology
 from . import utils as u
+from .params import INTERNAL_PARAMS as p
 
 LOGGER = logging.getLogger(__name__)
 
+# Routers polled at the same time by all_routes_and_neighbours
+DEFAULT_CONCURRENCY = 1
+
 
 async def get_routes_and_neighbours(
     app, listener, ieee, cmd, data, service, params, event_data
@@ -24,7 +29,10 @@ async def get_routes_and_neighbours(
     LOGGER.debug("Getting routes and neighbours: %s", service)
     device = await u.get_device(app, listener, ieee)
     event_data["result"] = await _routes_and_neighbours(device, listener)
+    await _save_routes_and_neighbours(device, listener, event_data["result"])
+
 
+async def _save_routes_and_neighbours(device, listener, result):
     ieee_tail = "".join([f"{o:02X}" for o in device.ieee])
 
     fname = os.path.join(
@@ -32,7 +40,9 @@ async def get_routes_and_neighbours(
         "scans",
         f"routes_and_neighbours_{ieee_tail}.json",
     )
-    u.helper_save_json(fname, event_data["result"])
+    await u.get_hass(listener).async_add_executor_job(
+        u.helper_save_json, fname, result
+    )
 
     LOGGER.debug("Wrote scan results to '%s'", fname)
 
@@ -48,42 +58,74 @@ async def _routes_and_neighbours(device, listener):
     except asyncio.TimeoutError:
         nbns = []
 
+    topology.TOPOLOGY.update(device, routes, nbns)
+    await lqi.record(listener, device, nbns)
     return {"routes": routes, "neighbours": nbns}
 
 
-async def all_routes_and_neighbours(
-    app, listener, ieee, cmd, data, service, params, event_data
-):
-    LOGGER.debug("Getting routes and neighbours for all devices: %s", service)
-
-    counter = 1
-    devs = [
+def routers(app) -> list:
+    return [
         d
         for d in app.devices.values()
         if d.node_desc is not None and not d.node_desc.is_end_device
     ]
+
+
+async def poll_routers(devs, listener, concurrency: int) -> dict:
+    """Get the tables of the routers, at most `concurrency` at a time
+
+    The pages of the tables of each router are requested one after the
+    other.  The tables of a router are written to its
+    routes_and_neighbours file as soon as they are complete.
+    """
+    sem = asyncio.Semaphore(concurrency)
     all_routes = {}
-    for device in devs:
-        LOGGER.debug(
-            "%s: Querying routes and neighbours: %s out of %s",
-            device.ieee,
-            counter,
-            len(devs),
-        )
-        all_routes[str(device.ieee)] = await _routes_and_neighbours(
-            device, listener
-        )
-        LOGGER.debug("%s: Got %s out of %s", device.ieee, counter, len(devs))
-        counter += 1
-
-    event_data["result"] = all_routes
+    done = 0
+
+    async def _poll(device):
+        nonlocal done
+        # Topology polls yield to interactive service calls
+        u.set_request_priority(u.PRIORITY_BACKGROUND)
+        async with sem:
+            LOGGER.debug("%s: Querying routes and neighbours", device.ieee)
+            result = await _routes_and_neighbours(device, listener)
+        all_routes[str(device.ieee)] = result
+        await _save_routes_and_neighbours(device, listener, result)
+        done += 1
+        LOGGER.debug("%s: Got %s out of %s", device.ieee, done, len(devs))
+        jobs.report_progress(done, len(devs))
+
+    await asyncio.gather(*[_poll(device) for device in devs])
+
+    # Same order as the devices, whatever the order of completion
+    return {str(device.ieee): all_routes[str(device.ieee)] for device in devs}
+
+
+async def all_routes_and_neighbours(
+    app, listener, ieee, cmd, data, service, params, event_data
+):
+    """Get the routing and neighbour tables of all routers
+
+    Up to `concurrency` routers are polled at the same time (see
+    poll_routers).
+    """
+    LOGGER.debug("Getting routes and neighbours for all devices: %s", service)
+
+    concurrency = params[p.CONCURRENCY]
+    if concurrency is None:
+        concurrency = DEFAULT_CONCURRENCY
+    event_data["result"] = await poll_routers(
+        routers(app), listener, concurrency
+    )
 
     all_routes_name = os.path.join(
         u.get_hass(listener).config.config_dir,
         "scans",
         "all_routes_and_neighbours.json",
     )
-    u.helper_save_json(all_routes_name, all_routes)
+    await u.get_hass(listener).async_add_executor_job(
+        u.helper_save_json, all_routes_name, event_data["result"]
+    )
 
 
 async def async_get_neighbours(device):
@@ -109,8 +151,8 @@ async def async_get_neighbours(device):
     idx = 0
     while True:
         try:
-            status, val = await device.zdo.request(
-                zdo_t.ZDOCmd.Mgmt_Lqi_req, idx
+            status, val = await u.scheduled(
+                device.zdo.request, zdo_t.ZDOCmd.Mgmt_Lqi_req, idx
             )
             LOGGER.debug(
                 "%s: neighbour request Status: %s. Response: %r",
@@ -179,8 +221,8 @@ async def async_get_routes(device):
     idx = 0
     while True:
         try:
-            status, val = await device.zdo.request(
-                zdo_t.ZDOCmd.Mgmt_Rtg_req, idx
+            status, val = await u.scheduled(
+                device.zdo.request, zdo_t.ZDOCmd.Mgmt_Rtg_req, idx
             )
             LOGGER.debug(
                 "%s: route request Status:%s. Routes: %r",
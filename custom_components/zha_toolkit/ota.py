@@ -6,7 +6,7 @@ from glob import glob
 import aiohttp
 import zigpy
 
-from . import DEFAULT_OTAU
+from . import DEFAULT_OTAU, jobs
 from . import utils as u
 from .params import INTERNAL_PARAMS as p
 
@@ -211,9 +211,14 @@ async def ota_notify(
             DEFAULT_OTAU,
         )
 
+        # Downloads take most of the time, the notification is one step
+        jobs.report_progress(0, 4)
         await download_zigpy_ota(app, listener)
+        jobs.add_progress()
         await download_koenkk_ota(listener, ota_dir)
+        jobs.add_progress()
         await download_sonoff_ota(listener, ota_dir)
+        jobs.add_progress()
 
     # Get tries
     tries = params[p.TRIES]
@@ -250,7 +255,7 @@ async def ota_notify(
 
     ret = None
     if not u.is_zigpy_ge("0.45.0"):
-        ret = await cluster.image_notify(0, 100)
+        ret = await u.scheduled(cluster.image_notify, 0, 100)
     else:
         cmd_args = [0, 100]
         ret = await u.retry_wrapper(
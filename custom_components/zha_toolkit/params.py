@@ -27,6 +27,9 @@ class USER_PARAMS_consts:  # pylint: disable=too-few-public-methods
     EVENT_SUCCESS = "event_success"
     EVENT_FAIL = "event_fail"
     EVENT_DONE = "event_done"
+    EVENT_PROGRESS = "event_progress"
+    JOB = "job"
+    JOB_ID = "job_id"
     FORCE_UPDATE = "force_update"
     FAIL_EXCEPTION = "fail_exception"
     READ_BEFORE_WRITE = "read_before_write"
@@ -40,6 +43,21 @@ class USER_PARAMS_consts:  # pylint: disable=too-few-public-methods
     USE_CACHE = "use_cache"
     JSON_OUT = "json_out"
     JSON_TIMESTAMP = "json_timestamp"
+    PARALLEL = "parallel"
+    MIN_DELAY = "min_delay"
+    MAX_DELAY = "max_delay"
+    FORCE_DISCOVERY = "force_discovery"
+    RESUME = "resume"
+    CONCURRENCY = "concurrency"
+    SCAN_OUTPUT = "scan_output"
+    SCAN_OLD = "scan_old"
+    SCAN_NEW = "scan_new"
+    COMMANDS = "commands"
+    TTL = "ttl"
+    DAYS = "days"
+    DEVICES = "devices"
+    MODEL = "model"
+    MANUFACTURER = "manufacturer"
 
 
 class SERVICE_consts:  # pylint: disable=too-few-public-methods
@@ -51,12 +69,16 @@ class SERVICE_consts:  # pylint: disable=too-few-public-methods
     ADD_TO_GROUP = "add_to_group"
     ALL_ROUTES_AND_NEIGHBOURS = "all_routes_and_neighbours"
     ATTR_READ = "attr_read"
+    ATTR_READ_DEVICES = "attr_read_devices"
     ATTR_WRITE = "attr_write"
     BACKUP = "backup"
+    BATCH = "batch"
     BIND_GROUP = "bind_group"
     BIND_IEEE = "bind_ieee"
     BINDS_GET = "binds_get"
     BINDS_REMOVE_ALL = "binds_remove_all"
+    CAPTURE_START = "capture_start"
+    CAPTURE_STOP = "capture_stop"
     CONF_REPORT = "conf_report"
     CONF_REPORT_READ = "conf_report_read"
     EZSP_ADD_KEY = "ezsp_add_key"
@@ -77,7 +99,9 @@ class SERVICE_consts:  # pylint: disable=too-few-public-methods
     HANDLE_JOIN = "handle_join"
     HA_SET_STATE = "ha_set_state"
     IEEE_PING = "ieee_ping"
+    JOB_CANCEL = "job_cancel"
     LEAVE = "leave"
+    LQI_HISTORY = "lqi_history"
     MISC_REINITIALIZE = "misc_reinitialize"
     MISC_SETTIME = "misc_settime"
     OTA_NOTIFY = "ota_notify"
@@ -86,8 +110,13 @@ class SERVICE_consts:  # pylint: disable=too-few-public-methods
     REMOVE_ALL_GROUPS = "remove_all_groups"
     REMOVE_FROM_GROUP = "remove_from_group"
     REMOVE_GROUP = "remove_group"
+    SCAN_ALL_DEVICES = "scan_all_devices"
     SCAN_DEVICE = "scan_device"
+    SCAN_DIFF = "scan_diff"
     STATE_VALUE_TEMPLATE = "state_value_template"
+    TRACE_START = "trace_start"
+    TRACE_STOP = "trace_stop"
+    TOPOLOGY_REFRESH = "topology_refresh"
     TUYA_MAGIC = "tuya_magic"
     UNBIND_COORDINATOR = "unbind_coordinator"
     UNBIND_GROUP = "unbind_group"
@@ -119,11 +148,14 @@ class INTERNAL_PARAMS_consts:  # pylint: disable=too-few-public-methods
     EP_ID = "endpoint_id"
     DST_EP_ID = "dst_endpoint_id"
     EVT_DONE = "event_done"
+    EVT_PROGRESS = "event_progress"
     EVT_FAIL = "event_fail"
     EVT_SUCCESS = "event_success"
     EXPECT_REPLY = "expect_reply"
     FAIL_EXCEPTION = "fail_exception"
     FORCE_UPDATE = "force_update"
+    JOB = "job"
+    JOB_ID = "job_id"
     MANF = "manf"
     MAX_INTERVAL = "max_interval"
     MIN_INTERVAL = "min_interval"
@@ -142,6 +174,21 @@ class INTERNAL_PARAMS_consts:  # pylint: disable=too-few-public-methods
     DOWNLOAD = "download"
     PATH = "path"
     USE_CACHE = "use_cache"
+    PARALLEL = "parallel"
+    MIN_DELAY = "min_delay"
+    MAX_DELAY = "max_delay"
+    FORCE_DISCOVERY = "force_discovery"
+    RESUME = "resume"
+    CONCURRENCY = "concurrency"
+    SCAN_OUTPUT = "scan_output"
+    SCAN_OLD = "scan_old"
+    SCAN_NEW = "scan_new"
+    COMMANDS = "commands"
+    TTL = "ttl"
+    DAYS = "days"
+    DEVICES = "devices"
+    MODEL = "model"
+    MANUFACTURER = "manufacturer"
 
 
 INTERNAL_PARAMS = INTERNAL_PARAMS_consts()
@@ -1,12 +1,19 @@
 from __future__ import annotations
 
 import asyncio
+import copy
+import hashlib
+import json
 import logging
+import os
+import time
+import typing
 
 from zigpy import types as t
 from zigpy.exceptions import ControllerException, DeliveryError
 from zigpy.zcl import foundation
 
+from . import jobs
 from . import utils as u
 from .params import INTERNAL_PARAMS as p
 
@@ -15,6 +22,457 @@ LOGGER = logging.getLogger(__name__)
 
 ACCESS_CONTROL_MAP = {0x01: "READ", 0x02: "WRITE", 0x04: "REPORT"}
 
+# Number of awake devices scanned at once by scan_all_devices (default)
+DEFAULT_CONCURRENCY = 4
+# Number of sleepy end devices scanned at once by scan_all_devices
+SLEEPY_CONCURRENCY = 1
+
+# Bounds for the delay between scan requests (seconds)
+DEFAULT_MIN_DELAY = 0.02
+DEFAULT_MAX_DELAY = 2.0
+# Delay used for the first requests to an unknown device (seconds)
+INITIAL_DELAY = 0.2
+
+
+class ScanPacer:
+    """Adaptive delay between the scan requests sent to a device
+
+    The delay shrinks towards the measured round trip time while the
+    device answers and doubles on DeliveryError or timeouts, always
+    staying within [min_delay, max_delay].
+    """
+
+    def __init__(
+        self,
+        min_delay: float = DEFAULT_MIN_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+    ):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay = INITIAL_DELAY
+        self.rtt: float | None = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.set_bounds(min_delay, max_delay)
+
+    def set_bounds(self, min_delay=None, max_delay=None):
+        if min_delay is not None:
+            self.min_delay = float(min_delay)
+        if max_delay is not None:
+            self.max_delay = float(max_delay)
+        self.max_delay = max(self.min_delay, self.max_delay)
+        self._clamp()
+
+    def _clamp(self):
+        self.delay = min(self.max_delay, max(self.min_delay, self.delay))
+
+    def _success(self, rtt: float):
+        self.requests += 1
+        self.rtt = rtt if self.rtt is None else 0.8 * self.rtt + 0.2 * rtt
+        self.error_rate *= 0.8
+        if self.error_rate < 0.2:
+            # Device answers reliably: get closer to its round trip time
+            self.delay = max(0.75 * self.delay, self.rtt)
+        self._clamp()
+
+    def _failure(self):
+        self.requests += 1
+        self.errors += 1
+        self.error_rate = 0.8 * self.error_rate + 0.2
+        self.delay *= 2
+        self._clamp()
+
+    async def request(self, func, *args, **kwargs):
+        """Run one request, measuring its round trip time"""
+        start = time.monotonic()
+        try:
+            result = await func(*args, **kwargs)
+        except (DeliveryError, asyncio.TimeoutError):
+            self._failure()
+            raise
+        self._success(time.monotonic() - start)
+        return result
+
+    async def wait(self):
+        """Wait before sending the next request"""
+        await asyncio.sleep(self.delay)
+
+    def as_dict(self):
+        return {
+            "delay": round(self.delay, 3),
+            "rtt": round(self.rtt, 3) if self.rtt is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+
+
+# Pacers are kept per device so that a new scan starts with the delay
+# learned during the previous one (survives module reloads).
+try:
+    PACERS  # type: ignore[used-before-def] # pylint: disable=used-before-assignment
+except NameError:
+    PACERS: dict[t.EUI64, ScanPacer] = {}
+
+
+def get_pacer(device) -> ScanPacer:
+    """Get the request pacer for the device"""
+    pacer = PACERS.get(device.ieee)
+    if pacer is None:
+        pacer = ScanPacer()
+        PACERS[device.ieee] = pacer
+    return pacer
+
+
+# Page sizes used when nothing was learned yet for a cluster
+DEFAULT_DISCOVERY_COUNT = 16
+DEFAULT_READ_CHUNK = 4
+# Record sizes in discovery and read attribute responses (bytes)
+ATTR_EXT_RECORD_SIZE = 4  # attrid, datatype, acl
+COMMAND_RECORD_SIZE = 1  # command id
+# Largest pages that fit in a single unfragmented frame
+MAX_ATTR_DISCOVERY_COUNT = (
+    u.ZCL_MAX_PAYLOAD - u.ZCL_HEADER_SIZE - 1
+) // ATTR_EXT_RECORD_SIZE
+MAX_CMD_DISCOVERY_COUNT = (
+    u.ZCL_MAX_PAYLOAD - u.ZCL_HEADER_SIZE - 1
+) // COMMAND_RECORD_SIZE
+MAX_READ_CHUNK = (u.ZCL_MAX_PAYLOAD - u.ZCL_HEADER_SIZE) // (
+    u.READ_RECORD_SIZE + 1
+)
+
+PAGE_SIZES_FNAME = "scan_page_sizes.json"
+
+# Page sizes learned per manufacturer/model/cluster, so that later scans
+# of the same kind of device start at the right size.
+try:
+    PAGE_SIZES  # type: ignore[used-before-def] # pylint: disable=used-before-assignment
+except NameError:
+    PAGE_SIZES: dict[str, dict[str, int]] = {}
+
+
+def _page_key(cluster) -> str:
+    device = cluster.endpoint.device
+    return f"{device.manufacturer}/{device.model}/0x{cluster.cluster_id:04x}"
+
+
+def get_page_size(cluster, kind: str, default: int) -> int:
+    """Get the learned page size for the request kind on the cluster"""
+    return PAGE_SIZES.get(_page_key(cluster), {}).get(kind, default)
+
+
+def set_page_size(cluster, kind: str, size: int):
+    PAGE_SIZES.setdefault(_page_key(cluster), {})[kind] = size
+
+
+MANF_PASS_FNAME = "scan_manf_pass.json"
+
+# Usefulness of the manufacturer specific attribute discovery, learned per
+# manufacturer/model/cluster.
+try:
+    MANF_PASS  # type: ignore[used-before-def] # pylint: disable=used-before-assignment
+except NameError:
+    MANF_PASS: dict[str, bool] = {}
+
+
+def needs_manf_pass(cluster, attributes) -> bool:
+    """Tell if the manufacturer specific attribute discovery can be useful
+
+    `attributes` is the result of the discovery without manufacturer code.
+    """
+    decision = MANF_PASS.get(_page_key(cluster))
+    if decision is not None:
+        return decision
+    if cluster.cluster_id >= 0xFC00:  # Manufacturer specific cluster
+        return True
+    for attr_def in cluster.attributes.values():
+        # Manufacturer specific attributes known from a quirk
+        if getattr(attr_def, "is_manufacturer_specific", False):
+            return True
+    for attr_id in attributes:
+        # Vendor range attribute unknown to zigpy in the first pass
+        attr_id = int(attr_id, 16)
+        if 0x4000 <= attr_id < 0xFFFD and attr_id not in cluster.attributes:
+            return True
+    return False
+
+
+def _next_discovery_count(count, received, done, max_count):
+    """Page size and its upper bound for the next discovery request"""
+    if not done and 0 < received < count:
+        # Device returns less records than asked: that is its limit
+        return received, received
+    if received >= count:
+        # Full page: try a larger one while it fits in a single frame
+        return min(max_count, 2 * count), max_count
+    return count, max_count
+
+
+def _failed_page(size, default):
+    """Page size and its upper bound after a failed page larger than default
+
+    The device does not handle pages of that size: do not grow back to it.
+    """
+    return default, max(default, size // 2)
+
+
+def _next_read_chunk(to_read, value_sizes, limit):
+    """Take the next attributes to read, keeping the response in one frame"""
+    budget = u.ZCL_MAX_PAYLOAD - u.ZCL_HEADER_SIZE
+    chunk = []
+    for attr_id in to_read:
+        size = u.READ_RECORD_SIZE + value_sizes.get(
+            attr_id, u.VARIABLE_VALUE_SIZE
+        )
+        if chunk and (len(chunk) >= limit or size > budget):
+            break
+        chunk.append(attr_id)
+        budget -= size
+    return chunk, to_read[len(chunk) :]
+
+
+# Pages recorded between two writes of a scan checkpoint
+CHECKPOINT_SAVE_EVERY = 10
+
+
+class ScanCheckpoint:
+    """Progress of a device scan, recorded after every completed page
+
+    Each discovery and read task (per endpoint, cluster, manufacturer)
+    records where it stands so that an interrupted scan can resume
+    from the last good page.  The file is written in the executor every
+    CHECKPOINT_SAVE_EVERY pages and when a task completes.
+    """
+
+    def __init__(self, listener, ieee):
+        self.listener = listener
+        ieee_tail = "".join([f"{o:02x}" for o in ieee[::-1]])
+        self.fname = f"scan_checkpoint_{ieee_tail}.json"
+        self.pages: dict[str, dict] = {}
+        self.unsaved = 0
+        self._lock = asyncio.Lock()
+        self._saves: set[asyncio.Task] = set()
+
+    async def load(self):
+        data = await u.read_json_from_file(
+            "scans", self.fname, listener=self.listener, default={}
+        )
+        self.pages = data.get("pages", {})
+        LOGGER.debug("Resuming scan from %s pages", len(self.pages))
+
+    @staticmethod
+    def _key(cluster, kind, manufacturer):
+        return (
+            f"{cluster.endpoint.endpoint_id}/{_cluster_direction(cluster)}"
+            f"/0x{cluster.cluster_id:04x}/{kind}/{manufacturer}"
+        )
+
+    def get(self, cluster, kind, manufacturer=None) -> dict | None:
+        return self.pages.get(self._key(cluster, kind, manufacturer))
+
+    def set(self, cluster, kind, manufacturer, state: dict):
+        self.pages[self._key(cluster, kind, manufacturer)] = state
+        self.unsaved += 1
+        task_done = state.get("done", True) and not state.get("to_read")
+        if task_done or self.unsaved >= CHECKPOINT_SAVE_EVERY:
+            self.unsaved = 0
+            task = asyncio.get_running_loop().create_task(self._save())
+            self._saves.add(task)
+            task.add_done_callback(self._saves.discard)
+
+    async def _save(self):
+        async with self._lock:
+            # Copy on the event loop, the scan keeps updating the pages
+            await u.get_hass(self.listener).async_add_executor_job(
+                u.write_json_to_file,
+                {"pages": copy.deepcopy(self.pages)},
+                "scans",
+                self.fname,
+                "scan checkpoint",
+                self.listener,
+            )
+
+    async def flush(self):
+        """Write the progress not saved yet and wait for the writes"""
+        if self.unsaved:
+            self.unsaved = 0
+            await self._save()
+        if self._saves:
+            await asyncio.gather(*self._saves)
+
+    def is_complete(self) -> bool:
+        """True when all discoveries are done and all values were read"""
+        return all(
+            state.get("done", True) and not state.get("to_read")
+            for state in self.pages.values()
+        )
+
+    async def remove(self):
+        await self.flush()
+        fname = os.path.join(
+            u.get_hass(self.listener).config.config_dir, "scans", self.fname
+        )
+
+        def _remove():
+            if os.path.isfile(fname):
+                os.remove(fname)
+
+        await u.get_hass(self.listener).async_add_executor_job(_remove)
+
+
+# Checkpoints of the scans in progress, a device is scanned once at a time
+try:
+    CHECKPOINTS  # type: ignore[used-before-def] # pylint: disable=used-before-assignment
+except NameError:
+    CHECKPOINTS: dict[t.EUI64, ScanCheckpoint] = {}
+
+
+def get_checkpoint(cluster) -> ScanCheckpoint | None:
+    """Get the checkpoint of the scan in progress for the cluster's device"""
+    return CHECKPOINTS.get(cluster.endpoint.device.ieee)
+
+
+def _int_keys(values: dict) -> dict:
+    """Restore integer keys of a dict loaded from JSON"""
+    return {int(k): v for k, v in values.items()}
+
+
+def _cluster_direction(cluster) -> str:
+    if cluster.endpoint.in_clusters.get(cluster.cluster_id) is cluster:
+        return "in_clusters"
+    return "out_clusters"
+
+
+class ScanStream:
+    """NDJSON scan output, records are appended as soon as discovered
+
+    Each line is a JSON object with a "record" field: "device",
+    "endpoint", "cluster", "attribute", "attribute_value" or "command".
+    """
+
+    def __init__(self, listener, fname):
+        self.listener = listener
+        self.fname = fname
+        self.started = False
+
+    async def append(self, records: list[dict]):
+        await u.append_to_ndjsonfile(
+            records,
+            subdir="scans",
+            fname=self.fname,
+            desc="scan records",
+            listener=self.listener,
+            overwrite=not self.started,
+            normalize_name=True,
+        )
+        self.started = True
+
+
+# Streams of the scans in progress
+try:
+    STREAMS  # type: ignore[used-before-def] # pylint: disable=used-before-assignment
+except NameError:
+    STREAMS: dict[t.EUI64, ScanStream] = {}
+
+
+async def _emit(device, record, entries, cluster=None):
+    """Stream scan records for the device when NDJSON output is active"""
+    stream = STREAMS.get(device.ieee)
+    if stream is None or not entries:
+        return
+    base = {"record": record}
+    if cluster is not None:
+        base["endpoint"] = cluster.endpoint.endpoint_id
+        base["direction"] = _cluster_direction(cluster)
+        base["cluster_id"] = f"0x{cluster.cluster_id:04x}"
+    await stream.append([{**base, **entry} for entry in entries])
+
+
+async def _emit_values(cluster, result, attr_ids, manufacturer=None):
+    """Stream the values of attr_ids read into result"""
+    await _emit(
+        cluster.endpoint.device,
+        "attribute_value",
+        [
+            {
+                "attribute_id": f"0x{attr_id:04x}",
+                **(
+                    {"manf_id": manufacturer} if u.isManf(manufacturer) else {}
+                ),
+                "attribute_value": result[attr_id]["attribute_value"],
+            }
+            for attr_id in attr_ids
+            if "attribute_value" in result[attr_id]
+        ],
+        cluster,
+    )
+
+
+def scan_from_records(records) -> dict:
+    """Rebuild the scan results from streamed NDJSON records"""
+    # pylint: disable=too-many-locals
+    scan: dict = {}
+    endpoints: dict[int, dict] = {}
+    clusters: dict[tuple, dict] = {}
+    attributes: dict[tuple, dict] = {}
+    values: dict[tuple, typing.Any] = {}
+
+    for rec in records:
+        kind = rec.pop("record")
+        if kind == "device":
+            scan.update(rec)
+            continue
+        if kind == "endpoint":
+            endpoint = endpoints.setdefault(rec["id"], rec)
+            if rec["id"] != 242:
+                endpoint.setdefault("in_clusters", {})
+                endpoint.setdefault("out_clusters", {})
+            continue
+        key = (rec.pop("endpoint"), rec.pop("direction"), rec["cluster_id"])
+        if kind == "cluster":
+            clusters.setdefault(
+                key,
+                {
+                    **rec,
+                    "attributes": {},
+                    "commands_received": {},
+                    "commands_generated": {},
+                },
+            )
+        elif kind == "attribute":
+            attr_key = (*key, rec["attribute_id"], rec.get("manf_id"))
+            attributes[attr_key] = {
+                k: v for k, v in rec.items() if k != "cluster_id"
+            }
+        elif kind == "attribute_value":
+            attr_key = (*key, rec["attribute_id"], rec.get("manf_id"))
+            values[attr_key] = rec["attribute_value"]
+        elif kind == "command":
+            commands = clusters[key][rec.pop("kind")]
+            commands[rec["command_id"]] = {
+                k: v for k, v in rec.items() if k != "cluster_id"
+            }
+
+    # Manufacturer specific discoveries take precedence, as in scan_results
+    for attr_key in sorted(attributes, key=lambda k: k[4] is not None):
+        attribute = dict(attributes[attr_key])
+        if attr_key in values:
+            attribute["attribute_value"] = values[attr_key]
+        clusters[attr_key[:3]]["attributes"][attr_key[3]] = attribute
+
+    for (epid, direction, cluster_id), cluster in clusters.items():
+        for field in ("attributes", "commands_received", "commands_generated"):
+            cluster[field] = dict(sorted(cluster[field].items()))
+        endpoints[epid][direction][cluster_id] = cluster
+
+    for endpoint in endpoints.values():
+        for direction in ("in_clusters", "out_clusters"):
+            if direction in endpoint:
+                endpoint[direction] = dict(sorted(endpoint[direction].items()))
+    scan["endpoints"] = [endpoints[epid] for epid in sorted(endpoints)]
+    return scan
+
 
 @u.retryable(
     (
@@ -26,13 +484,47 @@ ACCESS_CONTROL_MAP = {0x01: "READ", 0x02: "WRITE", 0x04: "REPORT"}
     tries=3,
 )
 async def read_attr(cluster, attrs, manufacturer=None):
-    return await cluster.read_attributes(
-        attrs, allow_cache=False, manufacturer=manufacturer
+    return await get_pacer(cluster.endpoint.device).request(
+        cluster.read_attributes,
+        attrs,
+        allow_cache=False,
+        manufacturer=manufacturer,
     )
 
 
-async def scan_results(device, endpoints=None, manufacturer=None, tries=3):
-    """Construct scan results from information available in device"""
+async def _scan_request(sem, func, *args, **kwargs):
+    """Run a scan request, limited by the in-flight semaphore if set"""
+    if sem is None:
+        return await func(*args, **kwargs)
+    async with sem:
+        return await func(*args, **kwargs)
+
+
+async def _run_all(coros, parallel=False):
+    """Await coroutines sequentially or concurrently, keeping order"""
+    if parallel:
+        return await asyncio.gather(*coros)
+    return [await coro for coro in coros]
+
+
+async def scan_results(
+    device,
+    endpoints=None,
+    manufacturer=None,
+    tries=3,
+    parallel=1,
+    min_delay=None,
+    max_delay=None,
+):
+    """Construct scan results from information available in device
+
+    When parallel is more than 1, clusters are scanned concurrently
+    with at most `parallel` ZCL requests in flight for the device.
+    The delay between requests adapts to the device within
+    [min_delay, max_delay].
+    """
+    sem = asyncio.Semaphore(parallel) if parallel > 1 else None
+    get_pacer(device).set_bounds(min_delay, max_delay)
     result: dict[str, str | list | None] = {
         "ieee": str(device.ieee),
         "nwk": f"0x{device.nwk:04x}",
@@ -40,6 +532,58 @@ async def scan_results(device, endpoints=None, manufacturer=None, tries=3):
 
     LOGGER.debug("Scanning device 0x{%04x}", device.nwk)
 
+    endpoints = scan_endpoint_ids(device, endpoints)
+    LOGGER.debug("Endpoints %s", endpoints)
+
+    async def _scan_ep(epid):
+        ep = device.endpoints[epid]
+        endpoint = {
+            "id": epid,
+            "device_type": f"0x{ep.device_type:04x}",
+            "profile": f"0x{ep.profile_id:04x}",
+        }
+        await _emit(device, "endpoint", [endpoint])
+        if epid != 242:
+            # An explicit manufacturer forces the manufacturer specific
+            # pass on all clusters, otherwise it is done where useful.
+            if u.isManf(manufacturer):
+                manf, force_manf = manufacturer, True
+            else:
+                manf, force_manf = ep.manufacturer_id, False
+            LOGGER.debug("Scanning endpoint #%i with manf '%r'", epid, manf)
+            endpoint.update(
+                await scan_endpoint(
+                    ep, manf, tries=tries, sem=sem, force_manf=force_manf
+                )
+            )
+        return endpoint
+
+    for epid in endpoints:
+        LOGGER.debug("scanning endpoint #%i", epid)
+        ep = device.endpoints[epid]
+        result["model"] = ep.model
+        result["manufacturer"] = ep.manufacturer
+        if u.isManf(ep.manufacturer_id):
+            result["manufacturer_id"] = f"0x{ep.manufacturer_id}"
+        else:
+            result["manufacturer_id"] = None
+    await _emit(device, "device", [result])
+
+    jobs.set_total(
+        sum(
+            len(ep.in_clusters) + len(ep.out_clusters)
+            for epid, ep in device.endpoints.items()
+            if epid in endpoints and epid != 242
+        )
+    )
+    result["endpoints"] = await _run_all(
+        [_scan_ep(epid) for epid in endpoints], sem is not None
+    )
+    return result
+
+
+def scan_endpoint_ids(device, endpoints=None) -> list[int]:
+    """Ids of the device endpoints to scan (all endpoints when None)"""
     # Get list of endpoints
     #  None -> all endpoints
     #  List or id -> Provided endpoints
@@ -51,139 +595,401 @@ async def scan_results(device, endpoints=None, manufacturer=None, tries=3):
         or not isinstance(endpoints, list)
         or len(endpoints) == 0
     ):
-        endpoints = []
-        for epid, _ep in device.endpoints.items():
-            endpoints.append(epid)
+        endpoints = list(device.endpoints)
 
-    LOGGER.debug("Endpoints %s", endpoints)
+    return [
+        epid for epid in endpoints if epid != 0 and epid in device.endpoints
+    ]
+
+
+async def get_sw_build_id(device, endpoints, tries=3):
+    """Firmware build id of the device, from the cache when available
 
-    ep_result = []
+    Raises the exception of the read when it fails.
+    """
     for epid in endpoints:
-        if epid == 0:
+        cluster = device.endpoints[epid].in_clusters.get(0x0000)
+        if cluster is None:
             continue
-        if epid in device.endpoints:
-            LOGGER.debug("scanning endpoint #%i", epid)
-            ep = device.endpoints[epid]
-            result["model"] = ep.model
-            result["manufacturer"] = ep.manufacturer
-            if u.isManf(ep.manufacturer_id):
-                result["manufacturer_id"] = f"0x{ep.manufacturer_id}"
-            else:
-                result["manufacturer_id"] = None
-            endpoint = {
-                "id": epid,
-                "device_type": f"0x{ep.device_type:04x}",
-                "profile": f"0x{ep.profile_id:04x}",
-            }
-            if epid != 242:
-                LOGGER.debug(
-                    "Scanning endpoint #%i with manf '%r'", epid, manufacturer
-                )
-                endpoint.update(
-                    await scan_endpoint(ep, manufacturer, tries=tries)
-                )
-                if not u.isManf(manufacturer) and u.isManf(ep.manufacturer_id):
-                    LOGGER.debug(
-                        "Scanning endpoint #%i with manf '%r'",
-                        epid,
-                        ep.manufacturer_id,
-                    )
-                    endpoint.update(
-                        await scan_endpoint(
-                            ep, ep.manufacturer_id, tries=tries
-                        )
-                    )
-            ep_result.append(endpoint)
+        sw_build_id = cluster.get(0x4000)
+        if sw_build_id is None:
+            success, _ = await read_attr(cluster, [0x4000], tries=tries)
+            sw_build_id = success.get(0x4000)
+        return u.value_to_jsonable(sw_build_id)
+    return None
 
-    result["endpoints"] = ep_result
+
+async def scan_signature(device, endpoints, manufacturer=None, tries=3):
+    """Identify devices that share the same scan schema
+
+    Devices with the same manufacturer, model, firmware build and
+    endpoint/cluster layout have the same attributes and commands.
+    None when the firmware build could not be read: another firmware
+    would get the same signature.
+    """
+    layout = [
+        [
+            epid,
+            device.endpoints[epid].profile_id,
+            device.endpoints[epid].device_type,
+            sorted(device.endpoints[epid].in_clusters),
+            sorted(device.endpoints[epid].out_clusters),
+        ]
+        for epid in endpoints
+    ]
+    digest = hashlib.sha256(
+        json.dumps([layout, manufacturer]).encode()
+    ).hexdigest()[:16]
+    try:
+        sw_build_id = await get_sw_build_id(device, endpoints, tries)
+    except (
+        DeliveryError,
+        ControllerException,
+        asyncio.CancelledError,
+        asyncio.TimeoutError,
+    ) as ex:
+        LOGGER.debug("Could not read sw_build_id: %r", ex)
+        return None
+    return f"{device.manufacturer}_{device.model}_{sw_build_id}_{digest}"
+
+
+def scan_schema(scan):
+    """Scan results without the values and the device address"""
+    schema = copy.deepcopy(
+        {k: v for k, v in scan.items() if k not in ("ieee", "nwk")}
+    )
+    for endpoint in schema["endpoints"]:
+        for direction in ("in_clusters", "out_clusters"):
+            for cluster in endpoint.get(direction, {}).values():
+                for attribute in cluster["attributes"].values():
+                    attribute.pop("attribute_value", None)
+    return schema
+
+
+async def scan_values(
+    device, schema, tries=3, parallel=1, min_delay=None, max_delay=None
+):
+    """Construct scan results from a known schema, only reading values"""
+    sem = asyncio.Semaphore(parallel) if parallel > 1 else None
+    get_pacer(device).set_bounds(min_delay, max_delay)
+    result = {
+        "ieee": str(device.ieee),
+        "nwk": f"0x{device.nwk:04x}",
+        **copy.deepcopy(schema),
+    }
+
+    LOGGER.debug("Reading values of device 0x%04x", device.nwk)
+    await _emit(
+        device,
+        "device",
+        [{k: v for k, v in result.items() if k != "endpoints"}],
+    )
+
+    coros = []
+    for endpoint in result["endpoints"]:
+        ep = device.endpoints[endpoint["id"]]
+        await _emit(
+            device,
+            "endpoint",
+            [
+                {
+                    k: v
+                    for k, v in endpoint.items()
+                    if k not in ("in_clusters", "out_clusters")
+                }
+            ],
+        )
+        for direction in ("in_clusters", "out_clusters"):
+            ep_clusters = getattr(ep, direction)
+            for cluster_id, cluster_result in endpoint.get(
+                direction, {}
+            ).items():
+                cluster = ep_clusters[int(cluster_id, 16)]
+                await _emit_schema_cluster(cluster, cluster_result)
+                coros.append(
+                    read_cluster_values(
+                        cluster,
+                        cluster_result["attributes"],
+                        tries=tries,
+                        sem=sem,
+                    )
+                )
+    await _run_all(coros, sem is not None)
     return result
 
 
-async def scan_endpoint(ep, manufacturer=None, tries=3):
-    result = {}
-    clusters = {}
-    for cluster in ep.in_clusters.values():
-        LOGGER.debug(
-            "Scanning input cluster 0x{:04x}/'{}' ".format(
-                cluster.cluster_id, cluster.ep_attribute
-            )
+async def _emit_schema_cluster(cluster, cluster_result):
+    device = cluster.endpoint.device
+    commands = [
+        {"kind": kind, **command}
+        for kind in ("commands_received", "commands_generated")
+        for command in cluster_result.get(kind, {}).values()
+    ]
+    await _emit(
+        device,
+        "cluster",
+        [{k: v for k, v in cluster_result.items() if k in ("title", "name")}],
+        cluster,
+    )
+    await _emit(
+        device,
+        "attribute",
+        list(cluster_result["attributes"].values()),
+        cluster,
+    )
+    await _emit(device, "command", commands, cluster)
+
+
+async def read_cluster_values(cluster, attributes, tries=3, sem=None):
+    """Read the values of the readable attributes of a schema cluster"""
+    # Attributes by manufacturer code
+    reads: dict[int | None, tuple[dict, list, dict]] = {}
+    for attribute in attributes.values():
+        value_type = attribute["value_type"]
+        if isinstance(value_type, list):
+            value_type = value_type[0]
+        datatype = int(value_type, 16)
+        if not _is_readable(datatype, attribute["access_acl"]):
+            continue
+        attr_id = int(attribute["attribute_id"], 16)
+        result, to_read, value_sizes = reads.setdefault(
+            attribute.get("manf_id"), ({}, [], {})
         )
-        key = f"0x{cluster.cluster_id:04x}"
-        clusters[key] = await scan_cluster(
-            cluster, is_server=True, manufacturer=manufacturer, tries=tries
+        result[attr_id] = attribute
+        to_read.append(attr_id)
+        size = u.zcl_value_size(datatype)
+        if size is not None:
+            value_sizes[attr_id] = size
+
+    checkpoint = get_checkpoint(cluster)
+    for manufacturer, (result, to_read, value_sizes) in reads.items():
+
+        def _save_progress(
+            remaining, manufacturer=manufacturer, result=result
+        ):
+            if checkpoint is not None:
+                checkpoint.set(
+                    cluster,
+                    "values",
+                    manufacturer,
+                    {
+                        "values": {
+                            a_id: attribute.get("attribute_value")
+                            for a_id, attribute in result.items()
+                        },
+                        "to_read": remaining,
+                    },
+                )
+
+        state = checkpoint and checkpoint.get(cluster, "values", manufacturer)
+        if state:
+            restored = []
+            for a_id, value in _int_keys(state["values"]).items():
+                if value is not None and a_id in result:
+                    result[a_id]["attribute_value"] = value
+                    restored.append(a_id)
+            to_read = state["to_read"]
+            # The stream starts anew, repeat what was read before
+            await _emit_values(cluster, result, restored, manufacturer)
+
+        await read_attribute_values(
+            cluster,
+            result,
+            to_read,
+            value_sizes,
+            manufacturer,
+            tries,
+            sem,
+            progress=_save_progress,
         )
-    result["in_clusters"] = dict(sorted(clusters.items(), key=lambda k: k[0]))
 
-    clusters = {}
-    for cluster in ep.out_clusters.values():
-        LOGGER.debug(
-            "Scanning output cluster 0x{:04x}/'{}'".format(
-                cluster.cluster_id, cluster.ep_attribute
+
+async def scan_endpoint(
+    ep, manufacturer=None, tries=3, sem=None, force_manf=True
+):
+    result = {}
+    for direction, ep_clusters in (
+        ("in_clusters", ep.in_clusters),
+        ("out_clusters", ep.out_clusters),
+    ):
+        keys = []
+        coros = []
+        for cluster in ep_clusters.values():
+            LOGGER.debug(
+                "Scanning {} 0x{:04x}/'{}'".format(
+                    direction, cluster.cluster_id, cluster.ep_attribute
+                )
             )
-        )
-        key = f"0x{cluster.cluster_id:04x}"
-        clusters[key] = await scan_cluster(
-            cluster, is_server=True, manufacturer=manufacturer, tries=tries
-        )
-    result["out_clusters"] = dict(sorted(clusters.items(), key=lambda k: k[0]))
+            keys.append(f"0x{cluster.cluster_id:04x}")
+            coros.append(
+                scan_cluster(
+                    cluster,
+                    is_server=True,
+                    manufacturer=manufacturer,
+                    tries=tries,
+                    sem=sem,
+                    force_manf=force_manf,
+                )
+            )
+        clusters = dict(zip(keys, await _run_all(coros, sem is not None)))
+        jobs.add_progress(len(coros))
+        result[direction] = dict(sorted(clusters.items(), key=lambda k: k[0]))
     return result
 
 
-async def scan_cluster(cluster, is_server=True, manufacturer=None, tries=3):
+async def scan_cluster(
+    cluster,
+    is_server=True,
+    manufacturer=None,
+    tries=3,
+    sem=None,
+    force_manf=True,
+):
     if is_server:
         cmds_gen = "commands_generated"
         cmds_rec = "commands_received"
     else:
         cmds_rec = "commands_generated"
         cmds_gen = "commands_received"
-    attributes = await discover_attributes_extended(cluster, None, tries=tries)
-    LOGGER.debug("scan_cluster attributes (none): %s", attributes)
-    if u.isManf(manufacturer):
-        LOGGER.debug(
-            "scan_cluster attributes (none) with manf '%s': %s",
-            manufacturer,
-            attributes,
+
+    await _emit(
+        cluster.endpoint.device,
+        "cluster",
+        [{"title": cluster.name, "name": cluster.ep_attribute}],
+        cluster,
+    )
+
+    async def _attributes():
+        attributes = await discover_attributes_extended(
+            cluster, None, tries=tries, sem=sem
         )
-        attributes.update(
-            await discover_attributes_extended(
-                cluster, manufacturer, tries=tries
+        LOGGER.debug("scan_cluster attributes (none): %s", attributes)
+        if u.isManf(manufacturer) and (
+            force_manf or needs_manf_pass(cluster, attributes)
+        ):
+            LOGGER.debug(
+                "scan_cluster attributes (none) with manf '%s': %s",
+                manufacturer,
+                attributes,
             )
-        )
+            pacer = get_pacer(cluster.endpoint.device)
+            errors = pacer.errors
+            manf_attributes = await discover_attributes_extended(
+                cluster, manufacturer, tries=tries, sem=sem
+            )
+            # Remember if the pass finds anything the first one did not
+            useful = any(
+                attr_id not in attributes
+                or attributes[attr_id]["value_type"] != attr["value_type"]
+                for attr_id, attr in manf_attributes.items()
+            )
+            if useful or pacer.errors == errors:
+                MANF_PASS[_page_key(cluster)] = useful
+            attributes.update(manf_attributes)
+        return attributes
 
     # LOGGER.debug("scan_cluster attributes: %s", attributes)
 
+    attributes, commands_received, commands_generated = await _run_all(
+        [
+            _attributes(),
+            discover_commands_received(
+                cluster, is_server, tries=tries, sem=sem
+            ),
+            discover_commands_generated(
+                cluster, is_server, tries=tries, sem=sem
+            ),
+        ],
+        sem is not None,
+    )
+
     return {
         "cluster_id": f"0x{cluster.cluster_id:04x}",
         "title": cluster.name,
         "name": cluster.ep_attribute,
         "attributes": attributes,
-        cmds_rec: await discover_commands_received(
-            cluster, is_server, tries=tries
-        ),
-        cmds_gen: await discover_commands_generated(
-            cluster, is_server, tries=tries
-        ),
+        cmds_rec: commands_received,
+        cmds_gen: commands_generated,
     }
 
 
-async def discover_attributes_extended(cluster, manufacturer=None, tries=3):
+def _is_readable(datatype, access_acl) -> bool:
+    # Note: reading back Array type was fixed in zigpy 0.58.1 .
+    return (u.is_zigpy_ge("0.58.1") or datatype not in [0x48]) and (
+        access_acl & foundation.AttributeAccessControl.READ != 0
+    )
+
+
+async def discover_attributes_extended(
+    cluster, manufacturer=None, tries=3, sem=None
+):
     LOGGER.debug("Discovering attributes extended")
+    pacer = get_pacer(cluster.endpoint.device)
+    checkpoint = get_checkpoint(cluster)
     result = {}
     to_read = []
+    value_sizes = {}
     attr_id = 0  # Start discovery at attr_id 0
+    count = get_page_size(
+        cluster, "discover_attributes", DEFAULT_DISCOVERY_COUNT
+    )
+    max_count = MAX_ATTR_DISCOVERY_COUNT
+    last_count = None  # Last page size that succeeded
     done = False
 
+    def _save_progress(remaining):
+        if checkpoint is not None:
+            checkpoint.set(
+                cluster,
+                "attributes",
+                manufacturer,
+                {
+                    "start": attr_id,
+                    "done": done,
+                    "attributes": result,
+                    "to_read": remaining,
+                    "value_sizes": value_sizes,
+                },
+            )
+
+    state = checkpoint and checkpoint.get(cluster, "attributes", manufacturer)
+    if state:
+        attr_id = state["start"]
+        done = state["done"]
+        result = _int_keys(state["attributes"])
+        to_read = state["to_read"]
+        value_sizes = _int_keys(state["value_sizes"])
+        # The stream starts anew, repeat what was found before
+        await _emit(
+            cluster.endpoint.device,
+            "attribute",
+            [
+                {k: v for k, v in attribute.items() if k != "attribute_value"}
+                for attribute in result.values()
+            ],
+            cluster,
+        )
+        await _emit_values(cluster, result, list(result), manufacturer)
+
     while not done:  # Repeat until all attributes are discovered or timeout
         try:
-            done, rsp = await u.retry_wrapper(
+            done, rsp = await _scan_request(
+                sem,
+                u.retry_wrapper,
+                pacer.request,
                 cluster.discover_attributes_extended,
                 attr_id,  # Start attribute identifier
-                16,  # Number of attributes to discover in this request
+                count,  # Number of attributes to discover in this request
                 manufacturer=manufacturer,
-                tries=tries,
+                # A larger page falls back to the default size on failure
+                tries=tries if count <= DEFAULT_DISCOVERY_COUNT else 1,
             )
-            await asyncio.sleep(0.2)
         except (ValueError, DeliveryError, asyncio.TimeoutError) as ex:
+            if count > DEFAULT_DISCOVERY_COUNT:
+                # Larger page failed, retry with the default size
+                count, max_count = _failed_page(count, DEFAULT_DISCOVERY_COUNT)
+                await pacer.wait()
+                continue
             LOGGER.error(
                 (
                     "Failed 'discover_attributes_extended'"
@@ -196,16 +1002,21 @@ async def discover_attributes_extended(cluster, manufacturer=None, tries=3):
             )
             break
         if isinstance(rsp, foundation.Status):
+            if count > DEFAULT_DISCOVERY_COUNT:
+                count, max_count = _failed_page(count, DEFAULT_DISCOVERY_COUNT)
+                await pacer.wait()
+                continue
             LOGGER.error(
                 "got %s status for discover_attribute starting 0x%04x/0x%04x",
                 rsp,
                 cluster.cluster_id,
                 attr_id,
             )
+            done = True  # Definitive answer, nothing to resume
             break
         LOGGER.debug("Cluster %s attr_recs: %s", cluster.cluster_id, rsp)
+        page = [attr_rec.attrid for attr_rec in rsp]
         for attr_rec in rsp:  # Get attribute information from response
-            attr_id = attr_rec.attrid
             attr_id = attr_rec.attrid
             attr_def = cluster.attributes.get(
                 attr_rec.attrid, (str(attr_rec.attrid), None)
@@ -222,11 +1033,11 @@ async def discover_attributes_extended(cluster, manufacturer=None, tries=3):
                 attr_type = None
             access_acl = t.uint8_t(attr_rec.acl)
 
-            # Note: reading back Array type was fixed in zigpy 0.58.1 .
-            if (
-                u.is_zigpy_ge("0.58.1") or attr_rec.datatype not in [0x48]
-            ) and (access_acl & foundation.AttributeAccessControl.READ != 0):
+            if _is_readable(attr_rec.datatype, access_acl):
                 to_read.append(attr_id)
+                size = u.zcl_value_size(attr_rec.datatype)
+                if size is not None:
+                    value_sizes[attr_id] = size
 
             attr_type_hex = f"0x{attr_rec.datatype:02x}"
             if attr_type:
@@ -259,19 +1070,92 @@ async def discover_attributes_extended(cluster, manufacturer=None, tries=3):
             if u.isManf(manufacturer):
                 result[attr_id]["manf_id"] = manufacturer
             attr_id += 1
-        await asyncio.sleep(0.2)
+        last_count = count
+        count, max_count = _next_discovery_count(
+            count, len(rsp), done, max_count
+        )
+        last_count = min(last_count, max_count)
+        await _emit(
+            cluster.endpoint.device,
+            "attribute",
+            [result[a_id] for a_id in page],
+            cluster,
+        )
+        _save_progress(to_read)
+        await pacer.wait()
+    _save_progress(to_read)
+    if done and last_count is not None:
+        set_page_size(cluster, "discover_attributes", last_count)
+
+    await read_attribute_values(
+        cluster,
+        result,
+        to_read,
+        value_sizes,
+        manufacturer,
+        tries,
+        sem,
+        progress=_save_progress if done else None,
+    )
+
+    return {f"0x{a_id:04x}": result[a_id] for a_id in sorted(result)}
+
+
+async def read_attribute_values(
+    cluster,
+    result,
+    to_read,
+    value_sizes,
+    manufacturer=None,
+    tries=3,
+    sem=None,
+    progress=None,
+):
+    """Read attributes, setting 'attribute_value' in result[attr_id]
 
+    `progress` is called after each chunk with the attributes that still
+    have to be read (including those that failed).
+    """
     LOGGER.debug("Reading attrs: %s", to_read)
-    chunk, to_read = to_read[:4], to_read[4:]
+    failed_reads = []
+    pacer = get_pacer(cluster.endpoint.device)
+    limit = get_page_size(cluster, "read_attributes", DEFAULT_READ_CHUNK)
+    max_limit = MAX_READ_CHUNK
+    last_limit = None  # Last chunk size that succeeded
+    chunk, to_read = _next_read_chunk(to_read, value_sizes, limit)
     while chunk:
         try:
             chunk = sorted(chunk)
-            success, failed = await read_attr(
-                cluster, chunk, manufacturer, tries=tries
+            success, failed = await _scan_request(
+                sem,
+                read_attr,
+                cluster,
+                chunk,
+                manufacturer,
+                # A larger chunk falls back to the default size on failure
+                tries=tries if limit <= DEFAULT_READ_CHUNK else 1,
             )
             LOGGER.debug(
                 "Reading attr success: %s, failed %s", success, failed
             )
+            missing = [
+                a for a in chunk if a not in success and a not in failed
+            ]
+            last_limit = limit
+            if missing and len(missing) < len(chunk):
+                # Response truncated by the device: read the rest later
+                limit = max_limit = last_limit = len(chunk) - len(missing)
+                to_read = missing + to_read
+            elif missing:
+                # No record for any of the attributes
+                failed_reads.extend(missing)
+                LOGGER.error(
+                    "No value for 0x%04x/%s in the response",
+                    cluster.cluster_id,
+                    missing,
+                )
+            elif len(chunk) >= limit:
+                limit = min(max_limit, 2 * limit)
             for attr_id, value in success.items():
                 if isinstance(value, bytes):
                     try:
@@ -283,51 +1167,97 @@ async def discover_attributes_extended(cluster, manufacturer=None, tries=3):
                     result[attr_id]["attribute_value"] = u.value_to_jsonable(
                         value
                     )
+            await _emit_values(cluster, result, success, manufacturer)
         except (
             DeliveryError,
             asyncio.TimeoutError,
         ) as ex:
-            LOGGER.error(
-                "Couldn't read 0x%04x/0x%04x: %s",
-                cluster.cluster_id,
-                attr_id,
-                ex,
-            )
+            if limit > DEFAULT_READ_CHUNK:
+                # Larger chunk failed, retry with the default size
+                limit, max_limit = _failed_page(limit, DEFAULT_READ_CHUNK)
+                to_read = chunk + to_read
+            else:
+                failed_reads.extend(chunk)
+                LOGGER.error(
+                    "Couldn't read 0x%04x/%s: %s",
+                    cluster.cluster_id,
+                    chunk,
+                    ex,
+                )
         except Exception as ex_unexpected:
+            failed_reads.extend(chunk)
             LOGGER.error(
-                "Unexpected Exception while reading 0x%04x/0x%04x: %s",
+                "Unexpected Exception while reading 0x%04x/%s: %s",
                 cluster.cluster_id,
-                attr_id,
+                chunk,
                 ex_unexpected,
             )
-        chunk, to_read = to_read[:4], to_read[4:]
-        await asyncio.sleep(0.2)
-
-    return {f"0x{a_id:04x}": result[a_id] for a_id in sorted(result)}
+        if progress is not None:
+            progress(failed_reads + to_read)
+        chunk, to_read = _next_read_chunk(to_read, value_sizes, limit)
+        await pacer.wait()
+    if last_limit is not None:
+        set_page_size(cluster, "read_attributes", last_limit)
 
 
 async def discover_commands_received(
-    cluster, is_server, manufacturer=None, tries=3
+    cluster, is_server, manufacturer=None, tries=3, sem=None
 ):
     from zigpy.zcl.foundation import Status
 
     LOGGER.debug("Discovering commands received")
+    pacer = get_pacer(cluster.endpoint.device)
     # direction = "received" if is_server else "generated"  # noqa: F841
+    checkpoint = get_checkpoint(cluster)
     result = {}
     cmd_id = 0  # Discover commands starting from 0
+    count = get_page_size(
+        cluster, "discover_commands_received", DEFAULT_DISCOVERY_COUNT
+    )
+    max_count = MAX_CMD_DISCOVERY_COUNT
+    last_count = None  # Last page size that succeeded
     done = False
 
+    def _save_progress():
+        if checkpoint is not None:
+            checkpoint.set(
+                cluster,
+                "commands_received",
+                manufacturer,
+                {"start": cmd_id, "done": done, "result": result},
+            )
+
+    state = checkpoint and checkpoint.get(
+        cluster, "commands_received", manufacturer
+    )
+    if state:
+        cmd_id, done, result = state["start"], state["done"], state["result"]
+        # The stream starts anew, repeat what was found before
+        await _emit(
+            cluster.endpoint.device,
+            "command",
+            [{"kind": "commands_received", **cmd} for cmd in result.values()],
+            cluster,
+        )
+
     while not done:
         try:
-            done, rsp = await u.retry_wrapper(
+            done, rsp = await _scan_request(
+                sem,
+                u.retry_wrapper,
+                pacer.request,
                 cluster.discover_commands_received,
                 cmd_id,  # Start index of commands to discover
-                16,  # Number of commands to discover
+                count,  # Number of commands to discover
                 manufacturer=manufacturer,
-                tries=tries,
+                # A larger page falls back to the default size on failure
+                tries=tries if count <= DEFAULT_DISCOVERY_COUNT else 1,
             )
-            await asyncio.sleep(0.2)
         except (ValueError, DeliveryError, asyncio.TimeoutError) as ex:
+            if count > DEFAULT_DISCOVERY_COUNT:
+                count, max_count = _failed_page(count, DEFAULT_DISCOVERY_COUNT)
+                await pacer.wait()
+                continue
             LOGGER.error(
                 "Failed to discover 0x%04x commands starting %s. Error: %s",
                 cluster.cluster_id,
@@ -336,10 +1266,16 @@ async def discover_commands_received(
             )
             break
         if isinstance(rsp, Status):
+            if count > DEFAULT_DISCOVERY_COUNT:
+                count, max_count = _failed_page(count, DEFAULT_DISCOVERY_COUNT)
+                await pacer.wait()
+                continue
             LOGGER.error(
                 "got %s status for discover_commands starting %s", rsp, cmd_id
             )
+            done = True  # Definitive answer, nothing to resume
             break
+        page = [f"0x{cmd_id:02x}" for cmd_id in rsp]
         for cmd_id in rsp:
             cmd_def = cluster.server_commands.get(
                 cmd_id, (str(cmd_id), "not_in_zcl", None)
@@ -366,32 +1302,83 @@ async def discover_commands_received(
                 "command_arguments": cmd_args,
             }
             cmd_id += 1
-        await asyncio.sleep(0.2)
+        last_count = count
+        count, max_count = _next_discovery_count(
+            count, len(rsp), done, max_count
+        )
+        last_count = min(last_count, max_count)
+        await _emit(
+            cluster.endpoint.device,
+            "command",
+            [{"kind": "commands_received", **result[key]} for key in page],
+            cluster,
+        )
+        _save_progress()
+        await pacer.wait()
+    _save_progress()
+    if done and last_count is not None:
+        set_page_size(cluster, "discover_commands_received", last_count)
     return dict(sorted(result.items(), key=lambda k: k[0]))
 
 
 async def discover_commands_generated(
-    cluster, is_server, manufacturer=None, tries=3
+    cluster, is_server, manufacturer=None, tries=3, sem=None
 ):
     from zigpy.zcl.foundation import Status
 
     LOGGER.debug("Discovering commands generated")
+    pacer = get_pacer(cluster.endpoint.device)
     # direction = "generated" if is_server else "received"  # noqa: F841
+    checkpoint = get_checkpoint(cluster)
     result = {}
     cmd_id = 0  # Initial index of commands to discover
+    count = get_page_size(
+        cluster, "discover_commands_generated", DEFAULT_DISCOVERY_COUNT
+    )
+    max_count = MAX_CMD_DISCOVERY_COUNT
+    last_count = None  # Last page size that succeeded
     done = False
 
+    def _save_progress():
+        if checkpoint is not None:
+            checkpoint.set(
+                cluster,
+                "commands_generated",
+                manufacturer,
+                {"start": cmd_id, "done": done, "result": result},
+            )
+
+    state = checkpoint and checkpoint.get(
+        cluster, "commands_generated", manufacturer
+    )
+    if state:
+        cmd_id, done, result = state["start"], state["done"], state["result"]
+        # The stream starts anew, repeat what was found before
+        await _emit(
+            cluster.endpoint.device,
+            "command",
+            [{"kind": "commands_generated", **cmd} for cmd in result.values()],
+            cluster,
+        )
+
     while not done:
         try:
-            done, rsp = await u.retry_wrapper(
+            done, rsp = await _scan_request(
+                sem,
+                u.retry_wrapper,
+                pacer.request,
                 cluster.discover_commands_generated,
                 cmd_id,  # Start index of commands to discover
-                16,  # Number of commands to discover this run
+                count,  # Number of commands to discover this run
                 manufacturer=manufacturer,
-                tries=tries,
+                # A larger page falls back to the default size on failure
+                tries=tries if count <= DEFAULT_DISCOVERY_COUNT else 1,
             )
-            await asyncio.sleep(0.2)
         except (ValueError, DeliveryError, asyncio.TimeoutError) as ex:
+            if count > DEFAULT_DISCOVERY_COUNT:
+                count, max_count = _failed_page(count, DEFAULT_DISCOVERY_COUNT)
+                await pacer.wait()
+                continue
             LOGGER.error(
                 "Failed to discover generated 0x%04X commands"
                 " starting %s. Error: %s",
@@ -401,10 +1388,16 @@ async def discover_commands_generated(
             )
             break
         if isinstance(rsp, Status):
+            if count > DEFAULT_DISCOVERY_COUNT:
+                count, max_count = _failed_page(count, DEFAULT_DISCOVERY_COUNT)
+                await pacer.wait()
+                continue
             LOGGER.error(
                 "got %s status for discover_commands starting %s", rsp, cmd_id
             )
+            done = True  # Definitive answer, nothing to resume
             break
+        page = [f"0x{cmd_id:02x}" for cmd_id in rsp]
         for cmd_id in rsp:
             cmd_def = cluster.client_commands.get(
                 cmd_id, (str(cmd_id), "not_in_zcl", None)
@@ -431,7 +1424,22 @@ async def discover_commands_generated(
                 "command_args": cmd_args,
             }
             cmd_id += 1
-        await asyncio.sleep(0.2)
+        last_count = count
+        count, max_count = _next_discovery_count(
+            count, len(rsp), done, max_count
+        )
+        last_count = min(last_count, max_count)
+        await _emit(
+            cluster.endpoint.device,
+            "command",
+            [{"kind": "commands_generated", **result[key]} for key in page],
+            cluster,
+        )
+        _save_progress()
+        await pacer.wait()
+    _save_progress()
+    if done and last_count is not None:
+        set_page_size(cluster, "discover_commands_generated", last_count)
     return dict(sorted(result.items(), key=lambda k: k[0]))
 
 
@@ -447,8 +1455,6 @@ async def scan_device(
     device = await u.get_device(app, listener, ieee)
 
     endpoints = params[p.EP_ID]
-    manf = params[p.MANF]
-    tries = params[p.TRIES]
 
     if endpoints is None:
         endpoints = []
@@ -459,30 +1465,168 @@ async def scan_device(
 
     endpoints = sorted(set(endpoints))  # Uniqify and sort
 
-    scan = await scan_results(
-        device, endpoints, manufacturer=manf, tries=tries
-    )
+    await scan_and_save(device, listener, params, endpoints, event_data)
 
-    event_data["scan"] = scan
 
-    model = scan.get("model")
-    manufacturer = scan.get("manufacturer")
+def scan_file_base(device, endpoints) -> str:
+    """Name of the scan results file of the device, without extension"""
+    ieee = device.ieee
+    model = device.model
+    manufacturer = device.manufacturer
 
     if len(endpoints) == 0:
         ep_str = ""
     else:
         ep_str = "_" + ("_".join([f"{e:02x}" for e in endpoints]))
 
-    postfix = f"{ep_str}_scan_results.txt"
+    postfix = f"{ep_str}_scan_results"
 
     # Set a unique filename for each device, using the manf name and
     # the variable part of the device mac address
     if model is not None and u.isManf(manufacturer):
         ieee_tail = "".join([f"{o:02x}" for o in ieee[4::-1]])
-        file_name = f"{model}_{manufacturer}_{ieee_tail}{postfix}"
+        return f"{model}_{manufacturer}_{ieee_tail}{postfix}"
+
+    ieee_tail = "".join([f"{o:02x}" for o in ieee[::-1]])
+    return f"{ieee_tail}{postfix}"
+
+
+async def scan_and_save(device, listener, params, endpoints, event_data):
+    """Scan the device, write the results file and return its name"""
+    manf = params[p.MANF]
+    tries = params[p.TRIES]
+    parallel = params[p.PARALLEL]
+    min_delay = params[p.MIN_DELAY]
+    max_delay = params[p.MAX_DELAY]
+    force_discovery = params[p.FORCE_DISCOVERY]
+    resume = params[p.RESUME]
+    scan_output = params[p.SCAN_OUTPUT]
+
+    if parallel > u.SCHEDULER.device_in_flight:
+        # More requests would only wait for a scheduler slot
+        msg = (
+            f"parallel={parallel} is limited to device_in_flight="
+            f"{u.SCHEDULER.device_in_flight}"
+        )
+        LOGGER.warning(msg)
+        event_data.setdefault("warnings", []).append(msg)
+        parallel = u.SCHEDULER.device_in_flight
+
+    base_name = scan_file_base(device, endpoints)
+    file_name = f"{base_name}.txt"
+    ndjson_name = f"{base_name}.ndjson"
+
+    if device.ieee in CHECKPOINTS:
+        # Both scans would use the same checkpoint and result files
+        raise ValueError(f"{device.ieee}: the device is already being scanned")
+    # Progress is recorded so that an interrupted scan can be resumed
+    checkpoint = ScanCheckpoint(listener, device.ieee)
+    CHECKPOINTS[device.ieee] = checkpoint
+    if scan_output != "json":
+        STREAMS[device.ieee] = ScanStream(listener, ndjson_name)
+
+    try:
+        if not PAGE_SIZES:
+            PAGE_SIZES.update(
+                await u.read_json_from_file(
+                    "scans", PAGE_SIZES_FNAME, listener=listener, default={}
+                )
+            )
+        if not MANF_PASS:
+            MANF_PASS.update(
+                await u.read_json_from_file(
+                    "scans", MANF_PASS_FNAME, listener=listener, default={}
+                )
+            )
+
+        # Devices with a known signature only need their values to be read
+        signature = await scan_signature(
+            device, scan_endpoint_ids(device, endpoints), manf, tries
+        )
+        schema_fname = None
+        if signature is not None:
+            schema_fname = f"scan_schema_{signature}.json"
+        schema = None
+        if not force_discovery and schema_fname is not None:
+            schema = await u.read_json_from_file(
+                "scans", schema_fname, listener=listener, normalize_name=True
+            )
+
+        if resume:
+            await checkpoint.load()
+
+        if schema is not None:
+            LOGGER.debug("Using cached scan schema '%s'", schema_fname)
+            scan = await scan_values(
+                device,
+                schema,
+                tries=tries,
+                parallel=parallel,
+                min_delay=min_delay,
+                max_delay=max_delay,
+            )
+        else:
+            scan = await scan_results(
+                device,
+                endpoints,
+                manufacturer=manf,
+                tries=tries,
+                parallel=parallel,
+                min_delay=min_delay,
+                max_delay=max_delay,
+            )
+    finally:
+        CHECKPOINTS.pop(device.ieee, None)
+        STREAMS.pop(device.ieee, None)
+        await checkpoint.flush()
+
+    complete = checkpoint.is_complete()
+    if complete:
+        await checkpoint.remove()
     else:
-        ieee_tail = "".join([f"{o:02x}" for o in ieee[::-1]])
-        file_name = f"{ieee_tail}{postfix}"
+        event_data["checkpoint"] = checkpoint.fname
+
+    if schema is None:
+        # Only cache schemas from complete scans
+        if complete and schema_fname is not None:
+            u.write_json_to_file(
+                scan_schema(scan),
+                subdir="scans",
+                fname=schema_fname,
+                desc="scan schema",
+                listener=listener,
+                normalize_name=True,
+            )
+
+    event_data["scan"] = scan
+    event_data["schema_cached"] = schema is not None
+    event_data["pacing"] = get_pacer(device).as_dict()
+
+    u.write_json_to_file(
+        PAGE_SIZES,
+        subdir="scans",
+        fname=PAGE_SIZES_FNAME,
+        desc="scan page sizes",
+        listener=listener,
+    )
+    u.write_json_to_file(
+        MANF_PASS,
+        subdir="scans",
+        fname=MANF_PASS_FNAME,
+        desc="manufacturer pass decisions",
+        listener=listener,
+    )
+
+    if scan_output == "ndjson":
+        return ndjson_name
+
+    if scan_output == "both":
+        # Pretty JSON obtained by post-processing the streamed records
+        scan = scan_from_records(
+            await u.read_ndjson_from_file(
+                "scans", ndjson_name, listener=listener, normalize_name=True
+            )
+        )
 
     u.write_json_to_file(
         scan,
@@ -492,3 +1636,83 @@ async def scan_device(
         listener=listener,
         normalize_name=True,
     )
+    return file_name
+
+
+async def scan_all_devices(
+    app, listener, ieee, cmd, data, service, params, event_data
+):
+    """Scan all devices of the network
+
+    Devices that keep their receiver on (routers, mains powered end
+    devices) are scanned concurrently (at most `concurrency` devices at a
+    time) while sleepy end devices are scanned one at a time in a
+    separate lane. Each device gets its own results file and
+    a summary index is written to scans/scan_all_devices.json .
+    """
+    LOGGER.debug("Running 'scan_all_devices'")
+
+    concurrency = params[p.CONCURRENCY]
+    if concurrency is None:
+        concurrency = DEFAULT_CONCURRENCY
+    awake = asyncio.Semaphore(concurrency)
+    sleepy = asyncio.Semaphore(SLEEPY_CONCURRENCY)
+
+    devices = [
+        device
+        for device in app.devices.values()
+        if device.nwk != 0x0000 and scan_endpoint_ids(device)
+    ]
+
+    def _is_awake(device) -> bool:
+        return (
+            device.node_desc is not None
+            and device.node_desc.is_receiver_on_when_idle
+        )
+
+    async def _scan(device):
+        is_awake = _is_awake(device)
+        summary = {
+            "ieee": str(device.ieee),
+            "nwk": f"0x{device.nwk:04x}",
+            "manufacturer": device.manufacturer,
+            "model": device.model,
+            "lane": "awake" if is_awake else "sleepy",
+        }
+        # Progress is reported per device rather than per cluster
+        job = jobs.detach()
+        # Bulk scans yield to interactive service calls
+        u.set_request_priority(u.PRIORITY_BACKGROUND)
+        async with awake if is_awake else sleepy:
+            LOGGER.debug("%s: Scanning device", device.ieee)
+            start = time.monotonic()
+            dev_data: dict = {}
+            try:
+                summary["file"] = await scan_and_save(
+                    device, listener, params, [], dev_data
+                )
+                summary["complete"] = "checkpoint" not in dev_data
+                summary["schema_cached"] = dev_data["schema_cached"]
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                LOGGER.error("%s: Scan failed: %r", device.ieee, e)
+                summary["complete"] = False
+                summary["error"] = repr(e)
+            summary["duration"] = round(time.monotonic() - start, 1)
+        if job is not None:
+            job.done += 1
+        return summary
+
+    # Start with the devices that are always awake
+    devices.sort(key=lambda d: not _is_awake(d))
+    jobs.set_total(len(devices))
+    summaries = await asyncio.gather(*[_scan(d) for d in devices])
+
+    event_data["result"] = summaries
+
+    u.write_json_to_file(
+        summaries,
+        subdir="scans",
+        fname="scan_all_devices.json",
+        desc="scan summary",
+        listener=listener,
+    )
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import logging
+
+from . import scan_device as sd
+from . import utils as u
+from .params import INTERNAL_PARAMS as p
+
+LOGGER = logging.getLogger(__name__)
+
+CLUSTER_ENTRIES = ("attributes", "commands_received", "commands_generated")
+DEVICE_FIELDS = ("model", "manufacturer", "manufacturer_id")
+
+
+def index_scan(scan) -> dict[str, dict]:
+    """Index scan entries by endpoint/direction/cluster[/kind/id]"""
+    index: dict[str, dict] = {}
+    for endpoint in scan.get("endpoints", []):
+        epid = endpoint["id"]
+        index[f"{epid}"] = {
+            k: v
+            for k, v in endpoint.items()
+            if k not in ("in_clusters", "out_clusters")
+        }
+        for direction in ("in_clusters", "out_clusters"):
+            for cluster_id, cluster in endpoint.get(direction, {}).items():
+                prefix = f"{epid}/{direction}/{cluster_id}"
+                index[prefix] = {
+                    k: v
+                    for k, v in cluster.items()
+                    if k not in CLUSTER_ENTRIES
+                }
+                for kind in CLUSTER_ENTRIES:
+                    for entry_id, entry in cluster.get(kind, {}).items():
+                        index[f"{prefix}/{kind}/{entry_id}"] = entry
+    return index
+
+
+def _changed_fields(old: dict, new: dict) -> dict:
+    return {
+        field: {"old": old.get(field), "new": new.get(field)}
+        for field in sorted(set(old) | set(new))
+        if old.get(field) != new.get(field)
+    }
+
+
+def diff_scans(old, new) -> dict:
+    """Compact delta between two scan results
+
+    Entries are keyed 'endpoint/direction/cluster/kind/id' (for instance
+    '1/in_clusters/0x0000/attributes/0x4000').  'changed' lists the
+    fields that differ, typically 'attribute_value'.
+    """
+    old_index = index_scan(old)
+    new_index = index_scan(new)
+
+    changed = {}
+    for key, new_entry in new_index.items():
+        old_entry = old_index.get(key)
+        if old_entry is not None and old_entry != new_entry:
+            changed[key] = _changed_fields(old_entry, new_entry)
+
+    return {
+        "device": _changed_fields(
+            {k: old.get(k) for k in DEVICE_FIELDS},
+            {k: new.get(k) for k in DEVICE_FIELDS},
+        ),
+        "added": sorted(k for k in new_index if k not in old_index),
+        "removed": sorted(k for k in old_index if k not in new_index),
+        "changed": dict(sorted(changed.items())),
+    }
+
+
+async def load_scan(listener, fname):
+    """Load scan results from a JSON or NDJSON file in the scans dir"""
+    if fname.endswith(".ndjson"):
+        try:
+            records = await u.read_ndjson_from_file(
+                "scans", fname, listener=listener, normalize_name=True
+            )
+        except FileNotFoundError:
+            return None
+        return sd.scan_from_records(records)
+    return await u.read_json_from_file(
+        "scans", fname, listener=listener, normalize_name=True
+    )
+
+
+async def scan_diff(
+    app, listener, ieee, cmd, data, service, params, event_data
+):
+    """Compare two stored scans, or a live scan and the last stored one"""
+    scan_old = params[p.SCAN_OLD]
+    scan_new = params[p.SCAN_NEW]
+
+    device = None
+    if scan_old is None or scan_new is None:
+        if ieee is None:
+            raise ValueError(
+                "Provide 'scan_old' and 'scan_new', or the device 'ieee'"
+            )
+        device = await u.get_device(app, listener, ieee)
+        if scan_old is None:
+            scan_old = f"{sd.scan_file_base(device, [])}.txt"
+
+    # Load the stored scan before a live scan overwrites it
+    old = await load_scan(listener, scan_old)
+    if old is None:
+        raise ValueError(f"Scan file '{scan_old}' not found in scans")
+
+    if scan_new is None:
+        LOGGER.debug("Scanning %s to compare with '%s'", ieee, scan_old)
+        # A cached schema would hide added or removed attributes
+        params = {**params, p.FORCE_DISCOVERY: True}
+        scan_new = await sd.scan_and_save(device, listener, params, [], {})
+
+    new = await load_scan(listener, scan_new)
+    if new is None:
+        raise ValueError(f"Scan file '{scan_new}' not found in scans")
+
+    event_data["scan_old"] = scan_old
+    event_data["scan_new"] = scan_new
+    event_data["result"] = diff_scans(old, new)
+
+    if params[p.JSON_OUT] is not None:
+        timeStamp = None
+        if params[p.JSON_TIMESTAMP]:
+            timeStamp = event_data["start_time"].split(".", 1)[0]
+        u.write_json_to_file(
+            event_data,
+            subdir="json",
+            fname=params[p.JSON_OUT],
+            desc="scan_diff",
+            listener=listener,
+            normalize_name=False,
+            ts=timeStamp,
+        )
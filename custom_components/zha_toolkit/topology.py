@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import collections
+import logging
+import time
+import typing
+
+from . import neighbours
+from . import utils as u
+from .params import INTERNAL_PARAMS as p
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_TTL = 3600  # Age (s) after which the tables of a router are polled
+WEAKEST_LINKS = 10  # Number of weakest links reported
+ASYMMETRIC_LQI = 50  # LQI difference between directions to report a link
+COORDINATOR_NWK = "0x0000"
+
+
+def _nwk_key(nwk) -> str:
+    """NWK address as '0xabcd', from an int or a string of any case"""
+    if isinstance(nwk, str):
+        nwk = int(nwk, 16)
+    return f"0x{int(nwk):04x}"
+
+
+class Topology:
+    """Graph of the network built from neighbour and routing tables
+
+    Nodes are keyed by IEEE address, `by_nwk` maps NWK addresses (in the
+    '0xabcd' form) to them.
+    Links are directed: `links[a][b]` is the LQI at which router `a`
+    receives `b`.  The tables of a router are replaced each time it is
+    polled, `polled` has the time of its last successful poll.
+    """
+
+    def __init__(self):
+        self.nodes: dict[str, dict[str, typing.Any]] = {}
+        self.by_nwk: dict[str, str] = {}
+        self.links: dict[str, dict[str, int]] = {}
+        self.routes: dict[str, list[dict]] = {}
+        self.polled: dict[str, float] = {}
+        self.coordinator: str | None = None
+
+    def _node(self, ieee: str, nwk, device_type: str | None) -> None:
+        nwk = _nwk_key(nwk)
+        node = self.nodes.setdefault(ieee, {"device_type": None})
+        if node.get("nwk") not in (None, nwk):
+            # The device changed address
+            if self.by_nwk.get(node["nwk"]) == ieee:
+                del self.by_nwk[node["nwk"]]
+        node["nwk"] = nwk
+        if device_type is not None:
+            node["device_type"] = device_type
+        self.by_nwk[nwk] = ieee
+        if nwk == COORDINATOR_NWK or device_type == "Coordinator":
+            self.coordinator = ieee
+
+    def update(self, device, routes: list, nbns: list, now=None) -> bool:
+        """Replace the tables of a router, False when the poll failed"""
+        ieee = str(device.ieee)
+        device_type = None
+        if device.node_desc is not None:
+            device_type = device.node_desc.logical_type.name
+        self._node(ieee, device.nwk, device_type)
+        if not nbns:
+            # A router has at least one neighbour, it did not answer:
+            # keep the tables of the previous poll.
+            return False
+
+        self.links[ieee] = {}
+        for nbg in nbns:
+            self._node(nbg["ieee"], nbg["nwk"], nbg["device_type"])
+            self.links[ieee][nbg["ieee"]] = nbg["lqi"]
+        self.routes[ieee] = routes
+        self.polled[ieee] = time.monotonic() if now is None else now
+        return True
+
+    def forget(self, ieee: str) -> None:
+        """Remove a device that left the network"""
+        node = self.nodes.pop(ieee, None)
+        if node is not None and self.by_nwk.get(node["nwk"]) == ieee:
+            del self.by_nwk[node["nwk"]]
+        for table in (self.links, self.routes, self.polled):
+            table.pop(ieee, None)
+        for links in self.links.values():
+            links.pop(ieee, None)
+
+    def stale(self, devices, ttl: float, now=None) -> list:
+        """Devices whose tables are older than ttl seconds"""
+        now = time.monotonic() if now is None else now
+        return [
+            d
+            for d in devices
+            if now - self.polled.get(str(d.ieee), -ttl - 1) > ttl
+        ]
+
+    def edges(self) -> dict[tuple[str, str], tuple[int | None, int | None]]:
+        """(a, b) -> (LQI of b seen by a, LQI of a seen by b), a < b"""
+        edges: dict[tuple[str, str], list[int | None]] = {}
+        for a, links in self.links.items():
+            for b, lqi in links.items():
+                if a == b:
+                    continue
+                key = (a, b) if a < b else (b, a)
+                edge = edges.setdefault(key, [None, None])
+                edge[0 if key[0] == a else 1] = lqi
+        return {key: (ab, ba) for key, (ab, ba) in edges.items()}
+
+    def adjacency(self) -> dict[str, set[str]]:
+        adjacency: dict[str, set[str]] = {ieee: set() for ieee in self.nodes}
+        for a, b in self.edges():
+            adjacency[a].add(b)
+            adjacency[b].add(a)
+        return adjacency
+
+    def hops(self, adjacency=None) -> dict[str, int]:
+        """Shortest number of links to the coordinator of reachable nodes"""
+        if adjacency is None:
+            adjacency = self.adjacency()
+        if self.coordinator not in adjacency:
+            return {}
+        return _distances(adjacency, self.coordinator)
+
+    def route_hops(self) -> dict[str, int | None]:
+        """Hops to the coordinator following the routing tables
+
+        None when a router on the way has no active route to the
+        coordinator or the routes loop.
+        """
+        next_hops = {}
+        for ieee, routes in self.routes.items():
+            for route in routes:
+                if (
+                    _nwk_key(route["destination"]) == COORDINATOR_NWK
+                    and route["status"] == "Active"
+                ):
+                    next_hops[ieee] = self.by_nwk.get(
+                        _nwk_key(route["next_hop"])
+                    )
+
+        result: dict[str, int | None] = {}
+        for ieee in self.routes:
+            count: int | None = 0
+            hop: str | None = ieee
+            seen = set()
+            while hop != self.coordinator:
+                if hop is None or hop in seen or hop not in next_hops:
+                    count = None
+                    break
+                seen.add(hop)
+                hop = next_hops[hop]
+                count += 1  # type: ignore[operator]
+            result[ieee] = count
+        return result
+
+    def weakest_links(self, count: int = WEAKEST_LINKS) -> list[dict]:
+        links = [
+            {
+                "a": a,
+                "b": b,
+                "lqi": min(lqi for lqi in (ab, ba) if lqi is not None),
+                "lqi_ab": ab,
+                "lqi_ba": ba,
+            }
+            for (a, b), (ab, ba) in self.edges().items()
+        ]
+        links.sort(key=lambda link: link["lqi"])
+        return links[:count]
+
+    def asymmetric_links(self, threshold: int = ASYMMETRIC_LQI) -> list[dict]:
+        """Links seen by both ends with LQIs differing by threshold or more"""
+        links = [
+            {"a": a, "b": b, "lqi_ab": ab, "lqi_ba": ba}
+            for (a, b), (ab, ba) in self.edges().items()
+            if ab is not None and ba is not None and abs(ab - ba) >= threshold
+        ]
+        links.sort(key=lambda link: -abs(link["lqi_ab"] - link["lqi_ba"]))
+        return links
+
+    def single_points_of_failure(self, adjacency=None) -> dict[str, list]:
+        """Nodes whose loss cuts other nodes from the coordinator
+
+        Maps each such node to the nodes that would be cut off.
+        """
+        if adjacency is None:
+            adjacency = self.adjacency()
+        if self.coordinator not in adjacency:
+            return {}
+        reachable = set(_distances(adjacency, self.coordinator))
+        result = {}
+        for ieee in _cut_vertices(adjacency, self.coordinator):
+            remaining = _distances(adjacency, self.coordinator, skip=ieee)
+            result[ieee] = sorted(reachable - set(remaining) - {ieee})
+        return dict(sorted(result.items(), key=lambda item: -len(item[1])))
+
+    def summary(self, now=None) -> dict[str, typing.Any]:
+        now = time.monotonic() if now is None else now
+        adjacency = self.adjacency()
+        hops = self.hops(adjacency)
+        route_hops = self.route_hops()
+        nodes = {}
+        for ieee, node in sorted(self.nodes.items()):
+            polled = self.polled.get(ieee)
+            nodes[ieee] = {
+                **node,
+                "neighbours": len(adjacency[ieee]),
+                "hops": hops.get(ieee),
+                "route_hops": route_hops.get(ieee),
+                "age": None if polled is None else round(now - polled),
+            }
+        return {
+            "coordinator": self.coordinator,
+            "nodes": nodes,
+            "links": len(self.edges()),
+            "unreachable": sorted(set(self.nodes) - set(hops)),
+            "weakest_links": self.weakest_links(),
+            "asymmetric_links": self.asymmetric_links(),
+            "single_points_of_failure": self.single_points_of_failure(
+                adjacency
+            ),
+        }
+
+
+def _distances(adjacency, root: str, skip: str | None = None):
+    distances = {root: 0}
+    queue = collections.deque([root])
+    while queue:
+        node = queue.popleft()
+        for other in adjacency[node]:
+            if other not in distances and other != skip:
+                distances[other] = distances[node] + 1
+                queue.append(other)
+    return distances
+
+
+def _cut_vertices(adjacency, root: str) -> set[str]:
+    """Articulation points of the component of root, root excluded"""
+    disc = {root: 0}
+    low = {root: 0}
+    parent: dict[str, str | None] = {root: None}
+    cut = set()
+    stack = [(root, iter(adjacency[root]))]
+    while stack:
+        node, others = stack[-1]
+        for other in others:
+            if other not in disc:
+                disc[other] = low[other] = len(disc)
+                parent[other] = node
+                stack.append((other, iter(adjacency[other])))
+                break
+            if other != parent[node]:
+                low[node] = min(low[node], disc[other])
+        else:
+            stack.pop()
+            if stack:
+                up = stack[-1][0]
+                low[up] = min(low[up], low[node])
+                if up != root and low[node] >= disc[up]:
+                    cut.add(up)
+    return cut
+
+
+try:
+    TOPOLOGY  # type: ignore[used-before-def] # pylint: disable=used-before-assignment
+except NameError:
+    TOPOLOGY = Topology()
+
+
+async def topology_refresh(
+    app, listener, ieee, cmd, data, service, params, event_data
+):
+    """Poll the routers with tables older than ttl, report the topology"""
+    ttl = DEFAULT_TTL if params[p.TTL] is None else params[p.TTL]
+
+    present = {str(ieee) for ieee in app.devices}
+    for known in list(TOPOLOGY.nodes):
+        if known not in present:
+            TOPOLOGY.forget(known)
+
+    routers = neighbours.routers(app)
+    stale = TOPOLOGY.stale(routers, ttl)
+    LOGGER.debug(
+        "Refreshing the tables of %s out of %s routers",
+        len(stale),
+        len(routers),
+    )
+    concurrency = params[p.CONCURRENCY]
+    if concurrency is None:
+        concurrency = neighbours.DEFAULT_CONCURRENCY
+    await neighbours.poll_routers(stale, listener, concurrency)
+
+    event_data["refreshed"] = [str(device.ieee) for device in stale]
+    event_data["result"] = TOPOLOGY.summary()
+    u.write_json_to_file(
+        event_data["result"],
+        subdir="scans",
+        fname="topology.json",
+        desc="topology",
+        listener=listener,
+    )
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import contextvars
+import enum
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+import typing
+
+from . import utils as u
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_TRACE_FILE = "requests.ndjson"
+TRACE_DIR = "traces"
+MAX_BYTES = 5 * 1024 * 1024  # Size of a trace file before rotation
+BACKUP_COUNT = 3  # Number of rotated trace files kept
+
+# Set while a request is traced, nested calls are not traced again
+_IN_TRACE: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "zha_toolkit_in_trace", default=False
+)
+
+
+def _jsonable(value) -> typing.Any:
+    if isinstance(value, dict):
+        value = list(value)
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, enum.Enum):
+        return value.name
+    if isinstance(value, int):
+        return value
+    return str(value)
+
+
+def describe_request(func) -> dict[str, typing.Any]:
+    """Request fields (target, ids, manufacturer) of a (partial) call"""
+    args: tuple = ()
+    kwargs: dict = {}
+    while isinstance(func, functools.partial):
+        args = func.args + args
+        kwargs = {**func.keywords, **kwargs}
+        func = func.func
+
+    target = getattr(func, "__self__", None)
+    if args and callable(args[0]) and not hasattr(target, "cluster_id"):
+        # Wrapper running the request (pacer.request(func, ...))
+        return describe_request(
+            functools.partial(args[0], *args[1:], **kwargs)
+        )
+    if target is None and args:
+        # Wrapper function taking the cluster first (cluster_read_...)
+        target, args = args[0], args[1:]
+
+    info: dict[str, typing.Any] = {
+        "request": getattr(func, "__name__", repr(func))
+    }
+    if hasattr(target, "cluster_id"):
+        info["endpoint"] = target.endpoint.endpoint_id
+        info["cluster"] = f"0x{target.cluster_id:04x}"
+        if args and isinstance(args[0], (list, dict)):
+            info["attributes"] = _jsonable(args[0])
+        elif info["request"] == "request" and len(args) > 1:
+            # request(general, command_id, schema, ...)
+            info["command"] = _jsonable(args[1])
+        elif args:
+            info["command"] = _jsonable(args[0])
+    elif info["request"] == "request" and args:
+        # ZDO request(command, ...)
+        info["zdo"] = _jsonable(args[0])
+
+    manufacturer = kwargs.get("manufacturer", kwargs.get("manufacturer_code"))
+    if manufacturer is not None:
+        info["manufacturer"] = _jsonable(manufacturer)
+    return info
+
+
+def _status(result=None, error: BaseException | None = None) -> str:
+    if error is not None:
+        return type(error).__name__
+    if isinstance(result, (list, tuple)) and result:
+        # ZDO responses start with the status
+        if isinstance(result[0], enum.Enum):
+            return result[0].name
+    return "SUCCESS"
+
+
+class Tracer:
+    """Write a NDJSON record for each request to a rotating file
+
+    Records are queued and written by a QueueListener thread so that the
+    event loop does not wait on the disk.
+    """
+
+    def __init__(self, name: str = "requests"):
+        self.file_name: str | None = None
+        self._logger = logging.getLogger(f"{__name__}.{name}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._queue_handler: logging.Handler | None = None
+        self._listener: logging.handlers.QueueListener | None = None
+
+    @property
+    def active(self) -> bool:
+        return self._listener is not None
+
+    def start(self, file_name: str) -> None:
+        """Start writing to file_name (blocking, run in an executor)"""
+        self.stop()
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            file_name, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT
+        )
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        self._queue_handler = logging.handlers.QueueHandler(records)
+        self._listener = logging.handlers.QueueListener(records, file_handler)
+        self._listener.start()
+        self._logger.addHandler(self._queue_handler)
+        self.file_name = file_name
+
+    def stop(self) -> None:
+        """Flush and close the trace file (blocking, run in an executor)"""
+        if self._listener is None:
+            return
+        self._logger.removeHandler(self._queue_handler)
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self._listener = None
+        self._queue_handler = None
+
+    def write(self, record: dict[str, typing.Any]) -> None:
+        self._logger.info(json.dumps(record))
+
+    def record(
+        self, func, device, start, attempt=1, result=None, error=None
+    ) -> None:
+        record: dict[str, typing.Any] = {
+            "t": round(start, 6),
+            "ieee": None if device is None else str(device.ieee),
+            "nwk": None if device is None else f"0x{device.nwk:04x}",
+            **describe_request(func),
+            "retries": attempt - 1,
+            "latency_ms": round((time.monotonic() - start) * 1e3, 1),
+            "status": _status(result, error),
+        }
+        self.write(record)
+
+
+try:
+    TRACER  # type: ignore[used-before-def] # pylint: disable=used-before-assignment
+except NameError:
+    TRACER = Tracer()
+
+
+async def traced(func, device, attempt: int = 1) -> typing.Any:
+    """Await func() and trace it when tracing is active"""
+    if not TRACER.active or _IN_TRACE.get():
+        return await func()
+    token = _IN_TRACE.set(True)
+    start = time.monotonic()
+    try:
+        result = await func()
+    except BaseException as e:
+        TRACER.record(func, device, start, attempt, error=e)
+        raise
+    finally:
+        _IN_TRACE.reset(token)
+    TRACER.record(func, device, start, attempt, result=result)
+    return result
+
+
+async def trace_start(
+    app, listener, ieee, cmd, data, service, params, event_data
+):
+    """Start tracing requests to traces/<command_data>"""
+    fname = u.normalize_filename(data or DEFAULT_TRACE_FILE)
+    file_name = os.path.join(
+        u.get_hass(listener).config.config_dir, TRACE_DIR, fname
+    )
+    await u.get_hass(listener).async_add_executor_job(TRACER.start, file_name)
+    LOGGER.info("Tracing requests to '%s'", file_name)
+    event_data["file"] = file_name
+
+
+async def trace_stop(
+    app, listener, ieee, cmd, data, service, params, event_data
+):
+    """Stop tracing requests"""
+    event_data["file"] = TRACER.file_name
+    await u.get_hass(listener).async_add_executor_job(TRACER.stop)
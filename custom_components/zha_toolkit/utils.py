@@ -2,18 +2,22 @@ from __future__ import annotations
 
 import asyncio
 import concurrent.futures
+import contextlib
+import contextvars
 import functools
+import heapq
 import json
 import logging
 import os
 import re
+import time
 import typing
 from enum import Enum
 from importlib.metadata import version
 
 import aiofiles
 import zigpy
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 
 try:
     from homeassistant.components.zha import Gateway as ZHAGateway
@@ -33,6 +37,7 @@ from zigpy import types as t
 from zigpy.exceptions import ControllerException, DeliveryError
 from zigpy.zcl import foundation as f
 
+from . import metrics, trace
 from .params import INTERNAL_PARAMS as p
 from .params import USER_PARAMS as P
 
@@ -335,12 +340,131 @@ async def get_radio_version(app):
     return None
 
 
+class IeeeIndex:
+    """Index of references (entity id, device id, NWK, IEEE) to EUI64
+
+    Entity and device ids of ZHA devices are indexed from the registries
+    once, the index is kept current with the registry update events.
+    """
+
+    def __init__(self):
+        self.hass: HomeAssistant | None = None
+        self.refs: dict[str, t.EUI64] = {}
+        self.nwks: dict[int, t.EUI64] = {}
+        self._unsubscribe: list[typing.Callable] = []
+
+    def attach(self, hass: HomeAssistant) -> None:
+        """Index the registries of hass and follow their updates"""
+        if self.hass is hass:
+            return
+        self.detach()
+        self.hass = hass
+        for device in dr.async_get(hass).devices.values():
+            self._index_device(device)
+        for entity in er.async_get(hass).entities.values():
+            self._index_entity(entity)
+        self._unsubscribe = [
+            hass.bus.async_listen(
+                dr.EVENT_DEVICE_REGISTRY_UPDATED, self._device_updated
+            ),
+            hass.bus.async_listen(
+                er.EVENT_ENTITY_REGISTRY_UPDATED, self._entity_updated
+            ),
+        ]
+        LOGGER.debug("Indexed %s device references", len(self.refs))
+
+    def detach(self) -> None:
+        for unsubscribe in self._unsubscribe:
+            unsubscribe()
+        self._unsubscribe = []
+        self.hass = None
+        self.refs = {}
+        self.nwks = {}
+
+    def get(self, app, ref: str) -> t.EUI64 | None:
+        """EUI64 for ref, None when not indexed"""
+        ieee = self.refs.get(ref)
+        if ieee is not None:
+            return ieee
+
+        if ref.count(":") == 7:
+            ieee = t.EUI64.convert(ref)
+            self.refs[ref] = ieee
+            return ieee
+
+        nwk = str2int(ref)
+        if isinstance(nwk, int) and 0x0000 <= nwk <= 0xFFF7:
+            ieee = self.nwks.get(nwk)
+            device = app.devices.get(ieee) if ieee is not None else None
+            if device is None or device.nwk != nwk:
+                # Unknown or changed NWK address (rejoin), refresh
+                self.nwks = {d.nwk: d.ieee for d in app.devices.values()}
+                ieee = self.nwks.get(nwk)
+            return ieee
+
+        return None
+
+    @staticmethod
+    def _zha_ieee(device) -> t.EUI64 | None:
+        for identifier in device.identifiers:
+            if identifier[0] == "zha":
+                return t.EUI64.convert(identifier[1])
+        return None
+
+    def _index_device(self, device) -> None:
+        ieee = self._zha_ieee(device)
+        if ieee is None:
+            self.refs.pop(device.id, None)
+        else:
+            self.refs[device.id] = ieee
+
+    def _index_entity(self, entity) -> None:
+        ieee = None
+        if entity.platform == "zha" and entity.device_id is not None:
+            ieee = self.refs.get(entity.device_id)
+        if ieee is None:
+            self.refs.pop(entity.entity_id, None)
+        else:
+            self.refs[entity.entity_id] = ieee
+
+    @callback
+    def _device_updated(self, event) -> None:
+        device_id = event.data["device_id"]
+        device = dr.async_get(self.hass).async_get(device_id)
+        if device is None:
+            self.refs.pop(device_id, None)
+            return
+        self._index_device(device)
+        # Entities may have been registered before their device
+        for entity in er.async_entries_for_device(
+            er.async_get(self.hass), device_id, include_disabled_entities=True
+        ):
+            self._index_entity(entity)
+
+    @callback
+    def _entity_updated(self, event) -> None:
+        entity_id = event.data["entity_id"]
+        self.refs.pop(event.data.get("old_entity_id"), None)
+        entity = er.async_get(self.hass).async_get(entity_id)
+        if entity is None:
+            self.refs.pop(entity_id, None)
+        else:
+            self._index_entity(entity)
+
+
+IEEE_INDEX = IeeeIndex()
+
+
 # Get zigbee IEEE address (EUI64) for the reference.
 #  Reference can be entity, device, or IEEE address
 async def get_ieee(app, listener, ref):
     # pylint: disable=too-many-return-statements
     # LOGGER.error("######### Get IEEE: %s %r", type(ref), ref)
     if isinstance(ref, str):
+        ieee = IEEE_INDEX.get(app, ref)
+        if ieee is not None:
+            return ieee
+
         # Check if valid ref address
         if ref.count(":") == 7:
             return t.EUI64.convert(ref)
@@ -642,8 +766,56 @@ def write_json_to_file(
     LOGGER.debug(f"Finished writing {desc} in '{file_name}'")
 
 
+async def read_json_from_file(
+    subdir, fname, listener=None, normalize_name=False, default=None
+):
+    """Read JSON data written by write_json_to_file, default if missing"""
+    if listener is None or subdir == "local":
+        base_dir = os.path.dirname(__file__)
+    else:
+        base_dir = get_hass(listener).config.config_dir
+
+    if normalize_name:
+        fname = normalize_filename(fname)
+    file_name = os.path.join(base_dir, subdir, fname)
+
+    if not os.path.isfile(file_name):
+        return default
+
+    try:
+        async with aiofiles.open(
+            file_name, mode="r", encoding="utf_8"
+        ) as infile:
+            return json.loads(await infile.read())
+    except (OSError, ValueError) as e:
+        LOGGER.warning("Could not read '%s': %r", file_name, e)
+        return default
+
+
+async def read_ndjson_from_file(
+    subdir, fname, listener=None, normalize_name=False
+):
+    """Read the records of a file with one JSON object per line"""
+    if listener is None or subdir == "local":
+        base_dir = os.path.dirname(__file__)
+    else:
+        base_dir = get_hass(listener).config.config_dir
+
+    if normalize_name:
+        fname = normalize_filename(fname)
+    file_name = os.path.join(base_dir, subdir, fname)
+
+    records = []
+    async with aiofiles.open(file_name, mode="r", encoding="utf_8") as infile:
+        async for line in infile:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+
 def helper_save_json(file_name: str, data: typing.Any):
     """Helper because the actual method depends on the HA version"""
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
     save_json(file_name, data)
 
 
@@ -684,6 +856,76 @@ async def append_to_csvfile(
         LOGGER.debug(f"Appended {desc} to '{file_name}'")
 
 
+async def append_rows_to_csvfile(
+    rows,
+    subdir,
+    fname,
+    desc,
+    listener=None,
+    overwrite=False,
+    normalize_name=False,
+):
+    """Append rows to a CSV file in a single write"""
+    if listener is None or subdir == "local":
+        base_dir = os.path.dirname(__file__)
+    else:
+        base_dir = get_hass(listener).config.config_dir
+
+    out_dir = os.path.join(base_dir, subdir)
+    if not os.path.isdir(out_dir):
+        os.mkdir(out_dir)
+
+    if normalize_name:
+        file_name = os.path.join(out_dir, normalize_filename(fname))
+    else:
+        file_name = os.path.join(out_dir, fname)
+
+    import csv
+    import io
+
+    lines = io.StringIO()
+    csv.writer(lines).writerows(rows)
+    async with aiofiles.open(
+        file_name, "w" if overwrite else "a", encoding="utf_8"
+    ) as out:
+        await out.write(lines.getvalue())
+
+    LOGGER.debug(f"Appended {len(rows)} {desc} to '{file_name}'")
+
+
+async def append_to_ndjsonfile(
+    records,
+    subdir,
+    fname,
+    desc,
+    listener=None,
+    overwrite=False,
+    normalize_name=False,
+):
+    """Append records to a file, one JSON object per line"""
+    if listener is None or subdir == "local":
+        base_dir = os.path.dirname(__file__)
+    else:
+        base_dir = get_hass(listener).config.config_dir
+
+    out_dir = os.path.join(base_dir, subdir)
+    if not os.path.isdir(out_dir):
+        os.mkdir(out_dir)
+
+    if normalize_name:
+        file_name = os.path.join(out_dir, normalize_filename(fname))
+    else:
+        file_name = os.path.join(out_dir, fname)
+
+    lines = "".join(json.dumps(r, default=repr) + "\n" for r in records)
+    async with aiofiles.open(
+        file_name, "w" if overwrite else "a", encoding="utf_8"
+    ) as out:
+        await out.write(lines)
+
+    LOGGER.debug(f"Appended {len(records)} {desc} to '{file_name}'")
+
+
 async def record_read_data(
     read_resp, cluster: zigpy.zcl.Cluster, params, listener=None
 ):
@@ -951,6 +1193,9 @@ def extractParams(  # noqa: C901
         p.EVT_SUCCESS: None,
         p.EVT_FAIL: None,
         p.EVT_DONE: None,
+        p.EVT_PROGRESS: None,
+        p.JOB: False,
+        p.JOB_ID: None,
         p.FAIL_EXCEPTION: False,
         p.READ_BEFORE_WRITE: True,
         p.READ_AFTER_WRITE: True,
@@ -962,6 +1207,21 @@ def extractParams(  # noqa: C901
         p.USE_CACHE: False,
         p.JSON_OUT: None,
         p.JSON_TIMESTAMP: False,
+        p.PARALLEL: 1,
+        p.MIN_DELAY: None,
+        p.MAX_DELAY: None,
+        p.FORCE_DISCOVERY: False,
+        p.RESUME: False,
+        p.CONCURRENCY: None,
+        p.SCAN_OUTPUT: "json",
+        p.SCAN_OLD: None,
+        p.SCAN_NEW: None,
+        p.COMMANDS: None,
+        p.TTL: None,
+        p.DAYS: None,
+        p.DEVICES: None,
+        p.MODEL: None,
+        p.MANUFACTURER: None,
     }
 
     # Endpoint to send command to
@@ -978,11 +1238,17 @@ def extractParams(  # noqa: C901
 
     # Attribute to send command to
     if P.ATTRIBUTE in rawParams:
-        params[p.ATTR_ID] = str2int(rawParams[P.ATTRIBUTE])
+        if isinstance(rawParams[P.ATTRIBUTE], list):
+            params[p.ATTR_ID] = [str2int(a) for a in rawParams[P.ATTRIBUTE]]
+        else:
+            params[p.ATTR_ID] = str2int(rawParams[P.ATTRIBUTE])
 
     # Attribute to send command to
     if P.ATTR_TYPE in rawParams:
-        params[p.ATTR_TYPE] = str2int(rawParams[P.ATTR_TYPE])
+        if isinstance(rawParams[P.ATTR_TYPE], list):
+            params[p.ATTR_TYPE] = [str2int(a) for a in rawParams[P.ATTR_TYPE]]
+        else:
+            params[p.ATTR_TYPE] = str2int(rawParams[P.ATTR_TYPE])
 
     # Attribute to send command to
     if P.ATTR_VAL in rawParams:
@@ -1099,6 +1365,15 @@ def extractParams(  # noqa: C901
     if P.EVENT_DONE in rawParams:
         params[p.EVT_DONE] = rawParams[P.EVENT_DONE]
 
+    if P.EVENT_PROGRESS in rawParams:
+        params[p.EVT_PROGRESS] = rawParams[P.EVENT_PROGRESS]
+
+    if P.JOB in rawParams:
+        params[p.JOB] = str2bool(rawParams[P.JOB])
+
+    if P.JOB_ID in rawParams:
+        params[p.JOB_ID] = rawParams[P.JOB_ID]
+
     if P.EVENT_FAIL in rawParams:
         params[p.EVT_FAIL] = rawParams[P.EVENT_FAIL]
 
@@ -1120,6 +1395,51 @@ def extractParams(  # noqa: C901
     if P.JSON_TIMESTAMP in rawParams:
         params[p.JSON_TIMESTAMP] = rawParams[P.JSON_TIMESTAMP]
 
+    if P.PARALLEL in rawParams:
+        params[p.PARALLEL] = str2int(rawParams[P.PARALLEL])
+
+    if P.MIN_DELAY in rawParams:
+        params[p.MIN_DELAY] = float(rawParams[P.MIN_DELAY])
+
+    if P.MAX_DELAY in rawParams:
+        params[p.MAX_DELAY] = float(rawParams[P.MAX_DELAY])
+
+    if P.FORCE_DISCOVERY in rawParams:
+        params[p.FORCE_DISCOVERY] = str2bool(rawParams[P.FORCE_DISCOVERY])
+
+    if P.RESUME in rawParams:
+        params[p.RESUME] = str2bool(rawParams[P.RESUME])
+
+    if P.CONCURRENCY in rawParams:
+        params[p.CONCURRENCY] = str2int(rawParams[P.CONCURRENCY])
+
+    if P.SCAN_OUTPUT in rawParams:
+        params[p.SCAN_OUTPUT] = rawParams[P.SCAN_OUTPUT]
+
+    if P.SCAN_OLD in rawParams:
+        params[p.SCAN_OLD] = rawParams[P.SCAN_OLD]
+
+    if P.SCAN_NEW in rawParams:
+        params[p.SCAN_NEW] = rawParams[P.SCAN_NEW]
+
+    if P.COMMANDS in rawParams:
+        params[p.COMMANDS] = rawParams[P.COMMANDS]
+
+    if P.TTL in rawParams:
+        params[p.TTL] = float(rawParams[P.TTL])
+
+    if P.DAYS in rawParams:
+        params[p.DAYS] = float(rawParams[P.DAYS])
+
+    if P.DEVICES in rawParams:
+        params[p.DEVICES] = rawParams[P.DEVICES]
+
+    if P.MODEL in rawParams:
+        params[p.MODEL] = rawParams[P.MODEL]
+
+    if P.MANUFACTURER in rawParams:
+        params[p.MANUFACTURER] = rawParams[P.MANUFACTURER]
+
     return params
 
 
@@ -1149,15 +1469,20 @@ async def retry(
             asyncio.TimeoutError,
         )
 
+    device = request_device(func)
+    attempt = 1
     while True:
         LOGGER.debug("Tries remaining: %s", tries)
         try:
-            return await func()
+            async with SCHEDULER.slot(device):
+                return await trace.traced(func, device, attempt)
             # pylint: disable-next=catching-non-exception
         except retry_exceptions:  # type: ignore[misc]
             if tries <= 1:
                 raise
             tries -= 1
+            attempt += 1
+            metrics.METRICS.record_retry(device)
             await asyncio.sleep(delay)
 
 
@@ -1212,6 +1537,186 @@ def retryable(
     return decorator
 
 
+# Request scheduling
+#
+# Toolkit requests go through SCHEDULER which limits the number of requests
+# in flight per device and for the coordinator, serving interactive
+# requests before background requests (jobs, bulk scans).
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+DEFAULT_DEVICE_IN_FLIGHT = 2
+DEFAULT_MAX_IN_FLIGHT = 8
+
+# Priority of the requests made by the current task
+REQUEST_PRIORITY: contextvars.ContextVar[int] = contextvars.ContextVar(
+    "zha_toolkit_request_priority", default=PRIORITY_INTERACTIVE
+)
+# Set while the current task holds a slot, nested requests do not queue
+_IN_SLOT: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "zha_toolkit_in_slot", default=False
+)
+
+
+def set_request_priority(priority: int) -> None:
+    """Set the priority of requests from the current task and its subtasks"""
+    REQUEST_PRIORITY.set(priority)
+
+
+class PriorityLimiter:
+    """Semaphore that grants slots by priority, then in request order"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = 0
+
+    async def acquire(self, priority: int) -> None:
+        fut = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        heapq.heappush(self._waiters, (priority, self._seq, fut))
+        self._wake()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # The slot was granted while we were cancelled
+                self.release()
+            raise
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for *_, fut in self._waiters if not fut.done())
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def set_limit(self, limit: int) -> None:
+        self.limit = limit
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < self.limit:
+            _priority, _seq, fut = heapq.heappop(self._waiters)
+            if not fut.done():  # Skip cancelled waiters
+                self.in_flight += 1
+                fut.set_result(None)
+
+
+class RequestScheduler:
+    """Limit requests in flight per device and coordinator-wide"""
+
+    def __init__(
+        self,
+        device_in_flight: int = DEFAULT_DEVICE_IN_FLIGHT,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    ):
+        self.device_in_flight = device_in_flight
+        self.coordinator = PriorityLimiter(max_in_flight)
+        self.devices: dict[t.EUI64, PriorityLimiter] = {}
+
+    @property
+    def waiting(self) -> int:
+        """Requests waiting for a device or coordinator slot"""
+        return self.coordinator.waiting + sum(
+            limiter.waiting for limiter in self.devices.values()
+        )
+
+    def configure(
+        self,
+        device_in_flight: int | None = None,
+        max_in_flight: int | None = None,
+    ) -> None:
+        if device_in_flight is not None:
+            self.device_in_flight = device_in_flight
+            for limiter in self.devices.values():
+                limiter.set_limit(device_in_flight)
+        if max_in_flight is not None:
+            self.coordinator.set_limit(max_in_flight)
+        LOGGER.debug(
+            "Scheduler: %s in flight per device, %s in total",
+            self.device_in_flight,
+            self.coordinator.limit,
+        )
+
+    @contextlib.asynccontextmanager
+    async def slot(self, device=None, priority: int | None = None):
+        """Wait for a slot to send a request to device (None: unknown)"""
+        if _IN_SLOT.get():
+            # Already scheduled by an enclosing request (e.g. retry)
+            yield
+            return
+
+        if priority is None:
+            priority = REQUEST_PRIORITY.get()
+
+        limiter = None
+        if device is not None:
+            limiter = self.devices.get(device.ieee)
+            if limiter is None:
+                limiter = PriorityLimiter(self.device_in_flight)
+                self.devices[device.ieee] = limiter
+            await limiter.acquire(priority)
+        try:
+            # The device slot is taken first so that requests waiting
+            # for a busy device do not hold coordinator slots.
+            await self.coordinator.acquire(priority)
+            token = _IN_SLOT.set(True)
+            start = time.monotonic()
+            try:
+                yield
+            except BaseException as e:
+                metrics.METRICS.record_request(
+                    device, time.monotonic() - start, e
+                )
+                raise
+            else:
+                metrics.METRICS.record_request(
+                    device, time.monotonic() - start
+                )
+            finally:
+                _IN_SLOT.reset(token)
+                self.coordinator.release()
+        finally:
+            if limiter is not None:
+                limiter.release()
+
+
+SCHEDULER = RequestScheduler()
+
+
+def request_device(func) -> typing.Any:
+    """Device addressed by a (partial) zigpy cluster/zdo request, or None"""
+    candidates = []
+    while isinstance(func, functools.partial):
+        candidates.extend(func.args[:1])
+        func = func.func
+    candidates.append(getattr(func, "__self__", None))
+    for obj in candidates:
+        # Bound method (pacer.request(cluster.discover_attributes, ...))
+        obj = getattr(obj, "__self__", obj)
+        if hasattr(obj, "ieee") and hasattr(obj, "endpoints"):
+            return obj
+        # Cluster -> Endpoint -> Device, Endpoint/ZDO -> Device
+        obj = getattr(obj, "endpoint", obj)
+        device = getattr(obj, "device", None)
+        if hasattr(device, "ieee"):
+            return device
+    return None
+
+
+async def scheduled(func: typing.Callable, *args, **kwargs) -> typing.Any:
+    """Await a zigpy request once a scheduler slot is available"""
+    device = request_device(func)
+    async with SCHEDULER.slot(device):
+        return await trace.traced(
+            functools.partial(func, *args, **kwargs), device
+        )
+
+
 # zigpy wrappers
 
 
@@ -1226,15 +1731,19 @@ def retryable(
     ),
     tries=1,
 )
-async def cluster_read_attributes(
+async def _cluster_read_attributes(
     cluster, attrs, manufacturer=None
 ) -> tuple[list, list]:
     """Read attributes from cluster, retryable"""
-    if is_zigpy_ge("1.2.0"):
-        return await cluster.read_attributes_raw(
-            attrs, manufacturer=manufacturer
+    device = cluster.endpoint.device
+    async with SCHEDULER.slot(device):
+        if is_zigpy_ge("1.2.0"):
+            read = cluster.read_attributes_raw
+        else:
+            read = cluster.read_attributes
+        return await trace.traced(
+            functools.partial(read, attrs, manufacturer=manufacturer), device
         )
-    return await cluster.read_attributes(attrs, manufacturer=manufacturer)
 
 
 # The zigpy library does not offer retryable on write_attributes.
@@ -1244,11 +1753,208 @@ async def cluster_read_attributes(
 )
 async def cluster__write_attributes(cluster, attrs, manufacturer=None):
     """Write cluster attributes from cluster, retryable"""
+    READ_COALESCER.invalidate(cluster)
+    device = cluster.endpoint.device
+    async with SCHEDULER.slot(device):
+        if is_zigpy_ge("1.2.0"):
+            write = functools.partial(
+                cluster.write_attributes_raw,
+                attrs,
+                manufacturer_code=manufacturer,
+            )
+        else:
+            write = functools.partial(
+                cluster._write_attributes, attrs, manufacturer=manufacturer
+            )
+        return await trace.traced(write, device)
+
+
+# Read coalescing
+#
+# Automations often read the same cluster of a device at the same time
+# (several entities refreshed on one trigger).  Concurrent reads of a
+# cluster are combined so that the device receives fewer requests.
+
+# Minimum time during which reads are collected behind a request (s)
+DEFAULT_READ_MERGE_WINDOW = 0.01
+
+
+def _read_response_size(cluster, attrs) -> int:
+    return sum(
+        READ_RECORD_SIZE
+        + (zcl_value_size(get_attr_type(cluster, a)) or VARIABLE_VALUE_SIZE)
+        for a in attrs
+    )
+
+
+def _filter_read_result(result, attrs):
+    """Part of a (merged) read result for attrs"""
     if is_zigpy_ge("1.2.0"):
-        return await cluster.write_attributes_raw(
-            attrs, manufacturer_code=manufacturer
+        if not isinstance(result[0], list):
+            # Default response, applies to all the attributes
+            return result
+        records = {r.attrid: r for r in result[0]}
+        return result.replace(
+            status_records=[records[a] for a in attrs if a in records]
         )
-    return await cluster._write_attributes(attrs, manufacturer=manufacturer)
+    success, failure = result
+    return (
+        {a: v for a, v in success.items() if a in attrs},
+        {a: v for a, v in failure.items() if a in attrs},
+    )
+
+
+class _ReadBatch:
+    def __init__(self, attrs: list, tries: int, delay: float):
+        self.attrs = list(attrs)
+        self.tries = tries
+        self.delay = delay
+        self.future = asyncio.get_running_loop().create_future()
+        # The result may have no waiter left
+        self.future.add_done_callback(
+            lambda fut: fut.cancelled() or fut.exception()
+        )
+        self.task: asyncio.Task | None = None
+
+
+class ReadCoalescer:
+    """Combine concurrent attribute reads of the same cluster
+
+    Reads are keyed by cluster (device, endpoint, cluster id, direction)
+    and manufacturer code.  A read is sent right away when no request of
+    the cluster is in flight.  Otherwise, a read of attributes that are
+    all in the request in flight waits for its response, and other reads
+    are collected for at least `window` seconds and until the request in
+    flight is answered, then merged in one request as long as the
+    response fits in a frame.  Each caller gets the part of the response
+    for its attributes.
+    """
+
+    def __init__(self, window: float = DEFAULT_READ_MERGE_WINDOW):
+        self.window = window
+        self.pending: dict[tuple, _ReadBatch] = {}
+        self.in_flight: dict[tuple, _ReadBatch] = {}
+        self.requests = 0  # Requests sent
+        self.joined = 0  # Reads answered by a request in flight
+        self.merged = 0  # Reads merged in the request of another read
+
+    def invalidate(self, cluster) -> None:
+        """Do not combine later reads with the current ones (after a write)
+
+        The requests already collected or in flight still answer their
+        callers.
+        """
+        for batches in (self.pending, self.in_flight):
+            for key in [k for k in batches if k[0] == id(cluster)]:
+                del batches[key]
+
+    async def read(
+        self, cluster, attrs: list, manufacturer, tries: int, delay: float
+    ):
+        key = (id(cluster), manufacturer)
+        batch = self.in_flight.get(key)
+        if batch is None and key not in self.pending:
+            # Nothing to combine with
+            return await self._request(
+                key, _ReadBatch(attrs, tries, delay), cluster, manufacturer
+            )
+        if batch is not None and set(attrs) <= set(batch.attrs):
+            self.joined += 1
+        else:
+            batch = self.pending.get(key)
+            if batch is None:
+                batch = _ReadBatch(attrs, tries, delay)
+                self.pending[key] = batch
+                batch.task = asyncio.create_task(
+                    self._send(key, batch, cluster, manufacturer)
+                )
+            else:
+                merged = batch.attrs + [
+                    a for a in attrs if a not in batch.attrs
+                ]
+                if (
+                    _read_response_size(cluster, merged)
+                    > ZCL_MAX_PAYLOAD - ZCL_HEADER_SIZE
+                ):
+                    # Would not fit in the response frame
+                    return await _cluster_read_attributes(
+                        cluster,
+                        attrs,
+                        manufacturer=manufacturer,
+                        tries=tries,
+                        delay=delay,
+                    )
+                batch.attrs = merged
+                batch.tries = max(batch.tries, tries)
+                batch.delay = max(batch.delay, delay)
+                self.merged += 1
+        try:
+            result = await asyncio.shield(batch.future)
+        except asyncio.CancelledError:
+            if not batch.future.cancelled():
+                raise
+            # The request was cancelled by the caller that sent it
+            return await _cluster_read_attributes(
+                cluster,
+                attrs,
+                manufacturer=manufacturer,
+                tries=tries,
+                delay=delay,
+            )
+        return _filter_read_result(result, attrs)
+
+    async def _send(self, key, batch: _ReadBatch, cluster, manufacturer):
+        await asyncio.sleep(self.window)
+        flying = self.in_flight.get(key)
+        if flying is not None:
+            # Collect reads until the previous request is answered
+            await asyncio.wait([flying.future])
+        if self.pending.get(key) is batch:
+            del self.pending[key]
+        try:
+            await self._request(key, batch, cluster, manufacturer)
+        except Exception:  # nosec
+            # The waiters get the exception from the future
+            pass
+
+    async def _request(self, key, batch: _ReadBatch, cluster, manufacturer):
+        self.in_flight[key] = batch
+        self.requests += 1
+        try:
+            result = await _cluster_read_attributes(
+                cluster,
+                batch.attrs,
+                manufacturer=manufacturer,
+                tries=batch.tries,
+                delay=batch.delay,
+            )
+        except asyncio.CancelledError:
+            batch.future.cancel()
+            raise
+        except Exception as e:
+            batch.future.set_exception(e)
+            raise
+        else:
+            batch.future.set_result(result)
+            return result
+        finally:
+            if self.in_flight.get(key) is batch:
+                del self.in_flight[key]
+
+
+READ_COALESCER = ReadCoalescer()
+
+
+async def cluster_read_attributes(
+    cluster, attrs, manufacturer=None, tries=1, delay=0.1
+) -> tuple[list, list]:
+    """Read attributes from cluster, retryable
+
+    Concurrent reads of the cluster are combined (see ReadCoalescer).
+    """
+    return await READ_COALESCER.read(
+        cluster, list(attrs), manufacturer, tries, delay
+    )
 
 
 def get_local_dir() -> str:
@@ -1325,6 +2031,66 @@ STATUS_ENUMERATIONS = {
 }
 
 
+# Payload available for a ZCL frame in a single, unfragmented APS frame
+# (conservative, takes NWK/APS security overhead into account).
+ZCL_MAX_PAYLOAD = 80
+# ZCL header size including the manufacturer code
+ZCL_HEADER_SIZE = 5
+# Record size in read attribute responses: attrid, status, datatype (+ value)
+READ_RECORD_SIZE = 4
+# Value size assumed for strings, arrays, ... when planning reads, responses
+# truncated by the device are completed by another request
+VARIABLE_VALUE_SIZE = 16
+
+
+def zcl_value_size(type_id: int | None) -> int | None:
+    """Serialized size of a ZCL value of the type, None when variable"""
+    # pylint: disable=too-many-return-statements
+    if type_id is None:
+        return None
+    if 0x08 <= type_id <= 0x0F:  # Data
+        return type_id - 0x07
+    if type_id == 0x10:  # Boolean
+        return 1
+    if 0x18 <= type_id <= 0x1F:  # Bitmap
+        return type_id - 0x17
+    if 0x20 <= type_id <= 0x27:  # Unsigned int
+        return type_id - 0x1F
+    if 0x28 <= type_id <= 0x2F:  # Signed int
+        return type_id - 0x27
+    if type_id in (0x30, 0x31):  # Enum
+        return type_id - 0x2F
+    if type_id in (0x38, 0x39, 0x3A):  # Float
+        return {0x38: 2, 0x39: 4, 0x3A: 8}[type_id]
+    if type_id in (0xE0, 0xE1, 0xE2, 0xEA):  # Time, date, UTC, BACnet OID
+        return 4
+    if type_id in (0xE8, 0xE9):  # Cluster id, attribute id
+        return 2
+    if type_id == 0xF0:  # EUI64
+        return 8
+    if type_id == 0xF1:  # Security key
+        return 16
+    return None
+
+
+def zcl_frames(records: list, record_size) -> list[list]:
+    """Split records in groups that fit in unfragmented ZCL frames
+
+    record_size(record) is the size of the record in the frame, a record
+    larger than a frame gets a frame of its own.
+    """
+    frames: list[list] = []
+    budget = 0
+    for record in records:
+        size = record_size(record)
+        if not frames or size > budget:
+            frames.append([])
+            budget = ZCL_MAX_PAYLOAD - ZCL_HEADER_SIZE
+        frames[-1].append(record)
+        budget -= size
+    return frames
+
+
 def get_status_string(status_code: int) -> str:
     """Returns the string representation of a Zigbee status code."""
     return STATUS_ENUMERATIONS.get(status_code, "UNKNOWN_STATUS")
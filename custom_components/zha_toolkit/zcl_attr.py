@@ -12,12 +12,16 @@ from zigpy.typing import UNDEFINED, UndefinedType
 from zigpy.zcl import Cluster
 from zigpy.zcl import foundation as f
 
+from . import jobs
 from . import utils as u
 from .params import INTERNAL_PARAMS as p
 from .params import SERVICES as S
 
 LOGGER = logging.getLogger(__name__)
 
+# Devices read at the same time by attr_read_devices
+DEFAULT_CONCURRENCY = 4
+
 
 def _manufacturer_code_for_find_attribute(
     manf: None | int | bytes,
@@ -226,7 +230,8 @@ async def conf_report_read(
         # data = t.serialize([param,], schema)
         # LOGGER.error(f"SERIALIZED:{data!r}")
 
-        event_data["result"] = await cluster.request(
+        event_data["result"] = await u.scheduled(
+            cluster.request,
             True,  # General, bool
             0x08,  # Command id
             schema,  # Schema
@@ -255,11 +260,10 @@ async def conf_report_read(
                 params[p.ATTR_ID],
                 params[p.MANF],
             )
-            result_conf = (
-                await cluster.my_read_reporting_configuration_multiple(
-                    params[p.ATTR_ID],
-                    manufacturer=params[p.MANF],
-                )
+            result_conf = await u.scheduled(
+                cluster.my_read_reporting_configuration_multiple,
+                params[p.ATTR_ID],
+                manufacturer=params[p.MANF],
             )
             LOGGER.debug("Got result %s", result_conf)
             triesToGo = 0  # Stop loop
@@ -365,7 +369,8 @@ async def conf_report(
                         params[p.MANF]
                     ),
                 )
-                result_conf = await cluster.configure_reporting(
+                result_conf = await u.scheduled(
+                    cluster.configure_reporting,
                     attr_def,
                     params[p.MIN_INTERVAL],
                     params[p.MAX_INTERVAL],
@@ -375,7 +380,8 @@ async def conf_report(
                     result_conf, attr_def
                 )
             else:
-                result_conf = await cluster.configure_reporting(
+                result_conf = await u.scheduled(
+                    cluster.configure_reporting,
                     params[p.ATTR_ID],
                     params[p.MIN_INTERVAL],
                     params[p.MAX_INTERVAL],
@@ -416,10 +422,15 @@ async def attr_read(*args, **kwargs):
 
 
 # This code is shared with attr_read.
-# Can read and write 1 attribute
+# Can read and write 1 attribute, lists are handled by attr_write_many
 async def attr_write(  # noqa: C901
     app, listener, ieee, cmd, data, service, params, event_data
 ):
+    if isinstance(params[p.ATTR_ID], list):
+        return await attr_write_many(
+            app, listener, ieee, cmd, data, service, params, event_data
+        )
+
     success = True
 
     dev = await u.get_device(app, listener, ieee)
@@ -433,12 +444,7 @@ async def attr_write(  # noqa: C901
 
     use_cache = params[p.USE_CACHE]
 
-    # Decode attribute(s)
-    #  Currently only one attribute is possible, but the parameter
-    #  format could allow for multiple attributes for instance by
-    #  adding a split character such as ':' for attr_id, attr_type
-    #  and attr_value
-    # Then the match should be in a loop
+    # Decode attribute
 
     attr_id = u.get_attr_id(cluster, params[p.ATTR_ID])
     if attr_id is None:
@@ -485,18 +491,7 @@ async def attr_write(  # noqa: C901
                 "Reading attr result (attrs, status): %s", result_read
             )
             if u.is_zigpy_ge("1.2.0"):
-                if len(result_read):
-                    found_attr_type = result_read[0][0].value.type
-                    result_read = (
-                        {
-                            result_read[0][0]
-                            .attrid: result_read[0][0]
-                            .value.value,
-                        },
-                        (),
-                    )
-                else:
-                    result_read = ({}, (result_read[0]["status"],))
+                result_read = _single_read_result(result_read)
 
                 success = (len(result_read[1]) == 0) and (
                     len(result_read[0]) == 1
@@ -637,18 +632,7 @@ async def attr_write(  # noqa: C901
             )
             # read_is_equal = (result_read[0][attr_id] == compare_val)
             if u.is_zigpy_ge("1.2.0"):
-                if len(result_read):
-                    found_attr_type = result_read[0][0].value.type
-                    result_read = (
-                        {
-                            result_read[0][0]
-                            .attrid: result_read[0][0]
-                            .value.value,
-                        },
-                        (),
-                    )
-                else:
-                    result_read = ({}, (result_read[0]["status"],))
+                result_read = _single_read_result(result_read)
 
                 success = success and (len(result_read[0]) == 1)
             else:
@@ -809,3 +793,573 @@ async def attr_write(  # noqa: C901
     # (supposed typed by the internals):
     #   attrs = {0x0009: 0b00001000, 0x0012: 1400, 0x001C: 0xFF}
     #   result = await cluster'.write_attributes(attrs)
+
+
+def _single_read_result(result_read):
+    """(values, failures) of a raw read response for a single attribute
+
+    The response has no record for the attribute when the device answered
+    with a default response or it was truncated (merged reads).
+    """
+    records = result_read[0]
+    if not isinstance(records, list):
+        # Default response
+        return ({}, (result_read.status,))
+    if not records:
+        return ({}, ("NO_RESPONSE",))
+    if records[0].status != f.Status.SUCCESS:
+        return ({}, (records[0].status,))
+    return ({records[0].attrid: records[0].value.value}, ())
+
+
+# Record size in write attribute requests
+WRITE_RECORD_SIZE = 3  # attrid, datatype (+ value)
+
+
+def _per_attribute(value, count: int, name: str) -> list:
+    """Value for each attribute: a list with one item per attribute,
+    or the same value for all attributes"""
+    if not isinstance(value, list):
+        return [value] * count
+    if len(value) != count:
+        raise ValueError(
+            f"'{name}' has {len(value)} items for {count} attributes"
+        )
+    return value
+
+
+def _attr_name(cluster, attr_id) -> str:
+    try:
+        attr_def = cluster.attributes.get(attr_id, (str(attr_id), None))
+        if u.is_zigpy_ge("0.50.0") and isinstance(attr_def, f.ZCLAttributeDef):
+            return attr_def.name
+        return attr_def[0]
+    except Exception:
+        return str(attr_id)
+
+
+def _is_equal(value, compare_val) -> bool:
+    if callable(getattr(compare_val, "serialize", None)) and callable(
+        getattr(value, "serialize", None)
+    ):
+        return value.serialize() == compare_val.serialize()
+    return value == compare_val
+
+
+async def _read_frames(cluster, attr_ids, attr_types, params):
+    """Read attributes in as few frames as the response size allows
+
+    Devices leave out the records that do not fit in the response, these
+    attributes are read again.  Returns the values and the statuses of the
+    failed reads by attr_id, and the number of frames.  attr_types is
+    completed with the types found in the responses.
+    """
+    values: dict[int, typing.Any] = {}
+    statuses: dict[int, str] = {}
+    frames = 0
+    to_read = list(attr_ids)
+    while to_read:
+        frame = u.zcl_frames(
+            to_read,
+            lambda attr_id: u.READ_RECORD_SIZE
+            + (u.zcl_value_size(attr_types[attr_id]) or u.VARIABLE_VALUE_SIZE),
+        )[0]
+        to_read = to_read[len(frame) :]
+        frames += 1
+        LOGGER.debug("Request attr read %s", frame)
+        # pylint: disable=unexpected-keyword-arg
+        result = await u.cluster_read_attributes(
+            cluster,
+            frame,
+            manufacturer=params[p.MANF],
+            tries=params[p.TRIES],
+        )
+        LOGGER.debug("Reading attr result (attrs, status): %s", result)
+        found_types = {}
+        if not u.is_zigpy_ge("1.2.0"):
+            values.update(result[0])
+            statuses.update(
+                {a: u.get_status_string(s) for a, s in result[1].items()}
+            )
+            for attr_id, value in result[0].items():
+                found_types[attr_id] = f.DataType.from_python_type(
+                    type(value)
+                ).type_id
+        elif not isinstance(result[0], list):
+            # Default response, same status for all attributes
+            for attr_id in frame:
+                statuses[attr_id] = u.get_status_string(result[1])
+        else:
+            for record in result[0]:
+                if record.status == f.Status.SUCCESS:
+                    values[record.attrid] = record.value.value
+                    found_types[record.attrid] = record.value.type
+                else:
+                    statuses[record.attrid] = u.get_status_string(
+                        record.status
+                    )
+
+        for attr_id, found_type in found_types.items():
+            if attr_types.get(attr_id) is None:
+                attr_types[attr_id] = found_type
+            elif attr_types[attr_id] != found_type:
+                LOGGER.warning(
+                    "Type determined from read for 0x%04X"
+                    " different from requested: 0x%02X <> 0x%02X",
+                    attr_id,
+                    found_type,
+                    attr_types[attr_id],
+                )
+
+        missing = [a for a in frame if a not in values and a not in statuses]
+        if len(missing) < len(frame):
+            # Response truncated to fit in a frame
+            to_read = missing + to_read
+    for attr_id in attr_ids:
+        if attr_id not in values and attr_id not in statuses:
+            statuses[attr_id] = "NO_RESPONSE"
+    return values, statuses, frames
+
+
+async def _read_attributes(cluster, attr_ids, attr_types, params):
+    """Read attributes, from the cache according to use_cache
+
+    Returns the values, the statuses of the failed reads by attr_id and
+    the number of frames.
+    """
+    values: dict[int, typing.Any] = {}
+    statuses: dict[int, str] = {}
+    frames = 0
+    to_read = attr_ids
+    use_cache = params[p.USE_CACHE]
+    if use_cache > 0:
+        # pylint: disable=protected-access
+        values = {
+            attr_id: cluster._attr_cache[attr_id]
+            for attr_id in attr_ids
+            if attr_id in cluster._attr_cache
+        }
+        to_read = [a for a in attr_ids if a not in values]
+        LOGGER.debug("Attributes %s not in cache", to_read)
+        if use_cache == 1:
+            statuses = {a: "NOT_IN_CACHE" for a in to_read}
+            to_read = []
+    if to_read:
+        read_values, read_statuses, frames = await _read_frames(
+            cluster, to_read, attr_types, params
+        )
+        values.update(read_values)
+        statuses.update(read_statuses)
+    return values, statuses, frames
+
+
+def _attr_ids(cluster, attributes: list, event_data) -> list[int]:
+    attr_ids = []
+    for attribute in attributes:
+        attr_id = u.get_attr_id(cluster, attribute)
+        if not isinstance(attr_id, int):
+            msg = f"Could not determine attribute id for '{attribute}'"
+            event_data["errors"].append(msg)
+            raise ValueError(msg)
+        attr_ids.append(attr_id)
+    if len(set(attr_ids)) != len(attr_ids):
+        raise ValueError(f"Attributes listed more than once: {attr_ids}")
+    return attr_ids
+
+
+def _attr_types(cluster, attr_ids, attr_type) -> dict[int, int | None]:
+    """Requested type of each attribute, or the type known to zigpy"""
+    attr_types = dict(
+        zip(attr_ids, _per_attribute(attr_type, len(attr_ids), "attr_type"))
+    )
+    for attr_id, value in attr_types.items():
+        if value is None:
+            attr_types[attr_id] = u.get_attr_type(cluster, attr_id)
+    return attr_types
+
+
+def _csv_rows(cluster, attr_ids, values, attr_types, labels, manf) -> list:
+    """CSV rows for the attributes that have a value, as attr_read writes"""
+    date_str = dt_util.utcnow().isoformat()
+    rows = []
+    for attr_id, label in zip(attr_ids, labels):
+        if attr_id not in values:
+            continue
+        attr_type = attr_types[attr_id]
+        rows.append(
+            [
+                date_str,
+                cluster.name,
+                label if label is not None else _attr_name(cluster, attr_id),
+                values[attr_id],
+                f"0x{attr_id:04X}",
+                f"0x{cluster.cluster_id:04X}",
+                cluster.endpoint.endpoint_id,
+                str(cluster.endpoint.device.ieee),
+                f"0x{manf:04X}" if manf is not None else "",
+                f"0x{attr_type:02X}" if attr_type is not None else "",
+            ]
+        )
+    return rows
+
+
+async def _write_frames(cluster, attrs: list[f.Attribute], params):
+    """Write attributes in as few frames as the request size allows
+
+    Returns the status of each write by attr_id and the number of frames.
+    """
+    statuses: dict[int, str] = {}
+    frames = u.zcl_frames(
+        attrs, lambda attr: WRITE_RECORD_SIZE + len(attr.value.serialize())
+    )
+    for frame in frames:
+        LOGGER.debug("Request attr write %s", frame)
+        # pylint: disable=unexpected-keyword-arg
+        result = await u.cluster__write_attributes(
+            cluster,
+            frame,
+            manufacturer=params[p.MANF],
+            tries=params[p.TRIES],
+        )
+        LOGGER.debug("Write attr status: %s", result)
+        if not isinstance(result[0], list):
+            # Default response, same status for all attributes
+            for attr in frame:
+                statuses[attr.attrid] = u.get_status_string(result[1])
+            continue
+        # Only failed writes have a record, unless all succeeded
+        for attr in frame:
+            statuses[attr.attrid] = "SUCCESS"
+        for record in result[0]:
+            if record.status != f.Status.SUCCESS:
+                statuses[record.attrid] = u.get_status_string(record.status)
+    return statuses, len(frames)
+
+
+async def attr_write_many(  # noqa: C901
+    app, listener, ieee, cmd, data, service, params, event_data
+):
+    """Read or write a list of attributes of the same cluster
+
+    The attributes are packed in as few Read/Write Attributes frames as
+    the frame size allows.  attr_type, attr_val, state_id, state_attr
+    and csvlabel are lists with an item for each attribute, or a single
+    value for all attributes (except attr_val).
+    """
+    dev = await u.get_device(app, listener, ieee)
+    cluster = u.get_cluster_from_params(dev, params, event_data)
+    attr_ids = _attr_ids(cluster, params[p.ATTR_ID], event_data)
+    attr_types = _attr_types(cluster, attr_ids, params[p.ATTR_TYPE])
+    count = len(attr_ids)
+
+    frames = {"read": 0, "write": 0}
+    values: dict[int, typing.Any] = {}
+    read_statuses: dict[int, str] = {}
+    if cmd == S.ATTR_READ or params[p.READ_BEFORE_WRITE]:
+        values, read_statuses, frames["read"] = await _read_attributes(
+            cluster, attr_ids, attr_types, params
+        )
+
+    write_statuses: dict[int, str] = {}
+    if cmd == S.ATTR_WRITE:
+        attr_vals = params[p.ATTR_VAL]
+        if not isinstance(attr_vals, list) or len(attr_vals) != count:
+            msg = f"attr_val must be a list of {count} values"
+            event_data["errors"].append(msg)
+            raise ValueError(msg)
+
+        compare_vals = {}
+        attr_write_list: list[f.Attribute] = []
+        for attr_id, attr_val_str in zip(attr_ids, attr_vals):
+            if attr_types[attr_id] is None:
+                msg = f"attr_type must be set for attribute 0x{attr_id:04X}"
+                event_data["errors"].append(msg)
+                raise ValueError(msg)
+            attr_val, msg, compare_val = u.attr_encode(
+                u.str2int(attr_val_str), attr_types[attr_id]
+            )
+            if msg is not None:
+                event_data["errors"].append(msg)
+            if attr_val is None:
+                write_statuses[attr_id] = "INVALID_VALUE"
+                continue
+            compare_vals[attr_id] = compare_val
+            if (
+                params[p.READ_BEFORE_WRITE]
+                and not params[p.WRITE_IF_EQUAL]
+                and attr_id in values
+                and _is_equal(values[attr_id], compare_val)
+            ):
+                write_statuses[attr_id] = "EQUAL"
+                continue
+            attr_write_list.append(f.Attribute(attr_id, value=attr_val))
+
+        if attr_write_list:
+            if values:
+                event_data["read_before"] = (
+                    u.dict_to_jsonable(values),
+                    read_statuses,
+                )
+            statuses, frames["write"] = await _write_frames(
+                cluster, attr_write_list, params
+            )
+            write_statuses.update(statuses)
+
+            if params[p.READ_AFTER_WRITE]:
+                written = [attr.attrid for attr in attr_write_list]
+                read_values, statuses, read_frames = await _read_frames(
+                    cluster, written, attr_types, params
+                )
+                frames["read"] += read_frames
+                values.update(read_values)
+                for attr_id in written:
+                    read_statuses.pop(attr_id, None)
+                    if attr_id in statuses:
+                        read_statuses[attr_id] = statuses[attr_id]
+                        write_statuses[attr_id] = "NOT_READ_BACK"
+                    elif not _is_equal(values[attr_id], compare_vals[attr_id]):
+                        write_statuses[attr_id] = "READ_DOES_NOT_MATCH"
+                        msg = (
+                            f"Read 0x{attr_id:04X} does not match expected:"
+                            f" {values[attr_id]!r}"
+                            f" <> {compare_vals[attr_id]!r}"
+                        )
+                        LOGGER.warning(msg)
+                        event_data.setdefault("warnings", []).append(msg)
+
+    results = []
+    for attr_id in attr_ids:
+        result = {
+            "attr_id": f"0x{attr_id:04X}",
+            "name": _attr_name(cluster, attr_id),
+            "attr_type": (
+                None
+                if attr_types[attr_id] is None
+                else f"0x{attr_types[attr_id]:02X}"
+            ),
+            "value": u.value_to_jsonable(values.get(attr_id)),
+            "read_status": read_statuses.get(attr_id),
+        }
+        if cmd == S.ATTR_WRITE:
+            result["write_status"] = write_statuses.get(attr_id)
+        results.append(result)
+
+    if cmd == S.ATTR_WRITE:
+        success = all(
+            result["write_status"] in ("SUCCESS", "EQUAL")
+            for result in results
+        )
+    else:
+        success = not read_statuses
+    event_data["attributes"] = results
+    event_data["result_read"] = (u.dict_to_jsonable(values), read_statuses)
+    event_data["frames"] = frames
+    event_data["success"] = success
+
+    # Write values to the provided states or state attributes
+    state_ids = _per_attribute(params[p.STATE_ID], count, "state_id")
+    state_attrs = _per_attribute(params[p.STATE_ATTR], count, "state_attr")
+    if (
+        count > 1
+        and not isinstance(params[p.STATE_ID], list)
+        and params[p.STATE_ATTR] is None
+    ):
+        # Attributes of a single state, named after the attributes
+        state_attrs = [_attr_name(cluster, attr_id) for attr_id in attr_ids]
+    state_template_str = params[p.STATE_VALUE_TEMPLATE]
+    for attr_id, state_id, state_attr in zip(attr_ids, state_ids, state_attrs):
+        if state_id is None or attr_id not in values:
+            continue
+        val = values[attr_id]
+        if state_template_str is not None:
+            template = Template(
+                "{{ " + state_template_str + " }}", u.get_hass(listener)
+            )
+            try:
+                val = template.async_render(value=val, attr_val=val)
+            except Exception as e:
+                LOGGER.debug(
+                    "Issue when computing template (%r), skip setting state",
+                    e,
+                )
+                event_data["success"] = False
+                continue
+        LOGGER.debug(
+            "Set state %s[%s] -> %s from attr_id %s",
+            state_id,
+            state_attr,
+            val,
+            attr_id,
+        )
+        u.set_state(
+            u.get_hass(listener),
+            state_id,
+            val,
+            key=state_attr,
+            allow_create=params[p.ALLOW_CREATE],
+        )
+
+    if params[p.CSV_FILE] is not None:
+        rows = _csv_rows(
+            cluster,
+            attr_ids,
+            values,
+            attr_types,
+            _per_attribute(params[p.CSV_LABEL], count, "csvlabel"),
+            params[p.MANF],
+        )
+        if rows:
+            await u.append_rows_to_csvfile(
+                rows,
+                "csv",
+                params[p.CSV_FILE],
+                "attribute values",
+                listener=listener,
+            )
+
+    return event_data["result_read"]
+
+
+def _select_devices(app, params) -> list:
+    """Devices with the cluster, of the model and manufacturer when set"""
+    devices = []
+    for device in app.devices.values():
+        if device.nwk == 0x0000:
+            continue
+        if params[p.MODEL] is not None and device.model != params[p.MODEL]:
+            continue
+        if (
+            params[p.MANUFACTURER] is not None
+            and device.manufacturer != params[p.MANUFACTURER]
+        ):
+            continue
+        if any(
+            params[p.CLUSTER_ID] in ep.in_clusters
+            for epid, ep in device.endpoints.items()
+            if epid != 0
+        ):
+            devices.append(device)
+    return devices
+
+
+async def attr_read_devices(
+    app, listener, ieee, cmd, data, service, params, event_data
+):
+    """Read attributes of a cluster on many devices
+
+    The devices are listed in `devices`, or are all the devices with the
+    cluster (of `model` and `manufacturer` when set).  At most
+    `concurrency` devices are read at a time, one request at a time per
+    device.  The result is a table with a row per device and attribute,
+    or per device that could not be read.
+    """
+    attributes = params[p.ATTR_ID]
+    if not isinstance(attributes, list):
+        attributes = [attributes]
+
+    targets: list[tuple[typing.Any, typing.Any]] = []
+    if params[p.DEVICES] is not None:
+        for ref in params[p.DEVICES]:
+            ref_ieee = await u.get_ieee(app, listener, str(ref))
+            targets.append((ref, app.devices.get(ref_ieee)))
+    else:
+        targets = [(d.ieee, d) for d in _select_devices(app, params)]
+    if not targets:
+        event_data["errors"].append("No device to read")
+        event_data["success"] = False
+        return
+
+    # Start with the routers, they do not depend on devices being awake
+    schedule = sorted(
+        range(len(targets)),
+        key=lambda idx: targets[idx][1] is None
+        or targets[idx][1].node_desc is None
+        or targets[idx][1].node_desc.is_end_device,
+    )
+    concurrency = params[p.CONCURRENCY]
+    if concurrency is None:
+        concurrency = DEFAULT_CONCURRENCY
+    sem = asyncio.Semaphore(concurrency)
+    csv_labels = _per_attribute(
+        params[p.CSV_LABEL], len(attributes), "csvlabel"
+    )
+
+    async def _read(ref, device) -> tuple[list, list]:
+        info = {"ieee": str(ref)}
+        if device is not None:
+            info["model"] = device.model
+            info["manufacturer"] = device.manufacturer
+        job = jobs.detach()
+        u.set_request_priority(u.PRIORITY_BACKGROUND)
+        async with sem:
+            try:
+                if device is None:
+                    raise ValueError(f"Device '{ref}' not found")
+                device_params = dict(params)
+                device_data: dict[str, typing.Any] = {"errors": []}
+                cluster = u.get_cluster_from_params(
+                    device, device_params, device_data
+                )
+                attr_ids = _attr_ids(cluster, attributes, device_data)
+                attr_types = _attr_types(
+                    cluster, attr_ids, params[p.ATTR_TYPE]
+                )
+                values, statuses, _frames = await _read_attributes(
+                    cluster, attr_ids, attr_types, device_params
+                )
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                LOGGER.warning("%s: Read failed: %r", ref, e)
+                values = None
+                error = repr(e)
+        if job is not None:
+            job.done += 1
+
+        if values is None:
+            return [{**info, "error": error}], []
+        rows = [
+            {
+                **info,
+                "endpoint": cluster.endpoint.endpoint_id,
+                "attr_id": f"0x{attr_id:04X}",
+                "name": _attr_name(cluster, attr_id),
+                "value": u.value_to_jsonable(values.get(attr_id)),
+                "status": statuses.get(attr_id),
+            }
+            for attr_id in attr_ids
+        ]
+        csv_rows = []
+        if params[p.CSV_FILE] is not None:
+            csv_rows = _csv_rows(
+                cluster,
+                attr_ids,
+                values,
+                attr_types,
+                csv_labels,
+                params[p.MANF],
+            )
+        return rows, csv_rows
+
+    jobs.set_total(len(targets))
+    scheduled = await asyncio.gather(
+        *[_read(*targets[idx]) for idx in schedule]
+    )
+    # Same order as the devices, whatever the order of the reads
+    by_target = dict(zip(schedule, scheduled))
+    results = [by_target[idx] for idx in range(len(targets))]
+
+    table = [row for rows, _csv in results for row in rows]
+    event_data["result"] = table
+    event_data["devices"] = len(targets)
+    event_data["failed"] = sum(
+        1 for row in table if "error" in row or row["status"] is not None
+    )
+
+    csv_rows = [row for _rows, csv in results for row in csv]
+    if csv_rows:
+        await u.append_rows_to_csvfile(
+            csv_rows,
+            "csv",
+            params[p.CSV_FILE],
+            "attribute values",
+            listener=listener,
+        )
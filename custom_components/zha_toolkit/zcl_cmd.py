@@ -145,8 +145,12 @@ async def zcl_cmd(app, listener, ieee, cmd, data, service, params, event_data):
             cluster = endpoint.out_clusters[cluster_id]
 
             # Note: client_command not tested
-            event_data["cmd_reply"] = await cluster.client_command(
-                cmd_id, *cmd_args, manufacturer=manf, **kw_args
+            event_data["cmd_reply"] = await u.scheduled(
+                cluster.client_command,
+                cmd_id,
+                *cmd_args,
+                manufacturer=manf,
+                **kw_args,
             )
     except Exception as e:
         caught_e = e
@@ -0,0 +1,21 @@
+"""Attribute reads on many devices"""
+
+from bench import sim
+
+
+async def _check_result_order():
+    network = sim.build_network(10, seed=1)
+    nodes = [n for n in network.nodes.values() if n.kind != "coordinator"]
+    # End devices first, they are read after the routers
+    nodes.sort(key=lambda n: not n.is_end_device)
+    devices = [str(n.ieee) for n in nodes]
+    assert nodes[0].is_end_device and not nodes[-1].is_end_device
+
+    event = await network.call(
+        "attr_read_devices", devices=devices, cluster=0, attribute=4
+    )
+    assert [row["ieee"] for row in event["result"]] == devices
+
+
+def test_result_order():
+    sim.run(_check_result_order())
@@ -0,0 +1,61 @@
+"""Batch command"""
+
+from bench import sim
+
+
+def _trv(network):
+    return next(n for n in network.nodes.values() if n.kind == "trv")
+
+
+async def _check_batch():
+    network = sim.build_network(10, seed=1)
+    ieee = str(_trv(network).ieee)
+    event = await network.call(
+        "batch",
+        commands=[
+            {
+                "command": "attr_read",
+                "ieee": ieee,
+                "cluster": 0x0201,
+                "attribute": 18,
+                "tries": 2,
+            },
+            {
+                "command": "attr_read",
+                "ieee": ieee,
+                "cluster": 0,
+                "attribute": 4,
+            },
+        ],
+    )
+    assert event["success"]
+    assert [r["command"] for r in event["result"]] == ["attr_read"] * 2
+    assert event["result"][0]["params"]["tries"] == 2
+
+
+async def _check_batch_item_events():
+    network = sim.build_network(10, seed=1)
+    ieee = str(_trv(network).ieee)
+    event = await network.call(
+        "batch",
+        commands=[
+            {
+                "command": "attr_read",
+                "ieee": ieee,
+                "cluster": 0x0201,
+                "attribute": 18,
+                "event_done": "zha_item_done",
+            },
+        ],
+    )
+    assert not event["success"]
+    assert "event_done" in event["errors"][0]
+    assert "result" not in event
+
+
+def test_batch():
+    sim.run(_check_batch())
+
+
+def test_batch_item_events():
+    sim.run(_check_batch_item_events())
@@ -0,0 +1,50 @@
+"""Simulated network and benchmark harness"""
+
+import pytest
+
+from bench import run, sim
+
+
+async def _run_scenario(scenario):
+    network = sim.build_network(10, seed=1)
+    return await run.run_scenario(network, scenario, concurrency=4)
+
+
+@pytest.mark.parametrize(
+    "scenario", ["attr_read", "scan_device", "all_routes_and_neighbours"]
+)
+def test_scenario(scenario):
+    result = sim.run(_run_scenario(scenario))
+    assert result["calls"] > 0
+    assert result["failures"] == 0, result["errors"]
+    assert result["requests"] >= result["calls"]
+    assert result["calls_per_s"] > 0
+
+
+def test_same_seed_same_network():
+    first = sim.build_network(10, seed=3)
+    second = sim.build_network(10, seed=3)
+    assert [(n.ieee, n.kind) for n in first.nodes.values()] == [
+        (n.ieee, n.kind) for n in second.nodes.values()
+    ]
+
+
+def test_regressions():
+    baseline = [
+        {"size": 10, "scenario": "attr_read", "calls_per_s": 100.0},
+        {"size": 10, "scenario": "scan_device", "calls_per_s": 2.0},
+        {"size": 10, "scenario": "zha_devices_csv", "real_s": 1.0},
+        {"size": 10, "scenario": "backup", "skipped": "not simulated"},
+    ]
+    results = [
+        {"size": 10, "scenario": "attr_read", "calls_per_s": 95.0},
+        {"size": 10, "scenario": "scan_device", "calls_per_s": 1.0},
+        {"size": 10, "scenario": "zha_devices_csv", "real_s": 1.5},
+        {"size": 10, "scenario": "backup", "skipped": "not simulated"},
+        {"size": 100, "scenario": "attr_read", "calls_per_s": 1.0},
+    ]
+    assert run.regressions(results, baseline, 0.1) == [
+        "scan_device@10: 2.0 -> 1.0 calls/s",
+        "zha_devices_csv@10: 1.0 -> 1.5 s",
+    ]
+    assert not run.regressions(results, baseline, 1.0)
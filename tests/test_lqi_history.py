@@ -0,0 +1,38 @@
+"""LQI history of the neighbour tables"""
+
+import os
+
+from bench import sim
+from custom_components.zha_toolkit import lqi
+
+
+async def _check_disabled():
+    network = sim.build_network(10, seed=2)
+    await network.call("all_routes_and_neighbours")
+    directory = os.path.join(network.hass.config.config_dir, lqi.HISTORY_DIR)
+    assert not os.path.exists(directory)
+
+    event = await network.call("lqi_history")
+    assert event["result"] == []
+    assert "lqi_history_days" in event["errors"][0]
+
+
+async def _check_enabled():
+    network = sim.build_network(10, seed=2)
+    await network.call("all_routes_and_neighbours")
+    event = await network.call("lqi_history")
+    assert not event["errors"]
+    assert event["result"]
+    assert {"router", "neighbour", "samples"} <= set(event["result"][0])
+
+
+def test_disabled_by_default():
+    sim.run(_check_disabled())
+
+
+def test_enabled():
+    lqi.HISTORY.retention_days = 30
+    try:
+        sim.run(_check_enabled())
+    finally:
+        lqi.HISTORY.retention_days = lqi.DEFAULT_RETENTION_DAYS
@@ -0,0 +1,22 @@
+"""Command and device metrics"""
+
+from bench import sim
+from custom_components.zha_toolkit import metrics
+
+
+async def _check_retries():
+    network = sim.build_network(10, seed=1, loss=0.7)
+    metrics.METRICS.reset()
+    for node in list(network.nodes.values())[1:]:
+        await network.call(
+            "attr_read", ieee=str(node.ieee), cluster=0, attribute=4, tries=5
+        )
+    result = metrics.METRICS.as_dict()
+    retries = sum(d["retries"] for d in result["devices"].values())
+    assert retries > 0
+    assert result["commands"]["attr_read"]["retries"] == retries
+    assert metrics.COMMAND.get() is None
+
+
+def test_command_retries():
+    sim.run(_check_retries())
@@ -0,0 +1,77 @@
+"""Coalescing of concurrent attribute reads"""
+
+import asyncio
+
+from bench import sim
+
+
+def _trv(network):
+    return next(n for n in network.nodes.values() if n.kind == "trv")
+
+
+async def _check_concurrent_reads():
+    network = sim.build_network(10, seed=1)
+    trv = _trv(network)
+    ieee = str(trv.ieee)
+
+    requests = trv.requests
+    same = await asyncio.gather(
+        *[
+            network.call("attr_read", ieee=ieee, cluster=0x0201, attribute=18)
+            for _ in range(5)
+        ]
+    )
+    assert [e["result_read"] for e in same] == [({18: 0}, ())] * 5
+    assert trv.requests - requests == 1
+
+    requests = trv.requests
+    attrs = (0x0000, 0x0012, 0x0014, 0x0015)
+    other = await asyncio.gather(
+        *[
+            network.call("attr_read", ieee=ieee, cluster=0x0201, attribute=a)
+            for a in attrs
+        ]
+    )
+    assert [list(e["result_read"][0]) for e in other] == [[a] for a in attrs]
+    assert trv.requests - requests == 2
+
+
+async def _check_read_after_write():
+    network = sim.build_network(10, seed=1)
+    ieee = str(_trv(network).ieee)
+    _before, write, after = await asyncio.gather(
+        network.call("attr_read", ieee=ieee, cluster=0x0201, attribute=18),
+        network.call(
+            "attr_write",
+            ieee=ieee,
+            cluster=0x0201,
+            attribute=18,
+            attr_val=1900,
+            read_before_write=False,
+        ),
+        network.call("attr_read", ieee=ieee, cluster=0x0201, attribute=18),
+    )
+    assert write["success"]
+    assert after["result_read"] == ({18: 1900}, ())
+
+
+async def _check_unsupported_attribute():
+    network = sim.build_network(10, seed=1)
+    ieee = str(_trv(network).ieee)
+    event = await network.call(
+        "attr_read", ieee=ieee, cluster=0, attribute=0x1234
+    )
+    assert not event["success"]
+    assert not event["result_read"][0]
+
+
+def test_concurrent_reads():
+    sim.run(_check_concurrent_reads())
+
+
+def test_read_after_write():
+    sim.run(_check_read_after_write())
+
+
+def test_unsupported_attribute():
+    sim.run(_check_unsupported_attribute())
@@ -0,0 +1,59 @@
+"""Attribution of zigpy requests to devices"""
+
+import functools
+
+from bench import sim
+from custom_components.zha_toolkit import scan_device, trace
+from custom_components.zha_toolkit import utils as u
+
+
+def _device_and_cluster():
+    network = sim.build_network(4, seed=1)
+    device = next(d for d in network.app.devices.values() if d.nwk != 0)
+    return device, device.endpoints[1].in_clusters[0]
+
+
+async def _check_request_device():
+    device, cluster = _device_and_cluster()
+    pacer = scan_device.ScanPacer()
+    paced = functools.partial(
+        pacer.request, cluster.discover_attributes_extended, 0, 16
+    )
+    assert u.request_device(paced) is device
+    assert (
+        u.request_device(functools.partial(cluster.read_attributes_raw, [0]))
+        is device
+    )
+    assert u.request_device(functools.partial(device.zdo.request, 0x31)) is (
+        device
+    )
+    assert u.request_device(functools.partial(pacer.request, print)) is None
+
+
+def test_request_device():
+    sim.run(_check_request_device())
+
+
+async def _check_describe_request():
+    _device, cluster = _device_and_cluster()
+    pacer = scan_device.ScanPacer()
+    info = trace.describe_request(
+        functools.partial(
+            pacer.request,
+            cluster.discover_attributes_extended,
+            0,
+            16,
+            manufacturer=0x1234,
+        )
+    )
+    # zigpy has discover_attributes_extended or general_command(command)
+    assert "zdo" not in info
+    assert info["request"] != "request"
+    assert info["endpoint"] == 1
+    assert info["cluster"] == f"0x{cluster.cluster_id:04x}"
+    assert "command" in info
+    assert info["manufacturer"] == 0x1234
+
+
+def test_describe_request():
+    sim.run(_check_describe_request())
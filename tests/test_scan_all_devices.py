@@ -0,0 +1,26 @@
+"""Scans of all the devices"""
+
+import asyncio
+
+from bench import sim
+
+
+async def _check_overlapping_scan():
+    network = sim.build_network(6, seed=1)
+    node = next(n for n in network.nodes.values() if n.kind == "plug")
+    scan_all, scan_one = await asyncio.gather(
+        network.call("scan_all_devices"),
+        network.call("scan_device", ieee=str(node.ieee)),
+    )
+    summaries = {s["ieee"]: s for s in scan_all["result"]}
+    assert len(summaries) == 6
+    # Whichever scan of the device came second was rejected
+    overlap = summaries.pop(str(node.ieee))
+    errors = scan_one["errors"] + [overlap.get("error", "")]
+    assert scan_one["success"] != overlap["complete"]
+    assert any("already being scanned" in e for e in errors)
+    assert all(s["complete"] for s in summaries.values())
+
+
+def test_overlapping_scan():
+    sim.run(_check_overlapping_scan())
@@ -0,0 +1,50 @@
+"""Interrupted device scans"""
+
+import asyncio
+import os
+
+from bench import sim
+from custom_components.zha_toolkit import scan_device
+from custom_components.zha_toolkit import utils as u
+
+
+async def _scan(network, ieee, **data):
+    event = await network.call(
+        "scan_device", ieee=ieee, scan_output="both", **data
+    )
+    scans = os.path.join(network.hass.config.config_dir, "scans")
+    (fname,) = [f for f in os.listdir(scans) if f.endswith(".ndjson")]
+    records = await u.read_ndjson_from_file(
+        "scans", fname, listener=network.gateway
+    )
+    return event, scan_device.scan_from_records(records)
+
+
+async def _check_resume():
+    full = sim.build_network(4, seed=1)
+    node = next(n for n in full.nodes.values() if n.kind == "plug")
+    ieee = str(node.ieee)
+    expected, expected_records = await _scan(full, ieee)
+
+    network = sim.build_network(4, seed=1)
+    node = next(n for n in network.nodes.values() if n.kind == "plug")
+    task = asyncio.ensure_future(network.call("scan_device", ieee=ieee))
+    await asyncio.sleep(1.0)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    requests = node.requests
+
+    event, records = await _scan(network, ieee, resume=True)
+    assert event["success"]
+    assert "checkpoint" not in event
+    # Only what was left was scanned again
+    assert node.requests - requests < full.nodes[node.nwk].requests
+    assert event["scan"] == expected["scan"]
+    assert records == expected_records
+
+
+def test_resume():
+    sim.run(_check_resume())
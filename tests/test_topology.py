@@ -0,0 +1,68 @@
+"""Network topology from neighbour and routing tables"""
+
+import types
+
+import zigpy.types as t
+import zigpy.zdo.types as zdo_t
+
+from custom_components.zha_toolkit import topology
+
+COORDINATOR = "00:0d:6f:ff:fe:00:00:01"
+ROUTER_A = "00:0d:6f:00:00:00:00:0a"
+ROUTER_B = "00:0d:6f:00:00:00:00:0b"
+
+
+def _device(ieee, nwk, logical_type):
+    return types.SimpleNamespace(
+        ieee=t.EUI64.convert(ieee),
+        nwk=t.NWK(nwk),
+        node_desc=types.SimpleNamespace(logical_type=logical_type),
+    )
+
+
+def _neighbour(ieee, nwk, device_type):
+    # Neighbour tables render NWKs as zigpy does, in upper case
+    return {
+        "ieee": ieee,
+        "nwk": str(t.NWK(nwk)),
+        "device_type": device_type,
+        "lqi": 200,
+    }
+
+
+def _route(destination, next_hop):
+    return {
+        "destination": f"0x{destination:04x}",
+        "next_hop": f"0x{next_hop:04x}",
+        "status": "Active",
+    }
+
+
+def test_route_hops_with_hex_letters():
+    topo = topology.Topology()
+    router = zdo_t.LogicalType.Router
+    topo.update(
+        _device(COORDINATOR, 0x0000, zdo_t.LogicalType.Coordinator),
+        [],
+        [_neighbour(ROUTER_A, 0xABCD, "Router")],
+        now=0,
+    )
+    topo.update(
+        _device(ROUTER_A, 0xABCD, router),
+        [_route(0x0000, 0x0000)],
+        [
+            _neighbour(COORDINATOR, 0x0000, "Coordinator"),
+            _neighbour(ROUTER_B, 0x1EF0, "Router"),
+        ],
+        now=0,
+    )
+    topo.update(
+        _device(ROUTER_B, 0x1EF0, router),
+        [_route(0x0000, 0xABCD)],
+        [_neighbour(ROUTER_A, 0xABCD, "Router")],
+        now=0,
+    )
+
+    assert sorted(topo.by_nwk) == ["0x0000", "0x1ef0", "0xabcd"]
+    assert topo.nodes[ROUTER_A]["nwk"] == "0xabcd"
+    assert topo.route_hops() == {COORDINATOR: 0, ROUTER_A: 1, ROUTER_B: 2}